@@ -0,0 +1,70 @@
+from fastapi import APIRouter, HTTPException
+from typing import Any, Dict, List
+import logging
+
+from models.requests import CalibrationApplyRequest, CalibrationBuildRequest
+from models.responses import APIResponse, CalibrationMaster
+from services.calibration import calibration_library
+from services.jobs import job_manager
+
+logger = logging.getLogger(__name__)
+router = APIRouter()
+
+
+@router.get("/masters", response_model=List[CalibrationMaster])
+async def list_masters() -> List[CalibrationMaster]:
+    """All master frames in the library, newest first"""
+    return calibration_library.list()
+
+
+@router.post("/masters")
+async def build_master(request: CalibrationBuildRequest) -> Dict[str, Any]:
+    """
+    Build a master bias, dark or flat from captures as a background job.
+    Follow progress on the job:{job_id} event topic or /api/jobs/{job_id};
+    the finished job's result is the new master.
+    """
+    job = job_manager.start(
+        "calibration",
+        f"Master {request.type} from {len(request.filenames)} frames",
+        lambda job: calibration_library.build(job, request),
+    )
+    return job.to_dict()
+
+
+@router.get("/masters/{master_id}", response_model=CalibrationMaster)
+async def get_master(master_id: str) -> CalibrationMaster:
+    master = calibration_library.get(master_id)
+    if master is None:
+        raise HTTPException(status_code=404, detail="Master not found")
+    return master
+
+
+@router.delete("/masters/{master_id}", response_model=APIResponse)
+async def delete_master(master_id: str) -> APIResponse:
+    if not calibration_library.delete(master_id):
+        raise HTTPException(status_code=404, detail="Master not found")
+    return APIResponse(success=True, message=f"Deleted master {master_id}")
+
+
+@router.post("/apply")
+async def apply_calibration(request: CalibrationApplyRequest) -> Dict[str, Any]:
+    """
+    Write calibrated copies (name_cal.jpg) of captures as a background job.
+    Masters are matched to each frame's EXIF unless given explicitly.
+    """
+    for master_id in (request.bias_id, request.dark_id, request.flat_id):
+        if master_id and calibration_library.get(master_id) is None:
+            raise HTTPException(status_code=404, detail=f"Unknown master {master_id}")
+    job = job_manager.start(
+        "calibrate",
+        f"Calibrate {len(request.filenames)} captures",
+        lambda job: calibration_library.calibrate_files(
+            job,
+            request.filenames,
+            request.bias_id,
+            request.dark_id,
+            request.flat_id,
+        ),
+    )
+    return job.to_dict()
@@ -1,45 +1,114 @@
-from fastapi import APIRouter, HTTPException, Depends
+from fastapi import APIRouter, HTTPException, Depends, Query
+from fastapi import WebSocket, WebSocketDisconnect, status
 from fastapi.responses import StreamingResponse
-from typing import Dict, Any, List
+from pathlib import Path
+from typing import Callable, Dict, Any, List, Optional
+import asyncio
 import io
 import logging
+import struct
+import time
 
 from camera.controller import CameraController
 from camera.exceptions import CameraException, CameraNotConnectedException
-from models.camera import CameraStatus, CameraSettings, CaptureResult, PreviewResult
+from models.camera import (
+    CameraStatus,
+    CameraSettings,
+    CaptureResult,
+    FocusResult,
+    PreviewResult,
+)
 from models.responses import APIResponse
-from models.requests import CaptureRequest, SettingsUpdateRequest
+from models.requests import (
+    AutofocusRequest,
+    CameraDownloadRequest,
+    CaptureRequest,
+    FocusAnalysisRequest,
+    FocusRequest,
+    LiveStackRequest,
+    LiveViewZoomRequest,
+    RecordRequest,
+    SettingsUpdateRequest,
+)
+from services.autofocus import autofocus_service
+from services.calibration import calibration_library
+from services.camera_pool import CameraNotFoundError
+from services.camera_service import camera_service
+from services.camera_storage import camera_storage
+from services.capture_catalog import capture_catalog
+from services.capture_formats import is_raw
+from services.event_bus import event_bus
+from services.file_service import file_service
+from services.fits_converter import fits_converter
+from services.focus_analysis import focus_service
+from services.image_stats import HISTOGRAM_BINS, frame_stats, rebin
+from services.jobs import job_manager
+from services.live_stack import live_stack_service
+from services.preview_service import preview_service, ViewerStats
+from services.preview_transcoder import preview_transcoder, Region
+from services.ser_recorder import recorder_service
+from services.staging import staging_tier
+from services.storage_manager import StorageFullError, storage_manager
+from config.settings import settings as app_settings
 
 logger = logging.getLogger(__name__)
 router = APIRouter()
 
-# Singleton camera controller
-camera_controller = CameraController()
+# Seconds before an unacknowledged preview frame is considered lost
+PREVIEW_ACK_TIMEOUT = 5.0
 
+# Upper bound for the software zoom of a preview region
+PREVIEW_MAX_MAGNIFICATION = 8
 
-def get_camera_controller() -> CameraController:
-    return camera_controller
+# Lowest frame rate a WebSocket viewer can ask for
+PREVIEW_MIN_FPS = 0.1
+
+
+def get_camera_controller(camera_id: Optional[str] = None) -> CameraController:
+    """
+    Resolve the controller for a request. camera_id is the camera's port
+    address; it comes from the path under /api/cameras/{camera_id} and is
+    an optional query parameter under /api/camera, where it defaults to
+    the first connected camera.
+    """
+    try:
+        return camera_service.get_controller(camera_id)
+    except CameraNotFoundError:
+        raise HTTPException(status_code=404, detail=f"Camera {camera_id} not found")
+
+
+def publish_settings(camera: CameraController, current: Dict[str, Any]):
+    event_bus.publish(
+        f"camera.settings:{camera.address}",
+        "camera.settings",
+        {"camera_id": camera.address, **current},
+    )
 
 
 @router.get("/status", response_model=CameraStatus)
 async def get_camera_status(
     camera: CameraController = Depends(get_camera_controller),
 ) -> CameraStatus:
-    """Get current camera connection status"""
-    return camera.get_status()
+    """Get current camera connection status, served from the monitor's cache"""
+    return camera_service.get_status(camera)
 
 
 @router.post("/connect", response_model=APIResponse)
-async def connect_camera(
-    camera: CameraController = Depends(get_camera_controller),
-) -> APIResponse:
+async def connect_camera(camera_id: Optional[str] = None) -> APIResponse:
     """Connect to camera"""
     try:
-        success = camera.connect()
-        if success:
-            return APIResponse(success=True, message="Camera connected successfully")
+        camera = await camera_service.pool.connect(camera_id)
+        if camera.connected:
+            camera_service.on_connected(camera)
+            return APIResponse(
+                success=True,
+                message="Camera connected successfully",
+                data={"camera_id": camera.address, "model": camera.model},
+            )
         else:
             return APIResponse(success=False, message="Failed to connect to camera")
+    except CameraNotFoundError:
+        raise HTTPException(status_code=404, detail=f"Camera {camera_id} not found")
     except Exception as e:
         logger.error(f"Connection error: {e}")
         raise HTTPException(status_code=500, detail=str(e))
@@ -51,7 +120,8 @@ async def disconnect_camera(
 ) -> APIResponse:
     """Disconnect camera"""
     try:
-        success = camera.disconnect()
+        success = await camera.run(camera.disconnect)
+        camera_service.on_disconnected(camera)
         return APIResponse(
             success=success,
             message="Camera disconnected" if success else "Failed to disconnect",
@@ -67,7 +137,7 @@ async def get_camera_settings(
 ) -> CameraSettings:
     """Get current camera settings"""
     try:
-        return camera.get_settings()
+        return await camera.run(camera.get_settings)
     except CameraNotConnectedException:
         raise HTTPException(status_code=400, detail="Camera not connected")
     except CameraException as e:
@@ -90,12 +160,14 @@ async def update_camera_settings(
             exposure_mode=settings_update.exposure_mode,
         )
 
-        success = camera.update_settings(settings)
+        success = await camera.run(camera.update_settings, settings)
         if success:
+            current = (await camera.run(camera.get_settings)).dict()
+            publish_settings(camera, current)
             return APIResponse(
                 success=True,
                 message="Settings updated successfully",
-                data=camera.get_settings().dict(),
+                data=current,
             )
         else:
             return APIResponse(success=False, message="Failed to update settings")
@@ -112,7 +184,7 @@ async def get_available_settings(
 ) -> Dict[str, List[str]]:
     """Get available options for camera settings"""
     try:
-        return camera.get_available_settings()
+        return await camera.run(camera.get_available_settings)
     except CameraNotConnectedException:
         raise HTTPException(status_code=400, detail="Camera not connected")
     except CameraException as e:
@@ -128,12 +200,67 @@ async def capture_image(
     try:
         filename = request.filename if request else None
 
+        try:
+            storage_manager.check_capture()
+        except StorageFullError as e:
+            raise HTTPException(status_code=507, detail=str(e))
+
         # Apply any settings changes before capture
         if request and request.settings:
             settings = CameraSettings(**request.settings)
-            camera.update_settings(settings)
-
-        result = camera.capture_image(filename)
+            await camera.run(camera.update_settings, settings)
+            publish_settings(camera, (await camera.run(camera.get_settings)).dict())
+
+        # Land on the fast staging tier when it has room, the mover copies
+        # the file to CAPTURE_PATH in the background
+        expected = storage_manager.expected_capture_bytes()
+        directory = await staging_tier.reserve(expected)
+        saved = []
+        try:
+            result = await camera.run(camera.capture_image, filename, directory)
+            saved = result.files if directory else []
+        finally:
+            if directory:
+                staging_tier.release(expected, saved)
+        storage_manager.wake()
+
+        # Companion files (the RAW of a RAW+JPEG shot) are announced before
+        # the primary one, so the gallery ends up showing the capture by it
+        for name in reversed(result.files):
+            file_info = file_service.get_file_info(name)
+            if file_info:
+                event_bus.publish(
+                    f"capture:{name}",
+                    "capture.completed",
+                    {"camera_id": camera.address, **file_info.dict()},
+                )
+
+        if file_info:
+            calibrate = request.calibrate if request else None
+            if calibrate is None:
+                calibrate = app_settings.CALIBRATION_APPLY_TO_CAPTURES
+            if calibrate and not is_raw(result.filename):
+                job_manager.start(
+                    "calibrate",
+                    f"Calibrate {result.filename}",
+                    lambda job: calibration_library.calibrate_files(
+                        job, [result.filename]
+                    ),
+                )
+
+            if app_settings.FITS_CONVERT_CAPTURES:
+                # Settings in effect for this capture go into the FITS header
+                try:
+                    current = (await camera.run(camera.get_settings)).dict()
+                except CameraException as e:
+                    logger.warning(f"FITS header without camera settings: {e}")
+                    current = None
+                source = fits_converter.source_for(result.files)
+                job_manager.start(
+                    "fits",
+                    f"Convert {source} to FITS",
+                    lambda job: fits_converter.convert(job, [source], current),
+                )
         return result
     except CameraNotConnectedException:
         raise HTTPException(status_code=400, detail="Camera not connected")
@@ -143,11 +270,32 @@ async def capture_image(
 
 @router.get("/preview/live")
 async def get_live_preview(
+    width: Optional[int] = Query(
+        None, ge=16, le=8192, description="Downscale to this width in pixels"
+    ),
+    quality: Optional[int] = Query(None, ge=10, le=95, description="JPEG quality"),
+    x: Optional[int] = Query(None, ge=0, description="Region left edge"),
+    y: Optional[int] = Query(None, ge=0, description="Region top edge"),
+    w: Optional[int] = Query(None, ge=1, description="Region width"),
+    h: Optional[int] = Query(None, ge=1, description="Region height"),
+    magnification: int = Query(
+        1, ge=1, le=PREVIEW_MAX_MAGNIFICATION, description="Region zoom factor"
+    ),
     camera: CameraController = Depends(get_camera_controller),
 ):
-    """Get live preview stream"""
+    """
+    Get live preview stream. x/y/w/h return only that region of the frame at
+    full resolution (optionally enlarged by magnification), e.g. a star for
+    focusing; width is ignored when a region is given.
+    """
+    region = _parse_region(x, y, w, h)
     try:
-        preview_data = camera.get_preview()
+        # Shares frames with streaming viewers and other concurrent pollers
+        broadcaster = preview_service.get_broadcaster(camera)
+        frame = await broadcaster.get_frame()
+        preview_data = await preview_transcoder.transcode(
+            broadcaster, frame, width, quality, region, magnification
+        )
         return StreamingResponse(
             io.BytesIO(preview_data),
             media_type="image/jpeg",
@@ -159,13 +307,241 @@ async def get_live_preview(
         raise HTTPException(status_code=500, detail=str(e))
 
 
+@router.get("/preview/histogram")
+async def get_preview_histogram(
+    bins: int = Query(256, description="Histogram bins (16, 32, 64, 128 or 256)"),
+    camera: CameraController = Depends(get_camera_controller),
+) -> Dict[str, Any]:
+    """Histograms and exposure statistics of the current live view frame"""
+    if bins not in HISTOGRAM_BINS:
+        raise HTTPException(
+            status_code=400, detail=f"bins must be one of {HISTOGRAM_BINS}"
+        )
+    try:
+        broadcaster = preview_service.get_broadcaster(camera)
+        frame = await broadcaster.get_frame()
+        stats = await frame_stats.get(broadcaster, frame.seq, frame.data)
+        return {"seq": frame.seq, "timestamp": frame.timestamp, **rebin(stats, bins)}
+    except CameraNotConnectedException:
+        raise HTTPException(status_code=400, detail="Camera not connected")
+    except CameraException as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+
+@router.websocket("/preview/ws")
+async def preview_websocket(
+    websocket: WebSocket,
+    camera_id: Optional[str] = None,
+    fps: Optional[float] = Query(None, gt=0, description="Requested max frame rate"),
+    width: Optional[int] = Query(None, ge=16, le=8192, description="Frame width"),
+    quality: Optional[int] = Query(None, ge=10, le=95, description="JPEG quality"),
+    x: Optional[int] = Query(None, ge=0, description="Region left edge"),
+    y: Optional[int] = Query(None, ge=0, description="Region top edge"),
+    w: Optional[int] = Query(None, ge=1, description="Region width"),
+    h: Optional[int] = Query(None, ge=1, description="Region height"),
+    magnification: int = Query(1, ge=1, le=PREVIEW_MAX_MAGNIFICATION),
+):
+    """
+    Stream live view frames as binary messages: a 4 byte big-endian frame
+    sequence number followed by the JPEG. The client acknowledges each frame
+    with {"type": "ack", "seq": n} once it has been displayed. At most
+    PREVIEW_WS_WINDOW frames are unacknowledged at a time and the client
+    always gets the newest frame, so slow clients skip frames instead of
+    building up latency. width/quality (also changeable later with a
+    {"type": "config"} message) request a downscaled variant; x/y/w/h and
+    magnification (or "region": [x, y, w, h] in a config message, null to
+    clear) stream a full resolution crop instead.
+    """
+    try:
+        camera = camera_service.get_controller(camera_id)
+        region = _parse_region(x, y, w, h)
+    except (CameraNotFoundError, HTTPException):
+        await websocket.close(code=status.WS_1008_POLICY_VIOLATION)
+        return
+
+    await websocket.accept()
+    max_fps = min(fps or app_settings.PREVIEW_MAX_FPS, app_settings.PREVIEW_MAX_FPS)
+    window = app_settings.PREVIEW_WS_WINDOW
+    client = websocket.client
+    stats = ViewerStats(
+        client=f"{client.host}:{client.port}" if client else "unknown",
+        transport="websocket",
+        max_fps=max_fps,
+        width=width,
+        quality=quality,
+    )
+    stats.region = region
+    stats.magnification = magnification
+    await websocket.send_json(
+        {
+            "type": "hello",
+            "max_fps": max_fps,
+            "window": window,
+            "width": width,
+            "quality": quality,
+            "region": list(region) if region else None,
+            "magnification": magnification,
+        }
+    )
+
+    broadcaster = preview_service.get_broadcaster(camera)
+    in_flight: Dict[int, float] = {}
+    acked = asyncio.Event()
+
+    def handle_message(message: Dict[str, Any]):
+        if message.get("type") == "ack":
+            sent_at = in_flight.pop(message.get("seq"), None)
+            if sent_at is not None:
+                stats.record_rtt((time.monotonic() - sent_at) * 1000)
+            acked.set()
+        elif message.get("type") == "config":
+            if message.get("max_fps") is not None:
+                stats.max_fps = _clamp(
+                    message["max_fps"],
+                    PREVIEW_MIN_FPS,
+                    app_settings.PREVIEW_MAX_FPS,
+                    float,
+                )
+            if "width" in message:
+                stats.width = _clamp(message["width"], 16, 8192)
+            if "quality" in message:
+                stats.quality = _clamp(message["quality"], 10, 95)
+            if "region" in message:
+                try:
+                    stats.region = (
+                        _parse_region(*message["region"]) if message["region"] else None
+                    )
+                except (HTTPException, TypeError, ValueError):
+                    logger.debug(f"Ignoring invalid preview region: {message}")
+            if "magnification" in message:
+                stats.magnification = _clamp(
+                    message["magnification"], 1, PREVIEW_MAX_MAGNIFICATION
+                )
+
+    async def receive_acks():
+        while True:
+            try:
+                message = await websocket.receive_json()
+                if isinstance(message, dict):
+                    handle_message(message)
+            except (KeyError, TypeError, ValueError) as e:
+                # A malformed message must not stop acknowledgements
+                logger.debug(f"Ignoring invalid preview WebSocket message: {e}")
+
+    receiver = asyncio.create_task(receive_acks())
+    broadcaster.acquire()
+    preview_service.add_viewer(camera, stats)
+    try:
+        last_sent = 0.0
+        while not receiver.done():
+            # Backpressure: wait for the client to catch up before sending more
+            if len(in_flight) >= window:
+                acked.clear()
+                try:
+                    await asyncio.wait_for(acked.wait(), PREVIEW_ACK_TIMEOUT)
+                except asyncio.TimeoutError:
+                    # Treat unacknowledged frames as lost
+                    in_flight.clear()
+                continue
+
+            delay = 1.0 / stats.max_fps - (time.monotonic() - last_sent)
+            if delay > 0:
+                await asyncio.sleep(delay)
+
+            try:
+                frame = await broadcaster.next_frame(stats.last_seq, timeout=1.0)
+            except asyncio.TimeoutError:
+                continue
+
+            data = await preview_transcoder.transcode(
+                broadcaster,
+                frame,
+                stats.width,
+                stats.quality,
+                stats.region,
+                stats.magnification,
+            )
+            last_sent = time.monotonic()
+            in_flight[frame.seq] = last_sent
+            await websocket.send_bytes(struct.pack(">I", frame.seq) + data)
+            stats.record_sent(frame, len(data))
+    except WebSocketDisconnect:
+        pass
+    finally:
+        receiver.cancel()
+        broadcaster.release()
+        preview_service.remove_viewer(camera, stats)
+
+
+def _clamp(
+    value: Optional[Any], low: float, high: float, cast: Callable = int
+) -> Optional[Any]:
+    return None if value is None else max(low, min(high, cast(value)))
+
+
+def _parse_region(
+    x: Optional[int], y: Optional[int], w: Optional[int], h: Optional[int]
+) -> Optional[Region]:
+    """A preview region needs all of x, y, w and h, or none of them"""
+    values = (x, y, w, h)
+    if all(v is None for v in values):
+        return None
+    if any(v is None for v in values):
+        raise HTTPException(status_code=400, detail="Region needs all of x, y, w and h")
+    x, y, w, h = (int(v) for v in values)
+    if x < 0 or y < 0 or w < 1 or h < 1:
+        raise HTTPException(status_code=400, detail="Invalid region")
+    return Region(x, y, w, h)
+
+
+@router.put("/preview/zoom", response_model=APIResponse)
+async def set_liveview_zoom(
+    request: LiveViewZoomRequest,
+    camera: CameraController = Depends(get_camera_controller),
+) -> APIResponse:
+    """
+    Set the camera's own live view magnification, so preview frames (and
+    any region of them) show real sensor detail rather than an upscale
+    """
+    position = None
+    if request.x is not None and request.y is not None:
+        position = (request.x, request.y)
+    try:
+        success = await camera.run(
+            camera.set_liveview_zoom, request.magnification, position
+        )
+        return APIResponse(
+            success=success,
+            message=(
+                f"Live view zoom set to {request.magnification}x"
+                if success
+                else "Live view zoom not available"
+            ),
+        )
+    except CameraNotConnectedException:
+        raise HTTPException(status_code=400, detail="Camera not connected")
+    except CameraException as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+
+@router.get("/preview/stats")
+async def get_preview_stats(
+    camera: CameraController = Depends(get_camera_controller),
+) -> Dict[str, Any]:
+    """Live view producer state and per-viewer frame rate and round-trip time"""
+    return {
+        **preview_service.get_stats(camera),
+        "transcoder": preview_transcoder.get_stats(),
+    }
+
+
 @router.post("/preview/snapshot", response_model=PreviewResult)
 async def take_preview_snapshot(
     camera: CameraController = Depends(get_camera_controller),
 ) -> PreviewResult:
     """Take a preview snapshot"""
     try:
-        preview_data = camera.get_preview()
+        preview_data = await camera.run(camera.get_preview)
         # Save preview to preview directory with timestamp
         import time
 
@@ -174,6 +550,7 @@ async def take_preview_snapshot(
 
         with open(preview_path, "wb") as f:
             f.write(preview_data)
+        capture_catalog.add_derived(Path(preview_path).resolve(), filename, "preview")
 
         return PreviewResult(
             success=True,
@@ -192,7 +569,7 @@ async def trigger_autofocus(
 ) -> APIResponse:
     """Trigger autofocus"""
     try:
-        success = camera.auto_focus()
+        success = await camera.run(camera.auto_focus)
         return APIResponse(
             success=success,
             message="Autofocus completed" if success else "Autofocus not available",
@@ -204,14 +581,310 @@ async def trigger_autofocus(
         raise HTTPException(status_code=500, detail=str(e))
 
 
+@router.post("/focus/drive", response_model=FocusResult)
+async def drive_focus(
+    request: FocusRequest,
+    camera: CameraController = Depends(get_camera_controller),
+) -> FocusResult:
+    """Move the lens focus by a number of manual focus drive steps"""
+    if request.direction not in ("near", "far") or not request.steps:
+        raise HTTPException(
+            status_code=400, detail="direction must be near or far, with steps"
+        )
+    if autofocus_service.is_running(camera):
+        raise HTTPException(status_code=409, detail="Autofocus is running")
+
+    steps = -request.steps if request.direction == "near" else request.steps
+    try:
+        success = await camera.run(camera.drive_focus, steps)
+        return FocusResult(
+            success=success,
+            message=(
+                f"Focus moved {request.steps} steps {request.direction}"
+                if success
+                else "Manual focus drive not available"
+            ),
+        )
+    except CameraNotConnectedException:
+        raise HTTPException(status_code=400, detail="Camera not connected")
+    except CameraException as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+
+@router.post("/focus/autofocus", response_model=FocusResult)
+async def run_autofocus(
+    request: AutofocusRequest = None,
+    camera: CameraController = Depends(get_camera_controller),
+) -> FocusResult:
+    """
+    Find best focus from live view frames by stepping the focus drive: a
+    coarse then a fine sweep, fitted with a V-curve (hfr, fwhm) or a
+    parabola (laplacian_variance, brenner). Progress is published as
+    focus.autofocus events; the returned position is relative to the start.
+    """
+    request = request or AutofocusRequest()
+    region = _parse_region(request.x, request.y, request.w, request.h)
+    if not camera.connected:
+        raise HTTPException(status_code=400, detail="Camera not connected")
+    if autofocus_service.is_running(camera):
+        raise HTTPException(status_code=409, detail="Autofocus is already running")
+
+    try:
+        return await autofocus_service.run(camera, request, region)
+    except CameraNotConnectedException:
+        raise HTTPException(status_code=400, detail="Camera not connected")
+    except CameraException as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+
+@router.delete("/focus/autofocus", response_model=APIResponse)
+async def abort_autofocus(
+    camera: CameraController = Depends(get_camera_controller),
+) -> APIResponse:
+    """Abort a running autofocus, leaving the lens where it is"""
+    aborted = await autofocus_service.abort(camera)
+    return APIResponse(
+        success=aborted,
+        message="Autofocus aborted" if aborted else "Autofocus is not running",
+    )
+
+
+@router.post("/focus/analysis", response_model=APIResponse)
+async def start_focus_analysis(
+    request: FocusAnalysisRequest = None,
+    camera: CameraController = Depends(get_camera_controller),
+) -> APIResponse:
+    """
+    Start (or reconfigure) background focus metrics on the live view. Each
+    sample is published as a focus.metrics event: Laplacian variance and
+    Brenner gradient (higher is sharper), star HFR and FWHM in pixels
+    (lower is sharper).
+    """
+    request = request or FocusAnalysisRequest()
+    analyzer = focus_service.get_analyzer(camera)
+    analyzer.region = _parse_region(request.x, request.y, request.w, request.h)
+    analyzer.max_fps = min(
+        request.max_fps or app_settings.FOCUS_ANALYSIS_MAX_FPS,
+        app_settings.PREVIEW_MAX_FPS,
+    )
+    analyzer.start()
+    return APIResponse(
+        success=True,
+        message="Focus analysis running",
+        data={
+            "region": list(analyzer.region) if analyzer.region else None,
+            "max_fps": analyzer.max_fps,
+        },
+    )
+
+
+@router.delete("/focus/analysis", response_model=APIResponse)
+async def stop_focus_analysis(
+    camera: CameraController = Depends(get_camera_controller),
+) -> APIResponse:
+    """Stop background focus metrics"""
+    await focus_service.get_analyzer(camera).stop()
+    return APIResponse(success=True, message="Focus analysis stopped")
+
+
+@router.get("/focus/analysis")
+async def get_focus_analysis(
+    since: int = Query(0, ge=0, description="Only samples after this frame seq"),
+    camera: CameraController = Depends(get_camera_controller),
+) -> Dict[str, Any]:
+    """Focus metric time series collected so far"""
+    analyzer = focus_service.get_analyzer(camera)
+    return {
+        "running": analyzer.running,
+        "region": list(analyzer.region) if analyzer.region else None,
+        "errors": analyzer.errors,
+        "samples": analyzer.get_samples(since),
+    }
+
+
+@router.post("/stack", response_model=APIResponse)
+async def start_live_stack(
+    request: LiveStackRequest = None,
+    camera: CameraController = Depends(get_camera_controller),
+) -> APIResponse:
+    """
+    Start a new live stack from the live view or from each new capture.
+    The stretched result is re-rendered periodically, announced with a
+    stack.updated event and served from /stack/image.
+    """
+    request = request or LiveStackRequest()
+    if request.calibrate and request.source != "capture":
+        raise HTTPException(
+            status_code=400, detail="Calibration needs the capture source"
+        )
+    stack = live_stack_service.get_stack(camera)
+    await stack.start(
+        request.source, request.mode, request.kappa, request.align, request.calibrate
+    )
+    return APIResponse(
+        success=True, message="Live stack started", data=stack.get_status()
+    )
+
+
+@router.delete("/stack", response_model=APIResponse)
+async def stop_live_stack(
+    camera: CameraController = Depends(get_camera_controller),
+) -> APIResponse:
+    """Stop adding frames, the current stack stays available"""
+    stack = live_stack_service.get_stack(camera)
+    await stack.stop()
+    return APIResponse(
+        success=True, message="Live stack stopped", data=stack.get_status()
+    )
+
+
+@router.get("/stack")
+async def get_live_stack_status(
+    camera: CameraController = Depends(get_camera_controller),
+) -> Dict[str, Any]:
+    """Frames stacked, clipped pixels and the last alignment shift"""
+    return live_stack_service.get_stack(camera).get_status()
+
+
+@router.get("/stack/image")
+async def get_live_stack_image(
+    camera: CameraController = Depends(get_camera_controller),
+):
+    """Latest stretched JPEG of the live stack"""
+    stack = live_stack_service.get_stack(camera)
+    if stack.image is None:
+        raise HTTPException(status_code=404, detail="Nothing stacked yet")
+    return StreamingResponse(
+        io.BytesIO(stack.image),
+        media_type="image/jpeg",
+        headers={
+            "Cache-Control": "no-cache",
+            "X-Stack-Frames": str(stack.image_frames),
+        },
+    )
+
+
+@router.post("/record", response_model=APIResponse)
+async def start_recording(
+    request: RecordRequest = None,
+    camera: CameraController = Depends(get_camera_controller),
+) -> APIResponse:
+    """
+    Record the live view at full frame rate to an SER file for lucky
+    imaging. Every frame gets a sharpness score; the ranking is written to
+    a JSON sidecar when the recording ends (record.completed event).
+    """
+    request = request or RecordRequest()
+    if not camera.connected:
+        raise HTTPException(status_code=400, detail="Camera not connected")
+    try:
+        recording = recorder_service.start(
+            camera,
+            min(request.duration, app_settings.RECORD_MAX_DURATION),
+            request.max_frames,
+            request.color,
+        )
+    except RuntimeError as e:
+        raise HTTPException(status_code=409, detail=str(e))
+    return APIResponse(
+        success=True, message="Recording started", data=recording.get_status()
+    )
+
+
+@router.delete("/record", response_model=APIResponse)
+async def stop_recording(
+    camera: CameraController = Depends(get_camera_controller),
+) -> APIResponse:
+    """Stop the recording early and finish the file"""
+    recording = recorder_service.get_recording(camera)
+    if not recording or not recording.running:
+        return APIResponse(success=False, message="Not recording")
+    await recording.stop()
+    return APIResponse(
+        success=True, message="Recording stopped", data=recording.get_status()
+    )
+
+
+@router.get("/record")
+async def get_recording_status(
+    camera: CameraController = Depends(get_camera_controller),
+) -> Dict[str, Any]:
+    """Progress of the current or last recording"""
+    recording = recorder_service.get_recording(camera)
+    return recording.get_status() if recording else {"running": False}
+
+
 @router.get("/config/tree")
 async def get_config_tree(
     camera: CameraController = Depends(get_camera_controller),
 ) -> Dict[str, Any]:
     """Get full camera configuration tree (for debugging/advanced use)"""
     try:
-        return camera.get_config_tree()
+        return await camera.run(camera.get_config_tree)
     except CameraNotConnectedException:
         raise HTTPException(status_code=400, detail="Camera not connected")
     except CameraException as e:
         raise HTTPException(status_code=500, detail=str(e))
+
+
+@router.get("/storage")
+async def list_camera_storage(
+    folder: str = "/",
+    refresh: bool = False,
+    camera: CameraController = Depends(get_camera_controller),
+) -> Dict[str, Any]:
+    """
+    Folders and files on the camera's memory card. Listings are cached
+    until the camera reports a change; refresh=true reads the card again.
+    """
+    try:
+        return await camera_storage.list_folder(camera, folder, refresh)
+    except CameraNotConnectedException:
+        raise HTTPException(status_code=400, detail="Camera not connected")
+    except CameraException as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+
+@router.post("/storage/download")
+async def download_camera_files(
+    request: CameraDownloadRequest,
+    camera: CameraController = Depends(get_camera_controller),
+) -> Dict[str, Any]:
+    """
+    Copy files and whole folders from the camera into the captures as a
+    background job. Files already downloaded are skipped, so a failed or
+    cancelled download can simply be resumed.
+    """
+    if not request.files and not request.folders:
+        raise HTTPException(status_code=400, detail="No files or folders selected")
+    try:
+        files = await camera_storage.resolve(camera, request.files, request.folders)
+    except FileNotFoundError as e:
+        raise HTTPException(status_code=404, detail=str(e))
+    except CameraNotConnectedException:
+        raise HTTPException(status_code=400, detail="Camera not connected")
+    except CameraException as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+    job = job_manager.start(
+        "camera_download",
+        f"Download {len(files)} files from the camera",
+        lambda job: camera_storage.download(job, camera, files),
+    )
+    return job.to_dict()
+
+
+@router.post("/storage/downloads/{job_id}/resume")
+async def resume_camera_download(job_id: str) -> Dict[str, Any]:
+    """Run an earlier download again, continuing where it stopped"""
+    download = camera_storage.resumable(job_id)
+    if download is None:
+        raise HTTPException(status_code=404, detail=f"Download {job_id} not found")
+    camera_id, files = download
+    camera = get_camera_controller(camera_id)
+    job = job_manager.start(
+        "camera_download",
+        f"Resume download of {len(files)} files from the camera",
+        lambda job: camera_storage.download(job, camera, files),
+    )
+    return job.to_dict()
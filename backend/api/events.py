@@ -0,0 +1,47 @@
+from fastapi import APIRouter, Query, Request
+from fastapi.responses import StreamingResponse
+from typing import Optional
+import logging
+
+from services.event_bus import event_bus
+
+logger = logging.getLogger(__name__)
+router = APIRouter()
+
+KEEPALIVE_INTERVAL = 15
+
+
+@router.get("")
+async def stream_events(
+    request: Request,
+    topics: Optional[str] = Query(
+        None, description="Comma separated topic prefixes, e.g. camera,capture"
+    ),
+):
+    """
+    Stream camera, settings, capture and job events as Server-Sent Events.
+    Events are coalesced per topic, so slow clients only see the latest
+    state. A 'resync' event means events were dropped and the client
+    should refetch.
+    """
+
+    async def event_stream():
+        subscription = event_bus.subscribe(topics.split(",") if topics else None)
+        try:
+            # Tell the client to reconnect quickly if the server restarts
+            yield "retry: 3000\n\n"
+            while not await request.is_disconnected():
+                batch = await subscription.next_batch(timeout=KEEPALIVE_INTERVAL)
+                if not batch:
+                    # Keep idle connections open through proxies
+                    yield ": keepalive\n\n"
+                    continue
+                yield "".join(event.to_sse() for event in batch)
+        finally:
+            event_bus.unsubscribe(subscription)
+
+    return StreamingResponse(
+        event_stream(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
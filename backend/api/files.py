@@ -1,14 +1,37 @@
 from fastapi import APIRouter, HTTPException, Query
 from fastapi.responses import FileResponse
+from starlette.background import BackgroundTask, BackgroundTasks
 from typing import List, Optional
 from pathlib import Path
-import zipfile
-import tempfile
+import asyncio
+import struct
 from datetime import datetime
 import logging
 
-from models.responses import APIResponse, FileInfo
+from models.requests import (
+    CaptureDeleteRequest,
+    FitsConvertRequest,
+    TimelapseRequest,
+)
+from models.responses import APIResponse, FileInfo, RecordingInfo
 from config.settings import settings
+from services.capture_catalog import capture_catalog
+from services.capture_formats import media_type
+from services.file_service import file_service
+from services.fits_converter import fits_converter
+from services.image_stats import HISTOGRAM_BINS, rebin
+from services.jobs import job_manager
+from services.staging import staging_tier
+from services.storage_manager import storage_manager
+from services.tiles import tile_service
+from services.timelapse import timelapse_service
+from services.ser_recorder import (
+    SER_RGB,
+    best_frames,
+    extract_frames,
+    read_ser_header,
+    sidecar_path,
+)
 
 logger = logging.getLogger(__name__)
 router = APIRouter()
@@ -19,34 +42,27 @@ async def list_captures(
     limit: Optional[int] = Query(None, description="Limit number of files returned"),
     offset: Optional[int] = Query(0, description="Offset for pagination"),
 ) -> List[FileInfo]:
-    """List all captured photos"""
+    """
+    List all captured photos, newest first, from the catalog. The files of
+    a RAW+JPEG shot are one entry, named by the JPEG, with the RAW listed
+    under companions.
+    """
     try:
-        capture_path = Path(settings.CAPTURE_PATH)
-        if not capture_path.exists():
-            return []
-
-        files = []
-        for file_path in capture_path.glob("*.jpg"):
-            if file_path.is_file():
-                stat = file_path.stat()
-                files.append(
-                    FileInfo(
-                        filename=file_path.name,
-                        size=stat.st_size,
-                        date=datetime.fromtimestamp(stat.st_mtime),
-                        url=f"/api/files/captures/{file_path.name}",
-                        thumbnail_url=f"/api/files/captures/{file_path.name}?thumbnail=true",
-                    )
-                )
-
-        # Sort by date (newest first)
-        files.sort(key=lambda x: x.date, reverse=True)
-
-        # Apply pagination
-        if limit:
-            files = files[offset : offset + limit]
-
-        return files
+        await capture_catalog.ready.wait()
+        entries = await capture_catalog.page(limit or None, offset or 0)
+
+        return [
+            FileInfo(
+                filename=entry["filename"],
+                size=entry["size"],
+                date=datetime.fromtimestamp(entry["mtime_ns"] / 1e9),
+                url=f"/api/files/captures/{entry['filename']}",
+                thumbnail_url=f"/api/files/captures/{entry['filename']}?thumbnail=true",
+                media_type=media_type(entry["filename"]),
+                companions=entry["companions"],
+            )
+            for entry in entries
+        ]
     except Exception as e:
         logger.error(f"Error listing captures: {e}")
         raise HTTPException(status_code=500, detail=str(e))
@@ -56,28 +72,44 @@ async def list_captures(
 async def get_capture(
     filename: str,
     thumbnail: bool = Query(False, description="Return thumbnail version"),
+    download: bool = Query(False, description="Export the file as a download"),
 ):
-    """Download a specific captured photo"""
+    """
+    Download a specific captured photo. Only an explicit download (as
+    opposed to viewing it) counts as an export.
+    """
     try:
-        file_path = Path(settings.CAPTURE_PATH) / filename
+        # Served from the staging or bulk tier, whichever holds it
+        file_path = staging_tier.locate(filename)
 
         # Security check - ensure file is in capture directory
-        if not file_path.resolve().is_relative_to(
-            Path(settings.CAPTURE_PATH).resolve()
-        ):
+        if not staging_tier.is_capture_path(file_path.resolve()):
             raise HTTPException(status_code=400, detail="Invalid file path")
 
         if not file_path.exists():
             raise HTTPException(status_code=404, detail="File not found")
 
-        # TODO: Implement thumbnail generation if requested
         if thumbnail:
-            # For now, return the original file
-            # In production, you'd want to generate/cache thumbnails
-            pass
+            try:
+                thumbnail_path = await capture_catalog.get_thumbnail(filename)
+            except ValueError:  # A RAW file without an embedded preview
+                thumbnail_path = None
+            if thumbnail_path is None:
+                raise HTTPException(status_code=404, detail="File not found")
+            return FileResponse(
+                path=str(thumbnail_path),
+                media_type="image/jpeg",
+                headers={"Cache-Control": "no-cache"},
+            )
 
+        if not download:
+            return FileResponse(path=str(file_path), media_type=media_type(filename))
+        # Retention may evict it once the download has been sent
         return FileResponse(
-            path=str(file_path), filename=filename, media_type="image/jpeg"
+            path=str(file_path),
+            filename=filename,
+            media_type=media_type(filename),
+            background=BackgroundTask(capture_catalog.mark_exported, [filename]),
         )
     except HTTPException:
         raise
@@ -86,23 +118,158 @@ async def get_capture(
         raise HTTPException(status_code=500, detail=str(e))
 
 
+@router.get("/captures/{filename}/stats")
+async def get_capture_stats(
+    filename: str,
+    bins: int = Query(256, description="Histogram bins (16, 32, 64, 128 or 256)"),
+):
+    """
+    Per-channel histograms, mean, median, standard deviation and clipped
+    pixel percentages of a capture, computed on a downsampled decode and
+    cached until the file changes.
+    """
+    if bins not in HISTOGRAM_BINS:
+        raise HTTPException(
+            status_code=400, detail=f"bins must be one of {HISTOGRAM_BINS}"
+        )
+    if not staging_tier.is_capture_path(staging_tier.locate(filename).resolve()):
+        raise HTTPException(status_code=400, detail="Invalid file path")
+    try:
+        stats = await capture_catalog.get_stats(filename)
+    except (OSError, ValueError) as e:
+        logger.error(f"Error computing stats for {filename}: {e}")
+        raise HTTPException(status_code=500, detail=str(e))
+    if stats is None:
+        raise HTTPException(status_code=404, detail="File not found")
+    return {"filename": filename, **rebin(stats, bins)}
+
+
+@router.get("/captures/{filename}/tiles")
+async def get_capture_tile_info(filename: str):
+    """
+    Size and Deep Zoom layout of a capture: level `max_level` is full
+    resolution, each level below halves it down to 1x1 at level 0
+    """
+    if not staging_tier.is_capture_path(staging_tier.locate(filename).resolve()):
+        raise HTTPException(status_code=400, detail="Invalid file path")
+    info = await tile_service.describe(filename)
+    if info is None:
+        raise HTTPException(status_code=404, detail="File not found")
+    return info
+
+
+@router.get("/captures/{filename}/tiles/{level}/{x}/{y}")
+async def get_capture_tile(filename: str, level: int, x: int, y: int):
+    """
+    One TILE_SIZE tile of a capture's Deep Zoom pyramid, column x and
+    row y of level `level`. Levels are rendered on first request.
+    """
+    if not staging_tier.is_capture_path(staging_tier.locate(filename).resolve()):
+        raise HTTPException(status_code=400, detail="Invalid file path")
+    try:
+        tile = await tile_service.get_tile(filename, level, x, y)
+    except (OSError, ValueError) as e:
+        logger.error(f"Error rendering tiles of {filename}: {e}")
+        raise HTTPException(status_code=500, detail=str(e))
+    if tile is None:
+        raise HTTPException(status_code=404, detail="Tile not found")
+    return FileResponse(
+        path=str(tile), media_type="image/jpeg", headers={"Cache-Control": "no-cache"}
+    )
+
+
+@router.post("/captures/{filename}/exported", response_model=APIResponse)
+async def mark_capture_exported(filename: str) -> APIResponse:
+    """
+    Record that a capture was copied off the device by other means (e.g.
+    rsync), so the retention policy may evict it
+    """
+    if not capture_catalog.mark_exported([filename]):
+        raise HTTPException(status_code=404, detail="File not found")
+    return APIResponse(success=True, message=f"{filename} marked as exported")
+
+
+@router.post("/captures/delete")
+async def delete_captures(request: CaptureDeleteRequest):
+    """
+    Delete a selection of captures as a background job, given either an
+    explicit list of filenames or a filter on the capture catalog. Progress
+    is reported as job.progress events and under /api/jobs.
+    """
+    filters = request.dict(exclude={"filenames"}, exclude_none=True)
+    if (request.filenames is None) == (not filters):
+        raise HTTPException(
+            status_code=400,
+            detail="Give either filenames or a filter "
+            "(use DELETE /captures/clear to delete everything)",
+        )
+    if request.filenames is not None:
+        filenames = list(dict.fromkeys(request.filenames))
+        for filename in filenames:
+            if not staging_tier.is_capture_path(
+                staging_tier.locate(filename).resolve()
+            ):
+                raise HTTPException(status_code=400, detail="Invalid file path")
+    else:
+        await capture_catalog.ready.wait()
+        for key in ("before", "after"):
+            if key in filters:
+                filters[key] = filters[key].timestamp()
+        filenames = capture_catalog.select(**filters)
+
+    job = job_manager.start(
+        "delete",
+        f"Delete {len(filenames)} captures",
+        lambda job: file_service.delete_captures(job, filenames),
+    )
+    return job.to_dict()
+
+
+@router.delete("/captures/clear", response_model=APIResponse)
+async def clear_all_captures() -> APIResponse:
+    """
+    Delete all captured photos as a background job. Returns at once with
+    the job id; captures.cleared is published when it finishes.
+    """
+    try:
+        # All capture files, in any camera format, from both storage tiers
+        filenames = [p.name for p in await file_service.list_captures()]
+        job = job_manager.start(
+            "delete",
+            f"Clear {len(filenames)} captures",
+            lambda job: file_service.delete_captures(job, filenames, clear=True),
+        )
+
+        return APIResponse(
+            success=True,
+            message=f"Clearing {len(filenames)} files",
+            data={"count": len(filenames), "job_id": job.id},
+        )
+    except Exception as e:
+        logger.error(f"Error clearing captures: {e}")
+        raise HTTPException(status_code=500, detail=str(e))
+
+
 @router.delete("/captures/{filename}", response_model=APIResponse)
-async def delete_capture(filename: str) -> APIResponse:
+async def delete_capture(
+    filename: str,
+    companions: bool = Query(
+        False, description="Also delete the other files of the shot (RAW+JPEG)"
+    ),
+) -> APIResponse:
     """Delete a specific captured photo"""
     try:
-        file_path = Path(settings.CAPTURE_PATH) / filename
+        file_path = staging_tier.locate(filename)
 
         # Security check
-        if not file_path.resolve().is_relative_to(
-            Path(settings.CAPTURE_PATH).resolve()
-        ):
+        if not staging_tier.is_capture_path(file_path.resolve()):
             raise HTTPException(status_code=400, detail="Invalid file path")
 
-        if not file_path.exists():
+        others = file_service.companions(filename) if companions else []
+        if not await file_service.delete_capture(filename):
             raise HTTPException(status_code=404, detail="File not found")
-
-        file_path.unlink()
-        logger.info(f"Deleted file: {filename}")
+        for other in others:
+            await file_service.delete_capture(other)
 
         return APIResponse(
             success=True, message=f"File {filename} deleted successfully"
@@ -118,35 +285,25 @@ async def delete_capture(filename: str) -> APIResponse:
 async def download_all_captures():
     """Download all captures as a ZIP file"""
     try:
-        capture_path = Path(settings.CAPTURE_PATH)
-        if not capture_path.exists():
-            raise HTTPException(status_code=404, detail="No captures directory found")
-
-        # Get all image files
-        image_files = list(capture_path.glob("*.jpg"))
+        # Get all capture files (JPEG and RAW) from both storage tiers
+        image_files = await file_service.list_captures()
         if not image_files:
             raise HTTPException(status_code=404, detail="No images found")
 
-        # Create temporary ZIP file
-        temp_zip = tempfile.NamedTemporaryFile(delete=False, suffix=".zip")
-
-        try:
-            with zipfile.ZipFile(temp_zip.name, "w", zipfile.ZIP_DEFLATED) as zip_file:
-                for image_file in image_files:
-                    zip_file.write(image_file, image_file.name)
-
-            # Return the ZIP file
-            timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-            zip_filename = f"captures_{timestamp}.zip"
-
-            return FileResponse(
-                path=temp_zip.name, filename=zip_filename, media_type="application/zip"
-            )
-        finally:
-            # Clean up temp file after response
-            # Note: FastAPI will handle this automatically
-            pass
-
+        zip_path = await file_service.build_zip(image_files)
+        timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
+        # Once sent, the captures count as exported and the ZIP goes away
+        background = BackgroundTasks()
+        background.add_task(
+            capture_catalog.mark_exported, [f.name for f in image_files]
+        )
+        background.add_task(zip_path.unlink, missing_ok=True)
+        return FileResponse(
+            path=str(zip_path),
+            filename=f"captures_{timestamp}.zip",
+            media_type="application/zip",
+            background=background,
+        )
     except HTTPException:
         raise
     except Exception as e:
@@ -154,30 +311,290 @@ async def download_all_captures():
         raise HTTPException(status_code=500, detail=str(e))
 
 
-@router.delete("/captures/clear", response_model=APIResponse)
-async def clear_all_captures() -> APIResponse:
-    """Delete all captured photos"""
+def _recording_path(filename: str) -> Path:
+    """Resolve a recording name, rejecting paths outside RECORDING_PATH"""
+    file_path = Path(settings.RECORDING_PATH) / filename
+    if file_path.suffix != ".ser" or not file_path.resolve().is_relative_to(
+        Path(settings.RECORDING_PATH).resolve()
+    ):
+        raise HTTPException(status_code=400, detail="Invalid file path")
+    if not file_path.exists():
+        raise HTTPException(status_code=404, detail="File not found")
+    return file_path
+
+
+def _recording_info(file_path: Path) -> RecordingInfo:
+    stat = file_path.stat()
+    header = read_ser_header(file_path)
+    return RecordingInfo(
+        filename=file_path.name,
+        size=stat.st_size,
+        date=datetime.fromtimestamp(stat.st_mtime),
+        url=f"/api/files/recordings/{file_path.name}",
+        frames=header["frames"],
+        width=header["width"],
+        height=header["height"],
+        color=header["color_id"] >= SER_RGB,
+        ranked=sidecar_path(file_path).exists(),
+    )
+
+
+@router.get("/recordings", response_model=List[RecordingInfo])
+async def list_recordings() -> List[RecordingInfo]:
+    """List lucky imaging recordings (SER files)"""
     try:
-        capture_path = Path(settings.CAPTURE_PATH)
-        if not capture_path.exists():
-            return APIResponse(
-                success=True, message="No captures to clear", data={"count": 0}
-            )
+        recording_path = Path(settings.RECORDING_PATH)
+        if not recording_path.exists():
+            return []
+
+        recordings = []
+        for file_path in recording_path.glob("*.ser"):
+            try:
+                recordings.append(_recording_info(file_path))
+            except (OSError, ValueError, struct.error) as e:
+                logger.warning(f"Skipping unreadable recording {file_path.name}: {e}")
+
+        recordings.sort(key=lambda x: x.date, reverse=True)
+        return recordings
+    except Exception as e:
+        logger.error(f"Error listing recordings: {e}")
+        raise HTTPException(status_code=500, detail=str(e))
+
+
+@router.get("/recordings/{filename}")
+async def get_recording(filename: str):
+    """Download an SER recording"""
+    file_path = _recording_path(filename)
+    return FileResponse(
+        path=str(file_path), filename=filename, media_type="application/octet-stream"
+    )
+
+
+@router.get("/recordings/{filename}/best")
+async def get_best_frames(
+    filename: str,
+    percent: float = Query(10.0, gt=0, le=100, description="Share of frames to keep"),
+):
+    """Indices of the sharpest frames, looked up from the sidecar ranking"""
+    file_path = _recording_path(filename)
+    if not sidecar_path(file_path).exists():
+        raise HTTPException(status_code=404, detail="Recording has no ranking")
+    return best_frames(file_path, percent)
+
+
+@router.post("/recordings/{filename}/extract", response_model=RecordingInfo)
+async def extract_best_frames(
+    filename: str,
+    percent: float = Query(10.0, gt=0, le=100, description="Share of frames to keep"),
+) -> RecordingInfo:
+    """Write the sharpest frames to a new SER file, in recording order"""
+    file_path = _recording_path(filename)
+    if not sidecar_path(file_path).exists():
+        raise HTTPException(status_code=404, detail="Recording has no ranking")
 
-        # Delete all image files
-        deleted_count = 0
-        for file_path in capture_path.glob("*.jpg"):
-            if file_path.is_file():
-                file_path.unlink()
-                deleted_count += 1
+    try:
+        best = best_frames(file_path, percent)
+        target = file_path.with_name(f"{file_path.stem}_best{percent:g}.ser")
+        await asyncio.get_running_loop().run_in_executor(
+            None, extract_frames, file_path, target, best["indices"]
+        )
+        logger.info(f"Extracted {best['selected']} frames to {target.name}")
+        return _recording_info(target)
+    except (OSError, ValueError) as e:
+        logger.error(f"Error extracting frames from {filename}: {e}")
+        raise HTTPException(status_code=500, detail=str(e))
 
-        logger.info(f"Cleared {deleted_count} capture files")
 
+@router.delete("/recordings/{filename}", response_model=APIResponse)
+async def delete_recording(filename: str) -> APIResponse:
+    """Delete a recording and its ranking sidecar"""
+    file_path = _recording_path(filename)
+    try:
+        file_path.unlink()
+        sidecar_path(file_path).unlink(missing_ok=True)
+        logger.info(f"Deleted recording: {filename}")
         return APIResponse(
-            success=True,
-            message=f"Cleared {deleted_count} files",
-            data={"count": deleted_count},
+            success=True, message=f"Recording {filename} deleted successfully"
         )
-    except Exception as e:
-        logger.error(f"Error clearing captures: {e}")
+    except OSError as e:
+        logger.error(f"Error deleting recording {filename}: {e}")
         raise HTTPException(status_code=500, detail=str(e))
+
+
+def _fits_path(filename: str) -> Path:
+    """Resolve a FITS file name, rejecting paths outside FITS_PATH"""
+    file_path = Path(settings.FITS_PATH) / filename
+    if file_path.suffix != ".fits" or not file_path.resolve().is_relative_to(
+        Path(settings.FITS_PATH).resolve()
+    ):
+        raise HTTPException(status_code=400, detail="Invalid file path")
+    if not file_path.exists():
+        raise HTTPException(status_code=404, detail="File not found")
+    return file_path
+
+
+@router.get("/fits", response_model=List[FileInfo])
+async def list_fits() -> List[FileInfo]:
+    """List captures converted to FITS"""
+    fits_path = Path(settings.FITS_PATH)
+    if not fits_path.exists():
+        return []
+
+    files = []
+    for file_path in fits_path.glob("*.fits"):
+        stat = file_path.stat()
+        files.append(
+            FileInfo(
+                filename=file_path.name,
+                size=stat.st_size,
+                date=datetime.fromtimestamp(stat.st_mtime),
+                url=f"/api/files/fits/{file_path.name}",
+            )
+        )
+    files.sort(key=lambda x: x.date, reverse=True)
+    return files
+
+
+@router.post("/fits/convert")
+async def convert_to_fits(request: FitsConvertRequest = None):
+    """
+    Convert captures (all of them by default) to FITS as a background job.
+    Files whose source hasn't changed since the last conversion are skipped.
+    """
+    request = request or FitsConvertRequest()
+    count = len(request.filenames) if request.filenames is not None else "all"
+    job = job_manager.start(
+        "fits",
+        f"Convert {count} captures to FITS",
+        lambda job: fits_converter.convert(job, request.filenames, force=request.force),
+    )
+    return job.to_dict()
+
+
+@router.get("/fits/{filename}")
+async def get_fits(filename: str):
+    """Download a FITS file"""
+    file_path = _fits_path(filename)
+    return FileResponse(path=str(file_path), filename=filename, media_type="image/fits")
+
+
+@router.delete("/fits/{filename}", response_model=APIResponse)
+async def delete_fits(filename: str) -> APIResponse:
+    """Delete a FITS file, the capture it was converted from is kept"""
+    file_path = _fits_path(filename)
+    try:
+        file_path.unlink()
+        capture_catalog.remove_derived(file_path)
+        logger.info(f"Deleted FITS file: {filename}")
+        return APIResponse(success=True, message=f"FITS file {filename} deleted")
+    except OSError as e:
+        logger.error(f"Error deleting FITS file {filename}: {e}")
+        raise HTTPException(status_code=500, detail=str(e))
+
+
+def _timelapse_path(filename: str) -> Path:
+    """Resolve a timelapse name, rejecting paths outside TIMELAPSE_PATH"""
+    file_path = Path(settings.TIMELAPSE_PATH) / filename
+    if file_path.suffix != ".avi" or not file_path.resolve().is_relative_to(
+        Path(settings.TIMELAPSE_PATH).resolve()
+    ):
+        raise HTTPException(status_code=400, detail="Invalid file path")
+    if not file_path.exists():
+        raise HTTPException(status_code=404, detail="File not found")
+    return file_path
+
+
+@router.get("/timelapses", response_model=List[FileInfo])
+async def list_timelapses() -> List[FileInfo]:
+    """List assembled timelapse videos"""
+    files = []
+    for file_path in timelapse_service.list():
+        stat = file_path.stat()
+        files.append(
+            FileInfo(
+                filename=file_path.name,
+                size=stat.st_size,
+                date=datetime.fromtimestamp(stat.st_mtime),
+                url=f"/api/files/timelapses/{file_path.name}",
+            )
+        )
+    return files
+
+
+@router.post("/timelapses")
+async def create_timelapse(request: TimelapseRequest = None):
+    """
+    Assemble captures into an MJPEG AVI as a background job. Frames are
+    the given filenames in order, or the captures matching the filter
+    (all of them by default) in capture order.
+    """
+    request = request or TimelapseRequest()
+    if request.filenames is not None:
+        paths = []
+        for filename in request.filenames:
+            path = staging_tier.find(filename)
+            if path is None:
+                raise HTTPException(
+                    status_code=404, detail=f"Capture not found: {filename}"
+                )
+            paths.append(path)
+    else:
+        await capture_catalog.ready.wait()
+        filters = request.dict(
+            include={"pattern", "before", "after", "camera_id"}, exclude_none=True
+        )
+        for key in ("before", "after"):
+            if key in filters:
+                filters[key] = filters[key].timestamp()
+        paths = [
+            staging_tier.locate(f)
+            for f in capture_catalog.select(**filters, grouped=True)
+        ]
+    if not paths:
+        raise HTTPException(status_code=404, detail="No captures selected")
+    if request.name and (Path(settings.TIMELAPSE_PATH) / request.name).exists():
+        raise HTTPException(status_code=409, detail=f"{request.name} already exists")
+
+    job = job_manager.start(
+        "timelapse",
+        f"Timelapse of {len(paths)} captures",
+        lambda job: timelapse_service.assemble(
+            job,
+            paths,
+            name=request.name,
+            fps=request.fps,
+            width=request.width,
+            quality=request.quality,
+        ),
+    )
+    return job.to_dict()
+
+
+@router.get("/timelapses/{filename}")
+async def get_timelapse(filename: str):
+    """Download a timelapse video"""
+    file_path = _timelapse_path(filename)
+    return FileResponse(
+        path=str(file_path), filename=filename, media_type="video/x-msvideo"
+    )
+
+
+@router.delete("/timelapses/{filename}", response_model=APIResponse)
+async def delete_timelapse(filename: str) -> APIResponse:
+    """Delete a timelapse video"""
+    file_path = _timelapse_path(filename)
+    file_path.unlink()
+    return APIResponse(success=True, message=f"Timelapse {filename} deleted")
+
+
+@router.get("/storage")
+async def get_storage_status():
+    """Indexed usage, free space, retention policy and recent evictions"""
+    return storage_manager.get_status()
+
+
+@router.post("/storage/evict", response_model=APIResponse)
+async def run_eviction() -> APIResponse:
+    """Run the retention policy now instead of at the next check"""
+    storage_manager.wake()
+    return APIResponse(success=True, message="Storage check scheduled")
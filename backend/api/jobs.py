@@ -0,0 +1,36 @@
+from fastapi import APIRouter, HTTPException, Query
+from typing import Any, Dict, List, Optional
+import logging
+
+from models.responses import APIResponse
+from services.jobs import job_manager
+
+logger = logging.getLogger(__name__)
+router = APIRouter()
+
+
+@router.get("")
+async def list_jobs(
+    kind: Optional[str] = Query(None, description="Only jobs of this kind"),
+) -> List[Dict[str, Any]]:
+    """Running and recently finished background jobs, oldest first"""
+    return [job.to_dict() for job in job_manager.list(kind)]
+
+
+@router.get("/{job_id}")
+async def get_job(job_id: str) -> Dict[str, Any]:
+    """Progress and result of one job"""
+    job = job_manager.get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Job not found")
+    return job.to_dict()
+
+
+@router.delete("/{job_id}", response_model=APIResponse)
+async def cancel_job(job_id: str) -> APIResponse:
+    """Cancel a pending or running job"""
+    if job_manager.get(job_id) is None:
+        raise HTTPException(status_code=404, detail="Job not found")
+    if not job_manager.cancel(job_id):
+        return APIResponse(success=False, message="Job already finished")
+    return APIResponse(success=True, message="Job cancelling")
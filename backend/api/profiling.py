@@ -0,0 +1,191 @@
+from datetime import datetime
+from pathlib import Path
+from typing import Any, Dict, List, Optional
+from urllib.parse import parse_qs
+import asyncio
+import cProfile
+import hmac
+import logging
+import time
+
+from fastapi import APIRouter, Depends, Header, HTTPException
+from fastapi.responses import FileResponse, JSONResponse
+
+from config.settings import settings
+from models.requests import ProfileRequest
+from models.responses import APIResponse, FileInfo
+from services.jobs import job_manager
+from services.profiler import StackSampler, cprofile_summary, profiler_service
+
+logger = logging.getLogger(__name__)
+
+TOKEN_HEADER = "x-profiling-token"
+
+
+def _authorized(token: Optional[str]) -> bool:
+    return bool(settings.PROFILING_TOKEN) and hmac.compare_digest(
+        (token or "").encode(), settings.PROFILING_TOKEN.encode()
+    )
+
+
+async def require_token(x_profiling_token: Optional[str] = Header(None)):
+    if not _authorized(x_profiling_token):
+        raise HTTPException(status_code=403, detail="Profiling token required")
+
+
+router = APIRouter(dependencies=[Depends(require_token)])
+
+
+class ProfilingMiddleware:
+    """
+    Profiles single requests: with ?profile=1 (cProfile of the event loop
+    thread) or ?profile=sample (stack samples of every thread, including
+    camera workers) and the profiling token in the X-Profiling-Token header,
+    the response is replaced by a JSON summary of where the request spent
+    its time. Only installed when PROFILING_TOKEN is set.
+
+    cProfile sees everything the event loop ran meanwhile, not just this
+    request, and nothing on other threads, so profiled requests run one at
+    a time and are best made on an otherwise quiet server.
+    """
+
+    def __init__(self, app):
+        self.app = app
+        self._lock = asyncio.Lock()
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+        query = parse_qs(scope.get("query_string", b"").decode("latin-1"))
+        mode = query.get("profile", [""])[-1]
+        if not mode or mode in ("0", "false"):
+            return await self.app(scope, receive, send)
+
+        headers = dict(scope["headers"])
+        token = headers.get(TOKEN_HEADER.encode(), b"").decode("latin-1")
+        if not _authorized(token):
+            response = JSONResponse(
+                {"detail": "Profiling token required"}, status_code=403
+            )
+        elif mode not in ("1", "true", "cprofile", "sample"):
+            response = JSONResponse(
+                {"detail": "profile must be 1, cprofile or sample"}, status_code=400
+            )
+        else:
+            async with self._lock:
+                response = JSONResponse(await self._profile(scope, receive, mode))
+        await response(scope, receive, send)
+
+    async def _profile(self, scope, receive, mode: str) -> Dict[str, Any]:
+        result: Dict[str, Any] = {"status": None, "response_bytes": 0}
+
+        async def capture(message):
+            if message["type"] == "http.response.start":
+                result["status"] = message["status"]
+            elif message["type"] == "http.response.body":
+                result["response_bytes"] += len(message.get("body", b""))
+
+        sampler = profile = None
+        if mode == "sample":
+            sampler = StackSampler(settings.PROFILING_SAMPLE_INTERVAL)
+            sampler.start()
+        else:
+            profile = cProfile.Profile()
+            profile.enable()
+        started = time.perf_counter()
+        try:
+            await asyncio.wait_for(
+                self.app(scope, receive, capture), settings.PROFILING_REQUEST_TIMEOUT
+            )
+        except asyncio.TimeoutError:
+            # Streaming responses never finish on their own
+            result["truncated"] = True
+        except Exception as e:
+            result["error"] = repr(e)
+        finally:
+            elapsed = time.perf_counter() - started
+            if sampler:
+                sampler.stop()
+            else:
+                profile.disable()
+
+        logger.info(
+            f"Profiled {scope['method']} {scope['path']} ({mode}): {elapsed * 1000:.1f} ms"
+        )
+        summary = (
+            sampler.summary() if sampler else {"functions": cprofile_summary(profile)}
+        )
+        return {
+            "method": scope["method"],
+            "path": scope["path"],
+            "elapsed_ms": round(elapsed * 1000, 2),
+            **result,
+            "mode": "sample" if sampler else "cprofile",
+            **summary,
+        }
+
+
+def _profile_path(filename: str) -> Path:
+    """Resolve a profile name, rejecting paths outside PROFILING_PATH"""
+    file_path = Path(settings.PROFILING_PATH) / filename
+    if file_path.suffix != ".folded" or not file_path.resolve().is_relative_to(
+        Path(settings.PROFILING_PATH).resolve()
+    ):
+        raise HTTPException(status_code=400, detail="Invalid file path")
+    if not file_path.exists():
+        raise HTTPException(status_code=404, detail="File not found")
+    return file_path
+
+
+@router.post("/sample")
+async def start_profile(request: ProfileRequest = None) -> Dict[str, Any]:
+    """
+    Sample the stacks of every thread for `duration` seconds as a job; the
+    job result names the collapsed-stack file for flame graph tools
+    """
+    request = request or ProfileRequest()
+    if request.duration > profiler_service.max_duration:
+        raise HTTPException(
+            status_code=400,
+            detail=f"duration is limited to {profiler_service.max_duration:g} seconds",
+        )
+    if profiler_service.running:
+        raise HTTPException(status_code=409, detail="A profile is already running")
+
+    job = job_manager.start(
+        "profile",
+        f"Profile of {request.duration:g} s",
+        lambda job: profiler_service.record(job, request.duration, request.interval),
+    )
+    return job.to_dict()
+
+
+@router.get("/profiles", response_model=List[FileInfo])
+async def list_profiles() -> List[FileInfo]:
+    """List recorded profiles"""
+    files = []
+    for file_path in profiler_service.list():
+        stat = file_path.stat()
+        files.append(
+            FileInfo(
+                filename=file_path.name,
+                size=stat.st_size,
+                date=datetime.fromtimestamp(stat.st_mtime),
+                url=f"/api/profiling/profiles/{file_path.name}",
+            )
+        )
+    return files
+
+
+@router.get("/profiles/{filename}")
+async def get_profile(filename: str):
+    """Download a profile in collapsed-stack format"""
+    file_path = _profile_path(filename)
+    return FileResponse(path=str(file_path), filename=filename, media_type="text/plain")
+
+
+@router.delete("/profiles/{filename}", response_model=APIResponse)
+async def delete_profile(filename: str) -> APIResponse:
+    """Delete a recorded profile"""
+    _profile_path(filename).unlink()
+    return APIResponse(success=True, message=f"Profile {filename} deleted")
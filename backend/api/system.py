@@ -1,10 +1,15 @@
-from fastapi import APIRouter, HTTPException
-from typing import List, Dict, Any
+from fastapi import APIRouter, HTTPException, Query, Request
+from fastapi.responses import StreamingResponse
+from typing import List, Dict, Any, Optional
+import asyncio
 import psutil
 import logging
 from datetime import datetime
 
-from models.responses import APIResponse, SystemInfo
+from models.responses import APIResponse, SystemInfo, CameraInfo, LogEntry
+from services.camera_service import camera_service
+from services.event_bus import format_sse
+from services.log_buffer import log_buffer, parse_level
 
 logger = logging.getLogger(__name__)
 router = APIRouter()
@@ -35,29 +40,28 @@ async def get_system_info() -> SystemInfo:
         raise HTTPException(status_code=500, detail=str(e))
 
 
-@router.get("/cameras")
-async def list_available_cameras() -> List[Dict[str, Any]]:
+@router.get("/cameras", response_model=List[CameraInfo])
+async def list_available_cameras(
+    refresh: bool = Query(False, description="Force a USB rescan"),
+) -> List[CameraInfo]:
     """List all available cameras"""
     try:
-        import gphoto2 as gp
-
-        cameras = []
-        context = gp.Context()
-
-        # Get list of cameras
-        camera_list = gp.check_result(gp.gp_camera_autodetect(context))
-
-        for index, (name, addr) in enumerate(camera_list):
-            cameras.append(
-                {
-                    "id": str(index),
-                    "name": name,
-                    "address": addr,
-                    "connected": False,  # TODO: Check actual connection status
-                }
+        registry = camera_service.registry
+        # USB autodetection blocks, keep it off the event loop
+        if refresh:
+            await asyncio.to_thread(registry.refresh)
+        cameras = await asyncio.to_thread(registry.get_cameras)
+
+        pool = camera_service.pool
+        return [
+            CameraInfo(
+                id=addr,
+                name=name,
+                address=addr,
+                connected=pool.is_connected(addr),
             )
-
-        return cameras
+            for name, addr in cameras
+        ]
     except Exception as e:
         logger.error(f"Error listing cameras: {e}")
         raise HTTPException(status_code=500, detail=str(e))
@@ -76,15 +80,64 @@ async def restart_camera_service() -> APIResponse:
 
 
 @router.get("/logs")
-async def get_recent_logs(lines: int = 50) -> Dict[str, List[str]]:
-    """Get recent log entries"""
+async def get_recent_logs(
+    lines: int = Query(50, ge=1, description="Maximum number of entries returned"),
+    level: Optional[str] = Query(None, description="Minimum level, e.g. WARNING"),
+    module: Optional[str] = Query(None, description="Logger name or prefix"),
+    since: Optional[datetime] = Query(None, description="Only entries after this time"),
+) -> Dict[str, List[LogEntry]]:
+    """Get recent log entries from the in-memory log buffer"""
     try:
-        # TODO: Implement log reading from actual log files
-        logs = [
-            f"[{datetime.now().isoformat()}] INFO: Camera service started",
-            f"[{datetime.now().isoformat()}] INFO: System monitoring active",
-        ]
-        return {"logs": logs[-lines:]}
+        min_level = parse_level(level)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+    try:
+        records = log_buffer.tail(
+            lines=lines,
+            min_level=min_level,
+            module=module,
+            since=since.timestamp() if since else None,
+        )
+        return {"logs": [record.to_entry() for record in records]}
     except Exception as e:
         logger.error(f"Error reading logs: {e}")
         raise HTTPException(status_code=500, detail=str(e))
+
+
+@router.get("/logs/stream")
+async def stream_logs(
+    request: Request,
+    level: Optional[str] = Query(None, description="Minimum level, e.g. WARNING"),
+    module: Optional[str] = Query(None, description="Logger name or prefix"),
+):
+    """Stream new log entries as Server-Sent Events"""
+    try:
+        min_level = parse_level(level)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+    async def event_stream():
+        subscription = log_buffer.subscribe()
+        try:
+            while not await request.is_disconnected():
+                try:
+                    record = await asyncio.wait_for(
+                        subscription.queue.get(), timeout=15
+                    )
+                except asyncio.TimeoutError:
+                    # Keep idle connections open through proxies
+                    yield ": keepalive\n\n"
+                    continue
+
+                if not record.matches(min_level, module):
+                    continue
+                yield format_sse(record.to_entry().json(), event="log", id=record.seq)
+        finally:
+            log_buffer.unsubscribe(subscription)
+
+    return StreamingResponse(
+        event_stream(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
@@ -0,0 +1,539 @@
+"""
+End-to-end benchmarks of the API hot paths.
+
+Runs the ASGI app in-process against simulated cameras
+(CAMERA_BACKEND=simulated) with all data in a temporary directory, and
+measures live view frame rate and latency per number of viewers, capture
+listing latency per number of files, settings round trips, ZIP export
+throughput and how long captures stall the event loop.
+
+    python benchmark.py -o results.json                  # Run and save results
+    python benchmark.py --quick --baseline baseline.json  # Fail on regressions
+    python benchmark.py --compare results.json --baseline baseline.json
+
+Simulated camera latencies come from the CAMERA_SIM_* settings and can be
+set in the environment. With --baseline the exit status is 1 when a
+metric got worse than the baseline by more than --tolerance.
+"""
+
+from pathlib import Path
+from typing import Any, Callable, Dict, List, Optional, Tuple
+import argparse
+import asyncio
+import json
+import logging
+import os
+import platform
+import shutil
+import struct
+import sys
+import tempfile
+import threading
+import time
+
+SCENARIOS = ("settings", "preview", "capture", "zip", "files")
+
+# Every this many shots of a generated listing is a RAW+JPEG pair
+RAW_PAIR_EVERY = 5
+
+# Event loop probe interval (seconds)
+PROBE_INTERVAL = 0.01
+# Loop stalls longer than this are counted (milliseconds)
+STALL_THRESHOLD_MS = 50
+
+# Differences below these are noise, whatever the relative change
+NOISE_FLOOR = {"ms": 5.0, "fps": 0.5, "per_s": 1.0}
+
+logger = logging.getLogger("benchmark")
+
+
+def _percentile(values: List[float], percent: float) -> float:
+    """Nearest-rank percentile"""
+    ordered = sorted(values)
+    index = max(0, min(len(ordered) - 1, round(percent / 100 * len(ordered)) - 1))
+    return ordered[index]
+
+
+def _summary(values: List[float]) -> Dict[str, float]:
+    """p50/p95/p99/max of millisecond samples"""
+    if not values:
+        return {}
+    return {
+        "p50": round(_percentile(values, 50), 2),
+        "p95": round(_percentile(values, 95), 2),
+        "p99": round(_percentile(values, 99), 2),
+        "max": round(max(values), 2),
+    }
+
+
+class LoopProbe:
+    """
+    Measures event loop responsiveness: a task on the app's loop sleeps
+    PROBE_INTERVAL at a time and records how late it wakes up. Anything
+    blocking the loop (synchronous I/O, image decoding) shows up as lag.
+    """
+
+    def __init__(self, portal):
+        self.portal = portal
+        self.lags: List[float] = []
+        self._stop = threading.Event()
+        self._future = None
+
+    async def _run(self):
+        while not self._stop.is_set():
+            started = time.perf_counter()
+            await asyncio.sleep(PROBE_INTERVAL)
+            lag = time.perf_counter() - started - PROBE_INTERVAL
+            self.lags.append(max(0.0, lag) * 1000)
+
+    def __enter__(self) -> "LoopProbe":
+        self._future = self.portal.start_task_soon(self._run)
+        return self
+
+    def __exit__(self, *exc):
+        self._stop.set()
+        self._future.result()
+
+    def result(self) -> Dict[str, Any]:
+        return {
+            "loop_lag_ms": _summary(self.lags),
+            "stalls_over_threshold": sum(lag > STALL_THRESHOLD_MS for lag in self.lags),
+            "stalled_total_ms": round(
+                sum(lag for lag in self.lags if lag > STALL_THRESHOLD_MS), 1
+            ),
+        }
+
+
+class Benchmark:
+    """The app under test, its client and the benchmark scenarios"""
+
+    def __init__(self, client, options: argparse.Namespace):
+        self.client = client
+        self.options = options
+
+        from config.settings import settings
+
+        self.settings = settings
+        self.capture_path = Path(settings.CAPTURE_PATH)
+        self.work_path = Path(options.workdir)
+
+    def _timed(self, method: str, url: str, **kwargs) -> Tuple[float, Any]:
+        """(milliseconds, response) of one request, raising on errors"""
+        started = time.perf_counter()
+        response = self.client.request(method, url, **kwargs)
+        elapsed = (time.perf_counter() - started) * 1000
+        response.raise_for_status()
+        return elapsed, response
+
+    def _repeat(self, count: int, method: str, url: str, **kwargs) -> List[float]:
+        return [self._timed(method, url, **kwargs)[0] for _ in range(count)]
+
+    def _on_loop(self, function: Callable[[], Any]) -> Any:
+        """Run function on the app's event loop thread"""
+        return self.client.portal.call(function)
+
+    def connect(self):
+        response = self.client.post("/api/camera/connect")
+        response.raise_for_status()
+        if not response.json()["success"]:
+            raise RuntimeError("Could not connect the simulated camera")
+
+    # Capture directory
+
+    def _reconcile(self):
+        from services.capture_catalog import capture_catalog
+
+        capture_catalog.reconcile()
+
+    def clear_captures(self):
+        for path in self.capture_path.iterdir():
+            if path.is_file():
+                path.unlink()
+        self._reconcile()
+
+    def sample_capture(self) -> Path:
+        """A real capture kept outside the capture directory"""
+        sample = self.work_path / "sample.jpg"
+        if not sample.exists():
+            captures = sorted(self.capture_path.glob("*.jpg"))
+            if not captures:
+                self._timed("POST", "/api/camera/capture", json={})
+                captures = sorted(self.capture_path.glob("*.jpg"))
+            shutil.copyfile(captures[0], sample)
+        return sample
+
+    # Scenarios
+
+    def run_settings(self) -> Dict[str, Any]:
+        """Settings read and write round trips"""
+        count = self.options.repeat
+        reads = self._repeat(count, "GET", "/api/camera/settings")
+        available = self._repeat(count, "GET", "/api/camera/settings/available")
+        writes = [
+            self._timed(
+                "PUT", "/api/camera/settings", json={"iso": "1600" if i % 2 else "800"}
+            )[0]
+            for i in range(count)
+        ]
+        return {
+            "read_ms": _summary(reads),
+            "available_ms": _summary(available),
+            "write_ms": _summary(writes),
+        }
+
+    def _preview(self, viewers: int, duration: float) -> Dict[str, Any]:
+        from services.camera_service import camera_service
+        from services.preview_service import preview_service
+
+        broadcaster = self._on_loop(
+            lambda: preview_service.get_broadcaster(camera_service.get_controller())
+        )
+        # Publication time of each frame, to measure delivery latency
+        published: Dict[int, float] = {}
+        stop = threading.Event()
+
+        async def record_frames():
+            seq = broadcaster.latest.seq if broadcaster.latest else 0
+            while not stop.is_set():
+                try:
+                    frame = await broadcaster.next_frame(seq, timeout=0.5)
+                except asyncio.TimeoutError:
+                    continue
+                published[frame.seq] = frame.timestamp
+                seq = frame.seq
+
+        received: List[List[Tuple[float, int]]] = [[] for _ in range(viewers)]
+        deadline = time.time() + duration
+
+        def view(frames: List[Tuple[float, int]]):
+            with self.client.websocket_connect("/api/camera/preview/ws") as ws:
+                ws.receive_json()
+                while time.time() < deadline:
+                    message = ws.receive_bytes()
+                    (seq,) = struct.unpack(">I", message[:4])
+                    frames.append((time.time(), seq))
+                    ws.send_json({"type": "ack", "seq": seq})
+
+        recorder = self.client.portal.start_task_soon(record_frames)
+        produced = broadcaster.frames_produced
+        started = time.time()
+        threads = [
+            threading.Thread(target=view, args=(frames,), daemon=True)
+            for frames in received
+        ]
+        with LoopProbe(self.client.portal) as probe:
+            for thread in threads:
+                thread.start()
+            for thread in threads:
+                thread.join()
+        produced = broadcaster.frames_produced - produced
+        elapsed = time.time() - started
+        stop.set()
+        recorder.result()
+
+        rates, latencies = [], []
+        for frames in received:
+            if len(frames) > 1:
+                rates.append((len(frames) - 1) / (frames[-1][0] - frames[0][0]))
+            latencies.extend(
+                (at - published[seq]) * 1000 for at, seq in frames if seq in published
+            )
+        return {
+            "viewer_fps": {
+                "mean": round(sum(rates) / len(rates), 2) if rates else 0.0,
+                "min": round(min(rates), 2) if rates else 0.0,
+            },
+            "camera_fps": round(produced / elapsed, 2),
+            "latency_ms": _summary(latencies),
+            **probe.result(),
+        }
+
+    def run_preview(self) -> Dict[str, Any]:
+        """Live view over WebSocket with 1, 5, 20 ... concurrent viewers"""
+        results = {}
+        for viewers in self.options.viewers:
+            logger.info(f"preview: {viewers} viewers for {self.options.duration}s")
+            results[str(viewers)] = self._preview(viewers, self.options.duration)
+            # Let the producer stop before the next round
+            time.sleep(3)
+        return results
+
+    def run_capture(self) -> Dict[str, Any]:
+        """Captures in a row, with the event loop probed throughout"""
+        self.clear_captures()
+        with LoopProbe(self.client.portal) as probe:
+            captures = self._repeat(
+                self.options.captures, "POST", "/api/camera/capture", json={}
+            )
+            # Thumbnails and statistics of the captures are computed after
+            # the response, give them time to finish within the probe
+            time.sleep(2)
+        return {"capture_ms": _summary(captures), **probe.result()}
+
+    def run_zip(self) -> Dict[str, Any]:
+        """ZIP export of all captures"""
+        sample = self.sample_capture()
+        self.clear_captures()
+        for i in range(self.options.zip_files):
+            os.link(sample, self.capture_path / f"zip_{i:04d}.jpg")
+        self._reconcile()
+        size = sample.stat().st_size * self.options.zip_files
+
+        times, archive = [], 0
+        with LoopProbe(self.client.portal) as probe:
+            for _ in range(max(1, self.options.repeat // 5)):
+                elapsed, response = self._timed(
+                    "POST", "/api/files/captures/download-all"
+                )
+                times.append(elapsed)
+                archive = len(response.content)
+        best = min(times) / 1000
+        return {
+            "files": self.options.zip_files,
+            "input_bytes": size,
+            "archive_bytes": archive,
+            "export_ms": _summary(times),
+            "mb_per_s": round(size / best / 1e6, 1),
+            **probe.result(),
+        }
+
+    def _fill_listing(self, count: int):
+        """count empty capture files, some as RAW+JPEG pairs"""
+        self.clear_captures()
+        shot = written = 0
+        while written < count:
+            names = [f"bench_{shot:06d}.jpg"]
+            if shot % RAW_PAIR_EVERY == 0:
+                names.append(f"bench_{shot:06d}.cr2")
+            for name in names[: count - written]:
+                (self.capture_path / name).touch()
+                written += 1
+            shot += 1
+        self._reconcile()
+
+    def run_files(self) -> Dict[str, Any]:
+        """Capture listing latency for 1k, 10k, 100k ... files"""
+        results = {}
+        for count in self.options.file_counts:
+            logger.info(f"files: {count} captures")
+            self._fill_listing(count)
+            repeat = max(3, min(self.options.repeat, 100000 // count))
+            full = self._repeat(repeat, "GET", "/api/files/captures")
+            page = self._repeat(repeat, "GET", "/api/files/captures?limit=50")
+            results[str(count)] = {
+                "list_ms": _summary(full),
+                "page_ms": _summary(page),
+            }
+        self.clear_captures()
+        return results
+
+
+def run(options: argparse.Namespace) -> Dict[str, Any]:
+    workdir = Path(tempfile.mkdtemp(prefix="camera-benchmark-"))
+    options.workdir = str(workdir)
+    # Everything the app writes goes into the scratch directory
+    os.environ.update(
+        CAMERA_BACKEND="simulated",
+        CAPTURE_PATH=str(workdir / "captures"),
+        PREVIEW_PATH=str(workdir / "previews"),
+        RECORDING_PATH=str(workdir / "recordings"),
+        CATALOG_PATH=str(workdir / "catalog.sqlite3"),
+        THUMBNAIL_PATH=str(workdir / "thumbnails"),
+        TILE_CACHE_PATH=str(workdir / "tiles"),
+        CALIBRATION_PATH=str(workdir / "calibration"),
+        FITS_PATH=str(workdir / "fits"),
+        TIMELAPSE_PATH=str(workdir / "timelapses"),
+        STORAGE_MIN_FREE_BYTES="0",
+    )
+    os.environ.pop("STAGING_PATH", None)
+    sys.path.insert(0, str(Path(__file__).resolve().parent))
+
+    from fastapi.testclient import TestClient
+
+    import main
+    from config.settings import settings
+
+    logging.getLogger().setLevel(logging.INFO if options.verbose else logging.WARNING)
+    logger.setLevel(logging.INFO)
+
+    results: Dict[str, Any] = {}
+    try:
+        with TestClient(main.app) as client:
+            benchmark = Benchmark(client, options)
+            benchmark.connect()
+            for scenario in options.scenarios:
+                logger.info(f"Running {scenario}")
+                started = time.perf_counter()
+                results[scenario] = getattr(benchmark, f"run_{scenario}")()
+                logger.info(f"{scenario} done in {time.perf_counter() - started:.1f}s")
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+    return {
+        "created": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "cpus": os.cpu_count(),
+        "settings": {
+            name: getattr(settings, name)
+            for name in (
+                "CAMERA_SIM_PREVIEW_LATENCY",
+                "CAMERA_SIM_CAPTURE_LATENCY",
+                "CAMERA_SIM_FILE_GET_LATENCY",
+                "CAMERA_SIM_GET_CONFIG_LATENCY",
+                "CAMERA_SIM_SET_CONFIG_LATENCY",
+                "CAMERA_SIM_PREVIEW_WIDTH",
+                "CAMERA_SIM_CAPTURE_WIDTH",
+                "PREVIEW_MAX_FPS",
+            )
+        },
+        "results": results,
+    }
+
+
+# Comparison
+
+
+def _flatten(results: Dict[str, Any], prefix: str = "") -> Dict[str, float]:
+    flat = {}
+    for key, value in results.items():
+        name = f"{prefix}.{key}" if prefix else key
+        if isinstance(value, dict):
+            flat.update(_flatten(value, name))
+        elif isinstance(value, (int, float)):
+            flat[name] = value
+    return flat
+
+
+def _metric_kind(name: str) -> Optional[str]:
+    """ "per_s"/"fps" (higher is better), "ms" (lower is better) or None"""
+    if "per_s" in name:
+        return "per_s"
+    if "fps" in name:
+        return "fps"
+    if "_ms" in name:
+        return "ms"
+    return None
+
+
+def compare(
+    baseline: Dict[str, Any], current: Dict[str, Any], tolerance: float
+) -> List[Dict[str, Any]]:
+    """
+    Metrics present in both result sets with their relative change,
+    flagged as regressions when worse than the baseline by more than
+    tolerance (and more than the noise floor)
+    """
+    before = _flatten(baseline["results"])
+    after = _flatten(current["results"])
+    rows = []
+    for name in sorted(before.keys() & after.keys()):
+        kind = _metric_kind(name)
+        if kind is None:
+            continue
+        old, new = before[name], after[name]
+        # Positive worse means the metric moved in the bad direction
+        worse = new - old if kind == "ms" else old - new
+        change = (new - old) / old if old else 0.0
+        rows.append(
+            {
+                "metric": name,
+                "baseline": old,
+                "current": new,
+                "change": round(change, 3),
+                "regression": worse > NOISE_FLOOR[kind]
+                and worse > tolerance * abs(old),
+            }
+        )
+    return rows
+
+
+def print_comparison(rows: List[Dict[str, Any]]):
+    width = max((len(row["metric"]) for row in rows), default=10)
+    for row in rows:
+        flag = "REGRESSION" if row["regression"] else ""
+        print(
+            f"{row['metric']:<{width}}  {row['baseline']:>10}  {row['current']:>10}"
+            f"  {row['change']:>+8.1%}  {flag}",
+            file=sys.stderr,
+        )
+
+
+def _counts(value: str) -> List[int]:
+    return [int(v) for v in value.split(",") if v]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0].strip())
+    parser.add_argument(
+        "--scenarios",
+        default=",".join(SCENARIOS),
+        help=f"Comma separated subset of {', '.join(SCENARIOS)}",
+    )
+    parser.add_argument("--viewers", type=_counts, default=[1, 5, 20])
+    parser.add_argument("--file-counts", type=_counts, default=[1000, 10000, 100000])
+    parser.add_argument(
+        "--duration", type=float, default=10.0, help="Seconds per preview round"
+    )
+    parser.add_argument(
+        "--repeat", type=int, default=20, help="Requests per latency measurement"
+    )
+    parser.add_argument("--captures", type=int, default=10)
+    parser.add_argument("--zip-files", type=int, default=50)
+    parser.add_argument(
+        "--quick",
+        action="store_true",
+        help="Short run: fewer viewers, files and repetitions",
+    )
+    parser.add_argument("-o", "--output", help="Write results JSON here")
+    parser.add_argument("--baseline", help="Results JSON to compare against")
+    parser.add_argument(
+        "--compare", help="Compare this results JSON with --baseline instead of running"
+    )
+    parser.add_argument(
+        "--tolerance",
+        type=float,
+        default=0.2,
+        help="Relative slowdown counted as a regression",
+    )
+    parser.add_argument("-v", "--verbose", action="store_true")
+    options = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO, format="%(name)s: %(message)s")
+
+    if options.compare:
+        if not options.baseline:
+            parser.error("--compare needs --baseline")
+        current = json.loads(Path(options.compare).read_text())
+    else:
+        options.scenarios = [s for s in options.scenarios.split(",") if s]
+        unknown = set(options.scenarios) - set(SCENARIOS)
+        if unknown:
+            parser.error(f"Unknown scenarios: {', '.join(sorted(unknown))}")
+        if options.quick:
+            options.viewers = [v for v in options.viewers if v <= 5]
+            options.file_counts = [n for n in options.file_counts if n <= 10000]
+            options.duration = min(options.duration, 3.0)
+            options.repeat = min(options.repeat, 5)
+            options.captures = min(options.captures, 3)
+            options.zip_files = min(options.zip_files, 10)
+        current = run(options)
+        output = json.dumps(current, indent=2)
+        if options.output:
+            Path(options.output).write_text(output + "\n")
+        else:
+            print(output)
+
+    if options.baseline:
+        rows = compare(
+            json.loads(Path(options.baseline).read_text()), current, options.tolerance
+        )
+        print_comparison(rows)
+        regressions = [row for row in rows if row["regression"]]
+        if regressions:
+            print(f"{len(regressions)} regressions", file=sys.stderr)
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,3 +1,4 @@
+from .backend import CameraBackend, get_backend
 from .controller import CameraController
 from .camera_config import CameraConfigManager
 from .exceptions import (
@@ -6,9 +7,13 @@ from .exceptions import (
     CameraTimeoutException,
     CameraSettingsException,
     CaptureException,
+    CameraConnectionLostException,
+    CameraStorageException,
 )
 
 __all__ = [
+    "CameraBackend",
+    "get_backend",
     "CameraController",
     "CameraConfigManager",
     "CameraException",
@@ -16,4 +21,6 @@ __all__ = [
     "CameraTimeoutException",
     "CameraSettingsException",
     "CaptureException",
+    "CameraConnectionLostException",
+    "CameraStorageException",
 ]
@@ -0,0 +1,93 @@
+from abc import ABC, abstractmethod
+import logging
+from typing import Any, List, Optional, Tuple
+
+import gphoto2 as gp
+
+from config.settings import settings
+
+logger = logging.getLogger(__name__)
+
+
+class CameraBackend(ABC):
+    """
+    Source of camera objects for CameraController and of the camera list
+    for autodetection. The objects follow the python-gphoto2 gp.Camera API
+    (capture, capture_preview, file_get, get_config, set_config, ...) and
+    raise gp.GPhoto2Error, so the controller is the same for every backend.
+    """
+
+    name = "base"
+
+    @abstractmethod
+    def autodetect(self, context: gp.Context) -> List[Tuple[str, str]]:
+        """(model, port address) of every camera present"""
+
+    @abstractmethod
+    def open(
+        self, address: Optional[str], model: Optional[str], context: gp.Context
+    ) -> Any:
+        """
+        An initialised camera at `address` (the first one found when None),
+        raises gp.GPhoto2Error when it cannot be opened
+        """
+
+
+class GPhoto2Backend(CameraBackend):
+    """Real cameras through libgphoto2"""
+
+    name = "gphoto2"
+
+    def autodetect(self, context: gp.Context) -> List[Tuple[str, str]]:
+        return [
+            (name, addr)
+            for name, addr in gp.check_result(gp.gp_camera_autodetect(context))
+        ]
+
+    def open(
+        self, address: Optional[str], model: Optional[str], context: gp.Context
+    ) -> gp.Camera:
+        camera = gp.Camera()
+        if address:
+            self._bind_port(camera, address, model, context)
+        camera.init(context)
+        return camera
+
+    def _bind_port(
+        self,
+        camera: gp.Camera,
+        address: str,
+        model: Optional[str],
+        context: gp.Context,
+    ):
+        """Restrict the camera to the configured port (and model if known)"""
+        port_info_list = gp.PortInfoList()
+        port_info_list.load()
+        index = port_info_list.lookup_path(address)
+        camera.set_port_info(port_info_list[index])
+
+        if model:
+            abilities_list = gp.CameraAbilitiesList()
+            abilities_list.load(context)
+            index = abilities_list.lookup_model(model)
+            camera.set_abilities(abilities_list[index])
+
+
+_backend: Optional[CameraBackend] = None
+
+
+def get_backend() -> CameraBackend:
+    """The backend chosen by CAMERA_BACKEND, created on first use"""
+    global _backend
+    if _backend is None:
+        if settings.CAMERA_BACKEND == "gphoto2":
+            _backend = GPhoto2Backend()
+        elif settings.CAMERA_BACKEND == "simulated":
+            # The simulator is only loaded when selected
+            from .simulator import SimulatedBackend
+
+            _backend = SimulatedBackend()
+        else:
+            raise ValueError(f"Unknown CAMERA_BACKEND {settings.CAMERA_BACKEND!r}")
+        logger.info(f"Camera backend: {_backend.name}")
+    return _backend
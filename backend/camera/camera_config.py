@@ -209,6 +209,20 @@ class CameraConfigManager:
             if e:
                 e.refresh()
 
+    def apply_single(self, entry: Entry, value):
+        """
+        Set one widget and write only that widget to the camera, for
+        settings written many times in a row (e.g. focus drive steps)
+        """
+        if entry.choices and value not in entry.choices:
+            raise ValueError(
+                f"Invalid value '{value}' for widget '{entry.name}'. Choices: {entry.choices}"
+            )
+        entry.widget.set_value(value)
+        self.camera.set_single_config(entry.name, entry.widget)
+        entry.value = value
+        logger.debug(f"Set '{entry.name}' to '{value}'")
+
     def apply_changes(self):
         """Apply all configuration changes to the camera"""
         try:
@@ -1,30 +1,78 @@
 import gphoto2 as gp
+import asyncio
+import functools
 import logging
-from typing import Optional, Dict, Any, List
+import threading
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Optional, Dict, Any, List, Callable, Tuple, TypeVar
 from pathlib import Path
 import time
 
+from .backend import get_backend
 from .camera_config import CameraConfigManager
 from .exceptions import (
+    CameraException,
+    CameraConnectionLostException,
     CameraNotConnectedException,
     CameraSettingsException,
+    CameraStorageException,
     CaptureException,
 )
 from models.camera import CameraStatus, CameraSettings, CaptureResult
+from services.capture_formats import primary_first
 from config.settings import settings
 
 logger = logging.getLogger(__name__)
 
+T = TypeVar("T")
+
+# gphoto2 errors that mean the camera is gone rather than a failed request
+CONNECTION_LOST_ERRORS = {
+    gp.GP_ERROR_IO,
+    gp.GP_ERROR_IO_READ,
+    gp.GP_ERROR_IO_WRITE,
+    gp.GP_ERROR_IO_USB_FIND,
+    gp.GP_ERROR_IO_USB_CLAIM,
+    gp.GP_ERROR_TIMEOUT,
+    gp.GP_ERROR_MODEL_NOT_FOUND,
+}
+
+# Upper bound on queued gphoto2 events handled per poll
+MAX_EVENTS_PER_POLL = 100
+
+# Seconds to wait for the second file of a RAW+JPEG shot after capture()
+COMPANION_FILE_TIMEOUT = 5.0
+
+# Config widgets whose value says whether a shot writes RAW+JPEG, e.g.
+# "RAW + Large Fine JPEG" (Canon) or "NEF+Fine" (Nikon)
+IMAGE_FORMAT_WIDGETS = ("imageformat", "imagequality")
+
 
 class CameraController:
     """Camera controller using the CameraConfigManager"""
 
-    def __init__(self):
+    # Serializes capture file name reservation across controllers
+    _filename_lock = threading.Lock()
+
+    def __init__(self, address: Optional[str] = None, model: Optional[str] = None):
+        """
+        address/model pin the controller to one camera (e.g. "usb:001,005"),
+        otherwise connect() picks the first camera the backend finds.
+        """
         self.camera: Optional[gp.Camera] = None
+        self.backend = get_backend()
         self.context = gp.Context()
         self.config_manager: Optional[CameraConfigManager] = None
+        self.address: Optional[str] = address
+        self.model: Optional[str] = model
+        self._bound_address = address
         self._connected = False
 
+        # All gphoto2 calls for this camera run on its own worker thread
+        self._worker = ThreadPoolExecutor(
+            max_workers=1, thread_name_prefix=f"camera-{address or 'auto'}"
+        )
+
         # Ensure capture directories exist
         Path(settings.CAPTURE_PATH).mkdir(exist_ok=True)
         Path(settings.PREVIEW_PATH).mkdir(exist_ok=True)
@@ -32,17 +80,21 @@ class CameraController:
     def connect(self) -> bool:
         """Connect to camera and initialize config manager"""
         try:
-            self.camera = gp.Camera()
-            self.camera.init(self.context)
+            self.camera = self.backend.open(
+                self._bound_address, self.model, self.context
+            )
 
             # Initialize configuration manager
             self.config_manager = CameraConfigManager(self.camera)
 
+            self.address = self.camera.get_port_info().get_path()
+            self.model = self.camera.get_abilities().model
             self._connected = True
             logger.info("Camera connected successfully with enhanced configuration")
             return True
         except gp.GPhoto2Error as e:
             logger.error(f"Failed to connect camera: {e}")
+            self.camera = None
             self._connected = False
             return False
 
@@ -53,6 +105,7 @@ class CameraController:
                 self.camera.exit(self.context)
                 self.camera = None
                 self.config_manager = None
+            self.address = self._bound_address
             self._connected = False
             logger.info("Camera disconnected")
             return True
@@ -60,38 +113,79 @@ class CameraController:
             logger.error(f"Error disconnecting camera: {e}")
             return False
 
+    @property
+    def connected(self) -> bool:
+        return self._connected
+
+    async def run(self, func: Callable[..., T], *args, **kwargs) -> T:
+        """Run a blocking controller method on this camera's worker thread"""
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(
+            self._worker, functools.partial(func, *args, **kwargs)
+        )
+
+    def submit(self, func: Callable[..., T], *args, **kwargs) -> "Future[T]":
+        """Queue a blocking controller method on the worker from another thread"""
+        return self._worker.submit(func, *args, **kwargs)
+
+    def shutdown(self):
+        """Disconnect and stop the worker thread"""
+        if self._connected:
+            self._worker.submit(self.disconnect).result()
+        self._worker.shutdown(wait=True)
+
     def get_status(self) -> CameraStatus:
-        """Get camera status with enhanced information"""
+        """
+        Read camera status from the camera. The model is cached at connect
+        time, so this only touches the USB bus for the battery level.
+        Raises CameraConnectionLostException if the camera stopped responding.
+        """
         if not self._connected or not self.camera or not self.config_manager:
-            return CameraStatus(connected=False)
+            return CameraStatus(connected=False, model=self.model)
 
         try:
-            # Get camera model
-            summary = self.camera.get_summary(self.context)
-            model = str(summary).split("\n")[0] if summary else "Unknown"
-
-            # Try to get battery level
-            battery = None
-            battery_entry = self.config_manager.get_by_name("batterylevel")
-            if battery_entry and battery_entry.value:
-                try:
-                    battery = int(battery_entry.value.replace("%", ""))
-                except (ValueError, AttributeError):
-                    pass
-
-            # Try to get storage info
-            storage_available = None
-            # This varies by camera model - some have 'availableshots' or similar
+            battery = self._read_int_config("batterylevel")
+            # Not every body exposes this, Canon calls it 'availableshots'
+            storage_available = self._read_int_config("availableshots")
 
             return CameraStatus(
                 connected=True,
-                model=model,
+                model=self.model,
                 battery=battery,
                 storage_available=storage_available,
             )
         except gp.GPhoto2Error as e:
             logger.error(f"Error getting camera status: {e}")
-            return CameraStatus(connected=False)
+            if e.code in CONNECTION_LOST_ERRORS:
+                raise CameraConnectionLostException(f"Camera not responding: {e}")
+            return CameraStatus(connected=True, model=self.model)
+
+    def _read_int_config(self, name: str) -> Optional[int]:
+        """Read a single numeric widget fresh from the camera, if it exists"""
+        if not self.config_manager.get_by_name(name):
+            return None
+        value = self.camera.get_single_config(name, self.context).get_value()
+        try:
+            return int(str(value).replace("%", ""))
+        except ValueError:
+            return None
+
+    def drop(self):
+        """Release a camera that vanished from the bus without a clean exit"""
+        if self.camera:
+            try:
+                self.camera.exit(self.context)
+            except gp.GPhoto2Error as e:
+                logger.debug(f"Ignoring exit error on lost camera: {e}")
+        self.camera = None
+        self.config_manager = None
+        self._connected = False
+        logger.warning(f"Camera {self.address} connection lost")
+
+    def rebind(self, address: str):
+        """Point a disconnected controller at a new port address"""
+        self._bound_address = address
+        self.address = address
 
     def get_settings(self) -> CameraSettings:
         """Get current camera settings using config manager"""
@@ -230,35 +324,59 @@ class CameraController:
             logger.error(f"Error getting available settings: {e}")
             raise CameraSettingsException(f"Failed to get available settings: {e}")
 
-    def capture_image(self, filename: Optional[str] = None) -> CaptureResult:
-        """Capture an image"""
+    def capture_image(
+        self, filename: Optional[str] = None, directory: Optional[Path] = None
+    ) -> CaptureResult:
+        """
+        Capture an image into `directory` (a staging tier), or straight
+        into CAPTURE_PATH when not given. Every file of the shot is kept
+        with the camera's extension (e.g. capture_1700000000.cr2 and
+        capture_1700000000.jpg for RAW+JPEG); the JPEG is reported as the
+        capture's filename.
+        """
         if not self._connected or not self.camera:
             raise CameraNotConnectedException("Camera not connected")
 
         try:
             # Capture image
-            file_path = self.camera.capture(gp.GP_CAPTURE_IMAGE, self.context)
+            camera_paths = [self.camera.capture(gp.GP_CAPTURE_IMAGE, self.context)]
+            if self._writes_companion_file():
+                camera_paths += self._wait_for_companion_files()
 
-            # Generate filename if not provided
-            if not filename:
-                timestamp = int(time.time())
-                filename = f"capture_{timestamp}.jpg"
+            # Name the files after the request, or the capture time
+            stem = Path(filename).stem if filename else f"capture_{int(time.time())}"
 
-            # Download image from camera
-            target_path = Path(settings.CAPTURE_PATH) / filename
-            camera_file = self.camera.file_get(
-                file_path.folder, file_path.name, gp.GP_FILE_TYPE_NORMAL, self.context
+            # Download images from camera
+            target_paths = self._reserve_capture_paths(
+                stem, [Path(p.name).suffix.lower() for p in camera_paths], directory
             )
-            camera_file.save(str(target_path))
+            try:
+                for camera_path, target_path in zip(camera_paths, target_paths):
+                    camera_file = self.camera.file_get(
+                        camera_path.folder,
+                        camera_path.name,
+                        gp.GP_FILE_TYPE_NORMAL,
+                        self.context,
+                    )
+                    camera_file.save(str(target_path))
+            except gp.GPhoto2Error:
+                for target_path in target_paths:
+                    target_path.unlink(missing_ok=True)
+                raise
 
             # Clean up camera memory
-            self.camera.file_delete(file_path.folder, file_path.name, self.context)
+            for camera_path in camera_paths:
+                self.camera.file_delete(
+                    camera_path.folder, camera_path.name, self.context
+                )
 
-            logger.info(f"Image captured: {filename}")
+            files = primary_first(p.name for p in target_paths)
+            logger.info(f"Image captured: {', '.join(files)}")
             return CaptureResult(
                 success=True,
-                filename=filename,
-                url=f"/api/files/captures/{filename}",
+                filename=files[0],
+                files=files,
+                url=f"/api/files/captures/{files[0]}",
                 timestamp=time.time(),
             )
 
@@ -266,6 +384,145 @@ class CameraController:
             logger.error(f"Capture failed: {e}")
             raise CaptureException(f"Capture failed: {e}")
 
+    def _writes_companion_file(self) -> bool:
+        """Whether the camera is set to RAW+JPEG, from the cached config"""
+        if not self.config_manager:
+            return False
+        for name in IMAGE_FORMAT_WIDGETS:
+            entry = self.config_manager.get_by_name(name)
+            if entry and entry.value and "+" in str(entry.value):
+                return True
+        return False
+
+    def _wait_for_companion_files(self) -> List[Any]:
+        """
+        capture() reports one file of a RAW+JPEG shot; the camera announces
+        the other one as a file-added event shortly after
+        """
+        files = []
+        deadline = time.monotonic() + COMPANION_FILE_TIMEOUT
+        while not files:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                logger.warning("Camera reported no second file for RAW+JPEG")
+                break
+            event_type, data = self.camera.wait_for_event(
+                int(remaining * 1000), self.context
+            )
+            if event_type == gp.GP_EVENT_FILE_ADDED:
+                files.append(data)
+            elif event_type == gp.GP_EVENT_TIMEOUT:
+                break
+        return files
+
+    def _reserve_capture_paths(
+        self, stem: str, suffixes: List[str], directory: Optional[Path] = None
+    ) -> List[Path]:
+        """
+        Claim free paths `stem` + suffix in the capture directory (or
+        `directory`), adding the same numeric suffix to all of them when
+        several cameras capture within the same second, so the files of
+        one shot keep a common name. The names must also be free in
+        CAPTURE_PATH, where staged captures end up.
+        """
+        capture_path = Path(settings.CAPTURE_PATH)
+        directory = directory or capture_path
+        with self._filename_lock:
+            name = stem
+            counter = 1
+            while True:
+                candidates = [directory / f"{name}{suffix}" for suffix in suffixes]
+                if not any(
+                    candidate.exists()
+                    or (
+                        directory != capture_path
+                        and (capture_path / candidate.name).exists()
+                    )
+                    for candidate in candidates
+                ):
+                    claimed = []
+                    try:
+                        for candidate in candidates:
+                            candidate.touch(exist_ok=False)
+                            claimed.append(candidate)
+                        return candidates
+                    except FileExistsError:
+                        for candidate in claimed:
+                            candidate.unlink(missing_ok=True)
+                name = f"{stem}_{counter}"
+                counter += 1
+
+    def _storage_error(self, action: str, e: gp.GPhoto2Error) -> CameraException:
+        logger.error(f"{action} failed: {e}")
+        if e.code in CONNECTION_LOST_ERRORS:
+            return CameraConnectionLostException(f"Camera not responding: {e}")
+        return CameraStorageException(f"{action} failed: {e}")
+
+    def list_folder(self, folder: str = "/") -> Dict[str, Any]:
+        """Subfolders and files (with size and mtime) of a camera storage folder"""
+        if not self._connected or not self.camera:
+            raise CameraNotConnectedException("Camera not connected")
+
+        try:
+            folders = [
+                name
+                for name, _ in self.camera.folder_list_folders(folder, self.context)
+            ]
+            files = []
+            for name, _ in self.camera.folder_list_files(folder, self.context):
+                info = self.camera.file_get_info(folder, name, self.context).file
+                files.append(
+                    {
+                        "name": name,
+                        "size": info.size,
+                        "mtime": info.mtime,
+                        "type": info.type,
+                    }
+                )
+            return {"folder": folder, "folders": folders, "files": files}
+        except gp.GPhoto2Error as e:
+            raise self._storage_error(f"Listing {folder}", e)
+
+    def read_file_chunk(self, folder: str, name: str, offset: int, size: int) -> bytes:
+        """Up to `size` bytes of a file on the camera storage, from `offset`"""
+        if not self._connected or not self.camera:
+            raise CameraNotConnectedException("Camera not connected")
+
+        buffer = bytearray(size)
+        try:
+            read = self.camera.file_read(
+                folder,
+                name,
+                gp.GP_FILE_TYPE_NORMAL,
+                offset,
+                memoryview(buffer),
+                self.context,
+            )
+        except gp.GPhoto2Error as e:
+            raise self._storage_error(f"Reading {folder}/{name}", e)
+        return bytes(buffer[:read])
+
+    def poll_file_events(self) -> List[str]:
+        """
+        Drain queued gphoto2 events without waiting, returns the paths of
+        files and folders that appeared on the camera storage since the
+        last poll (e.g. shots taken with the camera's own shutter button)
+        """
+        if not self._connected or not self.camera:
+            return []
+
+        added = []
+        try:
+            for _ in range(MAX_EVENTS_PER_POLL):
+                event_type, data = self.camera.wait_for_event(0, self.context)
+                if event_type == gp.GP_EVENT_TIMEOUT:
+                    break
+                if event_type in (gp.GP_EVENT_FILE_ADDED, gp.GP_EVENT_FOLDER_ADDED):
+                    added.append(f"{data.folder.rstrip('/')}/{data.name}")
+        except gp.GPhoto2Error as e:
+            logger.debug(f"Polling camera events failed: {e}")
+        return added
+
     def get_preview(self) -> bytes:
         """Get live preview image"""
         if not self._connected or not self.camera:
@@ -300,6 +557,79 @@ class CameraController:
             logger.error(f"Autofocus failed: {e}")
             return False
 
+    def drive_focus(self, steps: int) -> bool:
+        """
+        Move the lens focus by a signed number of steps with the
+        manualfocusdrive widget, negative is towards near. Range widgets
+        (Nikon) take the step count directly. Canon's radio widget is driven
+        one smallest step ("Near 1"/"Far 1") at a time so that every step has
+        the same size. Needs live view to be running.
+        """
+        if not self._connected or not self.config_manager:
+            raise CameraNotConnectedException("Camera not connected")
+
+        try:
+            drive_entry = self.config_manager.get_by_name("manualfocusdrive")
+            if not drive_entry or drive_entry.read_only:
+                logger.warning("Manual focus drive not available or not writable")
+                return False
+            if steps == 0:
+                return True
+
+            # Only the drive widget is written, not the whole config tree
+            apply = self.config_manager.apply_single
+            if drive_entry.type == drive_entry.Type.GP_WIDGET_RANGE:
+                apply(drive_entry, float(steps))
+            else:
+                choice = "Near 1" if steps < 0 else "Far 1"
+                if choice not in drive_entry.choices:
+                    raise CameraSettingsException(
+                        f"Unsupported focus drive choices: {drive_entry.choices}"
+                    )
+                for _ in range(abs(steps)):
+                    apply(drive_entry, choice)
+                    # Canon only accepts the next step after a reset to None
+                    if "None" in drive_entry.choices:
+                        apply(drive_entry, "None")
+
+            logger.debug(f"Focus driven by {steps} steps")
+            return True
+
+        except (gp.GPhoto2Error, ValueError) as e:
+            logger.error(f"Focus drive failed: {e}")
+            raise CameraSettingsException(f"Failed to drive focus: {e}")
+
+    def set_liveview_zoom(
+        self, magnification: int, position: Optional[Tuple[int, int]] = None
+    ) -> bool:
+        """
+        Set the camera's own live view magnification (Canon's eoszoom widget,
+        1, 5 or 10) so preview frames carry real sensor pixels. position is
+        the zoom window's centre in sensor coordinates.
+        """
+        if not self._connected or not self.config_manager:
+            raise CameraNotConnectedException("Camera not connected")
+
+        try:
+            zoom_entry = self.config_manager.get_by_name("eoszoom")
+            if not zoom_entry or zoom_entry.read_only:
+                logger.warning("Live view zoom not available or not writable")
+                return False
+
+            if position is not None:
+                position_entry = self.config_manager.get_by_name("eoszoomposition")
+                if position_entry and not position_entry.read_only:
+                    position_entry.set_value(f"{position[0]},{position[1]}")
+
+            zoom_entry.set_value(str(magnification))
+            self.config_manager.apply_changes()
+            logger.info(f"Live view zoom set to {magnification}x")
+            return True
+
+        except (gp.GPhoto2Error, ValueError) as e:
+            logger.error(f"Live view zoom failed: {e}")
+            raise CameraSettingsException(f"Failed to set live view zoom: {e}")
+
     def get_config_tree(self) -> Dict[str, Any]:
         """Get the full configuration tree for debugging/advanced use"""
         if not self._connected or not self.config_manager:
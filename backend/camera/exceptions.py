@@ -26,3 +26,15 @@ class CaptureException(CameraException):
     """Raised when photo capture fails"""
 
     pass
+
+
+class CameraConnectionLostException(CameraException):
+    """Raised when the camera stops responding on the USB bus"""
+
+    pass
+
+
+class CameraStorageException(CameraException):
+    """Raised when listing or reading the camera's memory card fails"""
+
+    pass
@@ -0,0 +1,591 @@
+from collections import OrderedDict, deque
+from types import SimpleNamespace
+from typing import Any, Deque, Dict, List, Optional, Sequence, Tuple
+import io
+import logging
+import math
+import struct
+import time
+import zlib
+
+import gphoto2 as gp
+import numpy as np
+from PIL import Image
+
+from config.settings import settings
+from .backend import CameraBackend
+
+logger = logging.getLogger(__name__)
+
+SIM_MODEL = "Simulated Camera"
+SIM_FOLDER = "/store_00020001/DCIM/100CANON"
+
+RADIO = gp.GP_WIDGET_RADIO
+TEXT = gp.GP_WIDGET_TEXT
+TOGGLE = gp.GP_WIDGET_TOGGLE
+DATE = gp.GP_WIDGET_DATE
+
+# Lens steps of manualfocusdrive between best focus and the start position
+FOCUS_START_OFFSET = 30
+# Star blur per step away from focus, relative to the in-focus blur
+DEFOCUS_PER_STEP = 0.12
+
+# Frames rendered per (size, focus) and reused in turn
+PREVIEW_POOL = 8
+CAPTURE_POOL = 2
+# (size, focus) variants kept rendered
+FRAME_CACHE_ENTRIES = 4
+
+SKY_LEVEL = 18.0
+SKY_NOISE = 3.0
+PIXELS_PER_STAR = 4000
+
+ISO_CHOICES = ["Auto"] + [str(100 * 2**i) for i in range(9)]
+APERTURE_CHOICES = ["2.8", "3.2", "3.5", "4", "4.5", "5", "5.6", "6.3", "7.1", "8"]
+SHUTTER_CHOICES = (
+    ["bulb", "30", "25", "20", "15", "13", "10", "8", "6", "5", "4", "3.2", "2.5"]
+    + ["2", "1.6", "1.3", "1", "0.8", "0.6", "0.5", "0.4", "0.3"]
+    + [f"1/{d}" for d in (4, 8, 15, 30, 60, 125, 250, 500, 1000, 2000, 4000)]
+)
+FOCUS_DRIVE_CHOICES = [
+    "Near 1",
+    "Near 2",
+    "Near 3",
+    "None",
+    "Far 1",
+    "Far 2",
+    "Far 3",
+]
+IMAGE_FORMAT_CHOICES = ["Large Fine JPEG", "RAW", "RAW + Large Fine JPEG"]
+
+# (section, [(name, type, value, choices, read only)]), after a Canon EOS
+CONFIG_SPEC: List[Tuple[str, List[Tuple[str, int, Any, Sequence[str], bool]]]] = [
+    (
+        "actions",
+        [
+            ("autofocusdrive", TOGGLE, 0, (), False),
+            ("manualfocusdrive", RADIO, "None", FOCUS_DRIVE_CHOICES, False),
+            ("eoszoom", TEXT, "1", (), False),
+            ("eoszoomposition", TEXT, "0,0", (), False),
+            ("viewfinder", TOGGLE, 0, (), False),
+            ("eosremoterelease", RADIO, "None", ["None", "Press Full"], False),
+            ("uilock", TOGGLE, 0, (), False),
+            ("popupflash", TOGGLE, 0, (), False),
+        ],
+    ),
+    (
+        "settings",
+        [
+            ("datetime", DATE, 0, (), False),
+            (
+                "capturetarget",
+                RADIO,
+                "Internal RAM",
+                ["Internal RAM", "Memory card"],
+                False,
+            ),
+            ("reviewtime", RADIO, "None", ["None", "2 seconds", "4 seconds"], False),
+            ("evfoutputdevice", RADIO, "PC", ["TFT", "PC", "TFT + PC"], False),
+            ("ownername", TEXT, "", (), False),
+            ("artist", TEXT, "", (), False),
+            ("copyright", TEXT, "", (), False),
+            ("autopoweroff", TEXT, "0", (), False),
+        ],
+    ),
+    (
+        "status",
+        [
+            ("serialnumber", TEXT, "0000000000", (), True),
+            ("manufacturer", TEXT, "Simulated", (), True),
+            ("cameramodel", TEXT, SIM_MODEL, (), True),
+            ("deviceversion", TEXT, "1.0.0", (), True),
+            ("batterylevel", TEXT, "100%", (), True),
+            ("availableshots", TEXT, "9999", (), True),
+            ("lensname", TEXT, "Simulated 200mm f/4", (), True),
+            ("shuttercounter", TEXT, "0", (), True),
+        ],
+    ),
+    (
+        "imgsettings",
+        [
+            ("imageformat", RADIO, "Large Fine JPEG", IMAGE_FORMAT_CHOICES, False),
+            ("iso", RADIO, "800", ISO_CHOICES, False),
+            (
+                "whitebalance",
+                RADIO,
+                "Daylight",
+                ["Auto", "Daylight", "Shadow", "Cloudy", "Tungsten"],
+                False,
+            ),
+            ("colortemperature", TEXT, "5200", (), False),
+            ("colorspace", RADIO, "sRGB", ["sRGB", "AdobeRGB"], False),
+            (
+                "picturestyle",
+                RADIO,
+                "Neutral",
+                ["Standard", "Neutral", "Faithful"],
+                False,
+            ),
+        ],
+    ),
+    (
+        "capturesettings",
+        [
+            ("exposurecompensation", RADIO, "0", ["-2", "-1", "0", "1", "2"], False),
+            ("focusmode", RADIO, "Manual", ["One Shot", "AI Servo", "Manual"], False),
+            (
+                "autofocusmode",
+                RADIO,
+                "Manual",
+                ["One Shot", "AI Servo", "Manual"],
+                False,
+            ),
+            (
+                "autoexposuremode",
+                RADIO,
+                "Manual",
+                ["P", "TV", "AV", "Manual", "Bulb"],
+                False,
+            ),
+            ("drivemode", RADIO, "Single", ["Single", "Continuous"], False),
+            ("aperture", RADIO, "4", APERTURE_CHOICES, False),
+            ("shutterspeed", RADIO, "30", SHUTTER_CHOICES, False),
+            (
+                "meteringmode",
+                RADIO,
+                "Evaluative",
+                ["Evaluative", "Partial", "Spot"],
+                False,
+            ),
+            ("bracketmode", TEXT, "", (), True),
+            ("liveviewsize", RADIO, "Large", ["Large", "Medium", "Small"], False),
+        ],
+    ),
+]
+
+# Vendor PTP properties under "other" pad the tree to a body's usual size
+OTHER_WIDGETS = 140
+
+
+class SimulatedWidget:
+    """A config widget with the gp.CameraWidget methods the app uses"""
+
+    def __init__(
+        self,
+        widget_id: int,
+        name: str,
+        widget_type: int,
+        value: Any = None,
+        choices: Sequence[str] = (),
+        read_only: bool = False,
+    ):
+        self._id = widget_id
+        self._name = name
+        self._type = widget_type
+        self._value = value
+        self._choices = list(choices)
+        self._read_only = read_only
+        self._parent: Optional["SimulatedWidget"] = None
+        self._children: List["SimulatedWidget"] = []
+        self._changed = False
+
+    def add(self, child: "SimulatedWidget") -> "SimulatedWidget":
+        child._parent = self
+        self._children.append(child)
+        return child
+
+    def get_id(self) -> int:
+        return self._id
+
+    def get_name(self) -> str:
+        return self._name
+
+    def get_label(self) -> str:
+        return self._name.capitalize()
+
+    def get_type(self) -> int:
+        return self._type
+
+    def get_readonly(self) -> int:
+        return int(self._read_only)
+
+    def get_value(self) -> Any:
+        return self._value
+
+    def set_value(self, value: Any):
+        self._value = value
+        self._changed = True
+
+    def get_changed(self) -> int:
+        changed, self._changed = self._changed, False
+        return int(changed)
+
+    def get_parent(self) -> Optional["SimulatedWidget"]:
+        return self._parent
+
+    def get_root(self) -> "SimulatedWidget":
+        return self._parent.get_root() if self._parent else self
+
+    def get_children(self) -> List["SimulatedWidget"]:
+        return list(self._children)
+
+    def count_children(self) -> int:
+        return len(self._children)
+
+    def get_child_by_name(self, name: str) -> "SimulatedWidget":
+        for widget in self.walk():
+            if widget._name == name:
+                return widget
+        raise gp.GPhoto2Error(gp.GP_ERROR_BAD_PARAMETERS)
+
+    def count_choices(self) -> int:
+        return len(self._choices)
+
+    def get_choice(self, index: int) -> str:
+        return self._choices[index]
+
+    def walk(self):
+        yield self
+        for child in self._children:
+            yield from child.walk()
+
+
+class SimulatedFile:
+    """gp.CameraFile stand-in holding the data in memory"""
+
+    def __init__(self, data: bytes):
+        self.data = data
+
+    def get_data_and_size(self) -> bytes:
+        return self.data
+
+    def save(self, path: str):
+        with open(path, "wb") as f:
+            f.write(self.data)
+
+
+def render_star_field(
+    width: int, height: int, stars: np.ndarray, blur: float, seed: int
+) -> bytes:
+    """
+    JPEG of a star field: Gaussian stars on a noisy sky, each frame with
+    its own noise and a little seeing jitter. `stars` holds (x, y, flux)
+    with x and y in 0..1, `blur` scales the in-focus star size.
+    """
+    rng = np.random.default_rng(seed)
+    sky = rng.normal(SKY_LEVEL, SKY_NOISE, (height, width)).astype(np.float32)
+    sigma = max(0.6, blur * width / 1000)
+    radius = math.ceil(3 * sigma)
+    offsets = np.arange(-radius, radius + 1, dtype=np.float32)
+    count = min(len(stars), max(20, width * height // PIXELS_PER_STAR))
+    jitter = rng.normal(0, 0.3, (count, 2))
+    for (x, y, flux), (dx, dy) in zip(stars[:count], jitter):
+        cx, cy = x * width + dx, y * height + dy
+        ix, iy = int(cx), int(cy)
+        gx = np.exp(-((offsets - (cx - ix)) ** 2) / (2 * sigma * sigma))
+        gy = np.exp(-((offsets - (cy - iy)) ** 2) / (2 * sigma * sigma))
+        stamp = np.outer(gy, gx) * (flux / (2 * math.pi * sigma * sigma))
+        x0, y0 = ix - radius, iy - radius
+        left, top = max(0, -x0), max(0, -y0)
+        right = min(stamp.shape[1], width - x0)
+        bottom = min(stamp.shape[0], height - y0)
+        if right > left and bottom > top:
+            sky[y0 + top : y0 + bottom, x0 + left : x0 + right] += stamp[
+                top:bottom, left:right
+            ]
+    gray = np.clip(sky, 0, 255).astype(np.uint8)
+    out = io.BytesIO()
+    Image.fromarray(np.dstack([gray, gray, gray])).save(out, "JPEG", quality=90)
+    return out.getvalue()
+
+
+def raw_file(preview: bytes, sensor_bytes: int) -> bytes:
+    """
+    A CR2-like TIFF: IFD0 holds the JPEG preview, IFD1 stands in for the
+    lossless sensor data. Enough for the app's embedded preview reader.
+    """
+    sensor = b"\xff\xd8\xff\xc3\x00\x0b" + bytes(max(0, sensor_bytes - 6))
+
+    def ifd(offset: int, length: int, next_ifd: int) -> bytes:
+        entries = [(0x0103, 3, 1, 6), (0x0111, 4, 1, offset), (0x0117, 4, 1, length)]
+        return (
+            struct.pack("<H", len(entries))
+            + b"".join(struct.pack("<HHII", *entry) for entry in entries)
+            + struct.pack("<I", next_ifd)
+        )
+
+    ifd_size = 2 + 12 * 3 + 4
+    data_offset = 8 + 2 * ifd_size
+    return (
+        b"II*\0"
+        + struct.pack("<I", 8)
+        + ifd(data_offset, len(preview), 8 + ifd_size)
+        + ifd(data_offset + len(preview), len(sensor), 0)
+        + preview
+        + sensor
+    )
+
+
+class SimulatedCamera:
+    """
+    A camera with the gp.Camera methods CameraController uses, for
+    benchmarks and development without hardware.
+
+    Each call sleeps for its configured latency (CAMERA_SIM_*_LATENCY) on
+    the calling thread, as a USB round trip blocks the camera worker. Frames
+    are star fields rendered once per size and focus position and then
+    reused in turn, so generating them costs no CPU during a benchmark.
+    manualfocusdrive moves a simulated focuser (stars grow away from best
+    focus), imageformat selects JPEG, RAW or RAW+JPEG captures, and
+    captured files stay on the simulated card until deleted.
+    """
+
+    def __init__(self, address: str, model: str):
+        self.address = address
+        self.model = model
+        seed = zlib.crc32(address.encode())
+        rng = np.random.default_rng(seed)
+        count = settings.CAMERA_SIM_CAPTURE_WIDTH**2 // PIXELS_PER_STAR
+        self._stars = np.column_stack(
+            [rng.random(count), rng.random(count), 2000 * (rng.pareto(1.5, count) + 1)]
+        )
+        self._seed = seed
+
+        self._state: Dict[str, Any] = {}
+        self._spec: Dict[str, Tuple[str, int, Sequence[str], bool]] = {}
+        for section, widgets in CONFIG_SPEC:
+            for name, widget_type, value, choices, read_only in widgets:
+                self._state[name] = value
+                self._spec[name] = (section, widget_type, choices, read_only)
+        for i in range(OTHER_WIDGETS):
+            name = f"d{0x100 + i:03x}"
+            self._state[name] = str(i)
+            self._spec[name] = ("other", TEXT, (), True)
+        self._state["serialnumber"] = f"{seed:010d}"
+        self._state["cameramodel"] = model
+
+        self._focus = FOCUS_START_OFFSET
+        self._files: Dict[str, Dict[str, Tuple[bytes, int]]] = {SIM_FOLDER: {}}
+        self._events: Deque[Tuple[int, Any]] = deque()
+        self._frames: "OrderedDict[Tuple[int, int, int], List[bytes]]" = OrderedDict()
+        self._frame_index = 0
+        self._shots = 0
+        self._initialised = False
+
+    def _check(self):
+        if not self._initialised:
+            raise gp.GPhoto2Error(gp.GP_ERROR_IO_USB_FIND)
+
+    # Lifecycle
+
+    def init(self, context=None):
+        self._initialised = True
+
+    def exit(self, context=None):
+        self._initialised = False
+
+    def get_port_info(self):
+        return SimpleNamespace(get_path=lambda: self.address)
+
+    def get_abilities(self):
+        return SimpleNamespace(model=self.model)
+
+    # Config
+
+    def _widget(self, widget_id: int, name: str) -> SimulatedWidget:
+        _, widget_type, choices, read_only = self._spec[name]
+        return SimulatedWidget(
+            widget_id, name, widget_type, self._state[name], choices, read_only
+        )
+
+    def get_config(self, context=None) -> SimulatedWidget:
+        self._check()
+        time.sleep(settings.CAMERA_SIM_GET_CONFIG_LATENCY)
+        self._state["datetime"] = int(time.time())
+        root = SimulatedWidget(0, "main", gp.GP_WIDGET_WINDOW)
+        sections: Dict[str, SimulatedWidget] = {}
+        next_id = 1
+        for name, (section, _, _, _) in self._spec.items():
+            if section not in sections:
+                sections[section] = root.add(
+                    SimulatedWidget(next_id, section, gp.GP_WIDGET_SECTION)
+                )
+                next_id += 1
+            sections[section].add(self._widget(next_id, name))
+            next_id += 1
+        return root
+
+    def get_single_config(self, name: str, context=None) -> SimulatedWidget:
+        self._check()
+        if name not in self._spec:
+            raise gp.GPhoto2Error(gp.GP_ERROR_BAD_PARAMETERS)
+        time.sleep(settings.CAMERA_SIM_GET_CONFIG_LATENCY)
+        return self._widget(0, name)
+
+    def set_config(self, config: SimulatedWidget, context=None):
+        self._check()
+        time.sleep(settings.CAMERA_SIM_SET_CONFIG_LATENCY)
+        for widget in config.walk():
+            name = widget.get_name()
+            # Reading the flag clears it, as gp_widget_changed() does
+            if widget.get_changed() and name in self._spec:
+                self._apply(name, widget.get_value())
+
+    def set_single_config(self, name: str, widget: SimulatedWidget, context=None):
+        self._check()
+        time.sleep(settings.CAMERA_SIM_SET_CONFIG_LATENCY)
+        self._apply(name, widget.get_value())
+
+    def _apply(self, name: str, value: Any):
+        _, _, choices, read_only = self._spec[name]
+        if read_only or (choices and value not in choices):
+            raise gp.GPhoto2Error(gp.GP_ERROR_BAD_PARAMETERS)
+        if name == "manualfocusdrive" and value != "None":
+            direction, steps = value.split()
+            self._focus += int(steps) * (1 if direction == "Far" else -1)
+            value = "None"
+        elif name == "autofocusdrive" and value:
+            self._focus = 0
+            value = 0
+        self._state[name] = value
+
+    # Frames
+
+    def _next_frame(self, width: int, pool: int) -> bytes:
+        height = width * 2 // 3
+        key = (width, height, self._focus)
+        frames = self._frames.get(key)
+        if frames is None:
+            blur = 1.0 + abs(self._focus) * DEFOCUS_PER_STEP
+            frames = [
+                render_star_field(width, height, self._stars, blur, self._seed + i)
+                for i in range(pool)
+            ]
+            self._frames[key] = frames
+            while len(self._frames) > FRAME_CACHE_ENTRIES:
+                self._frames.popitem(last=False)
+        self._frames.move_to_end(key)
+        self._frame_index += 1
+        return frames[self._frame_index % len(frames)]
+
+    def capture_preview(self, context=None) -> SimulatedFile:
+        self._check()
+        time.sleep(settings.CAMERA_SIM_PREVIEW_LATENCY)
+        return SimulatedFile(
+            self._next_frame(settings.CAMERA_SIM_PREVIEW_WIDTH, PREVIEW_POOL)
+        )
+
+    def capture(self, capture_type: int, context=None):
+        self._check()
+        time.sleep(settings.CAMERA_SIM_CAPTURE_LATENCY)
+        width = settings.CAMERA_SIM_CAPTURE_WIDTH
+        jpeg = self._next_frame(width, CAPTURE_POOL)
+        self._shots += 1
+        self._state["shuttercounter"] = str(self._shots)
+        stem = f"IMG_{self._shots % 10000:04d}"
+        image_format = self._state["imageformat"]
+
+        files = []
+        if "RAW" in image_format:
+            files.append((f"{stem}.CR2", raw_file(jpeg, width * width)))
+        if "JPEG" in image_format:
+            files.append((f"{stem}.JPG", jpeg))
+        now = int(time.time())
+        for name, data in files:
+            self._files[SIM_FOLDER][name] = (data, now)
+        # Further files of the shot are announced as events, as cameras do
+        for name, _ in files[1:]:
+            self._events.append(
+                (gp.GP_EVENT_FILE_ADDED, SimpleNamespace(folder=SIM_FOLDER, name=name))
+            )
+        return SimpleNamespace(folder=SIM_FOLDER, name=files[0][0])
+
+    def wait_for_event(self, timeout: int, context=None) -> Tuple[int, Any]:
+        self._check()
+        if self._events:
+            return self._events.popleft()
+        time.sleep(timeout / 1000)
+        return gp.GP_EVENT_TIMEOUT, None
+
+    # Storage
+
+    def _file(self, folder: str, name: str) -> Tuple[bytes, int]:
+        try:
+            return self._files[folder][name]
+        except KeyError:
+            raise gp.GPhoto2Error(gp.GP_ERROR_FILE_NOT_FOUND)
+
+    def file_get(
+        self, folder: str, name: str, file_type: int, context=None
+    ) -> SimulatedFile:
+        self._check()
+        time.sleep(settings.CAMERA_SIM_FILE_GET_LATENCY)
+        return SimulatedFile(self._file(folder, name)[0])
+
+    def file_read(
+        self,
+        folder: str,
+        name: str,
+        file_type: int,
+        offset: int,
+        buffer: memoryview,
+        context=None,
+    ) -> int:
+        self._check()
+        data = self._file(folder, name)[0][offset : offset + len(buffer)]
+        buffer[: len(data)] = data
+        return len(data)
+
+    def file_get_info(self, folder: str, name: str, context=None):
+        self._check()
+        data, mtime = self._file(folder, name)
+        image_type = "image/jpeg" if name.endswith(".JPG") else "image/x-canon-cr2"
+        return SimpleNamespace(
+            file=SimpleNamespace(size=len(data), mtime=mtime, type=image_type)
+        )
+
+    def file_delete(self, folder: str, name: str, context=None):
+        self._check()
+        self._file(folder, name)
+        del self._files[folder][name]
+
+    def folder_list_files(self, folder: str, context=None) -> List[Tuple[str, None]]:
+        self._check()
+        folder = folder.rstrip("/") or "/"
+        return [(name, None) for name in sorted(self._files.get(folder, {}))]
+
+    def folder_list_folders(self, folder: str, context=None) -> List[Tuple[str, None]]:
+        self._check()
+        prefix = folder.rstrip("/") + "/"
+        children = {
+            path[len(prefix) :].split("/")[0]
+            for path in self._files
+            if path.startswith(prefix)
+        }
+        return [(name, None) for name in sorted(children)]
+
+
+class SimulatedBackend(CameraBackend):
+    """CAMERA_SIM_COUNT simulated cameras at addresses sim:001, sim:002, ..."""
+
+    name = "simulated"
+
+    def __init__(self):
+        self._cameras = {
+            f"sim:{i + 1:03d}": SimulatedCamera(f"sim:{i + 1:03d}", SIM_MODEL)
+            for i in range(settings.CAMERA_SIM_COUNT)
+        }
+
+    def autodetect(self, context=None) -> List[Tuple[str, str]]:
+        return [(camera.model, address) for address, camera in self._cameras.items()]
+
+    def open(
+        self, address: Optional[str], model: Optional[str], context=None
+    ) -> SimulatedCamera:
+        if address is None:
+            address = next(iter(self._cameras), None)
+        camera = self._cameras.get(address)
+        if camera is None:
+            raise gp.GPhoto2Error(gp.GP_ERROR_MODEL_NOT_FOUND)
+        camera.init(context)
+        return camera
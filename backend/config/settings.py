@@ -7,12 +7,125 @@ class Settings(BaseSettings):
     CAMERA_TIMEOUT: int = 30
     CAPTURE_PATH: str = "./captures"
     PREVIEW_PATH: str = "./previews"
+    CAMERA_HOTPLUG: bool = True  # Rescan cameras on USB hotplug events
+    CAMERA_RESCAN_INTERVAL: float = 60.0  # Fallback autodetect interval (seconds)
+    CAMERA_STATUS_INTERVAL: float = 10.0  # Background status sampling (seconds)
+    CAMERA_RECONNECT_MIN_DELAY: float = 1.0  # First reconnect attempt (seconds)
+    CAMERA_RECONNECT_MAX_DELAY: float = 60.0  # Reconnect backoff cap (seconds)
+    CAMERA_LISTING_TTL: float = 300.0  # Cached camera folder listings (seconds)
+    CAMERA_DOWNLOAD_CHUNK: int = 1024 * 1024  # Bytes per camera file read
+    CAMERA_BACKEND: str = "gphoto2"  # "gphoto2" or "simulated"
+
+    # Simulated camera settings (CAMERA_BACKEND=simulated)
+    CAMERA_SIM_COUNT: int = 1  # Simulated cameras to detect
+    CAMERA_SIM_PREVIEW_LATENCY: float = 0.04  # capture_preview (seconds)
+    CAMERA_SIM_CAPTURE_LATENCY: float = 0.5  # capture (seconds)
+    CAMERA_SIM_FILE_GET_LATENCY: float = 0.3  # file_get (seconds)
+    CAMERA_SIM_GET_CONFIG_LATENCY: float = 0.2  # get_config (seconds)
+    CAMERA_SIM_SET_CONFIG_LATENCY: float = 0.05  # set_config (seconds)
+    CAMERA_SIM_PREVIEW_WIDTH: int = 960  # Live view frame width (3:2)
+    CAMERA_SIM_CAPTURE_WIDTH: int = 3000  # Captured image width (3:2)
+
+    # Live view settings
+    PREVIEW_MAX_FPS: float = 15.0  # Upper bound for live view frame rate
+    PREVIEW_WS_WINDOW: int = 2  # Unacknowledged frames per WebSocket viewer
+    PREVIEW_DEFAULT_QUALITY: int = 80  # JPEG quality for downscaled frames
+    PREVIEW_TRANSCODE_WORKERS: int = 2  # Threads resizing live view frames
+    PREVIEW_TRANSCODE_CACHE_SIZE: int = 32  # Cached (frame, size, quality) variants
+
+    # Focus settings
+    FOCUS_ANALYSIS_MAX_FPS: float = 5.0  # Live view frames measured per second
+    FOCUS_ANALYSIS_WORKERS: int = 1  # Threads computing focus metrics
+    FOCUS_HISTORY_SIZE: int = 600  # Focus metric samples kept per camera
+    FOCUS_SETTLE_TIME: float = 0.3  # Wait after a focus move before measuring
+    FOCUS_BACKLASH_STEPS: int = 0  # Overshoot so every move ends going outward
+
+    # Live stack settings
+    LIVE_STACK_WORKERS: int = 1  # Threads decoding and accumulating frames
+    LIVE_STACK_MAX_WIDTH: int = 2048  # Frames are downscaled to at most this width
+    LIVE_STACK_RENDER_INTERVAL: float = 2.0  # Seconds between stretched renders
+
+    # Lucky imaging recorder settings
+    RECORDING_PATH: str = "./recordings"
+    RECORD_MAX_FPS: float = 60.0  # Live view frame rate cap while recording
+    RECORD_MAX_DURATION: float = 600.0  # Longest allowed recording (seconds)
+    RECORD_WORKERS: int = 2  # Threads decoding and scoring recorded frames
+    RECORD_QUEUE_SIZE: int = 32  # Frames waiting to be written before dropping
+    RECORD_WRITE_BUFFER: int = 8 * 1024 * 1024  # SER file write buffer (bytes)
+
+    # Capture staging settings
+    STAGING_PATH: Optional[str] = None  # Fast tier captures land on, None = off
+    STAGING_MAX_BYTES: int = 512 * 1024 * 1024  # Staged bytes before captures wait
+    STAGING_WAIT_TIMEOUT: float = 10.0  # Wait for room before writing to CAPTURE_PATH
+    STAGING_FSYNC_BATCH: int = 8  # Files moved to CAPTURE_PATH per fsync batch
+
+    # Capture catalog settings
+    CATALOG_PATH: str = "./catalog.sqlite3"  # SQLite index of captures
+    CATALOG_WORKERS: int = 1  # Threads computing statistics and thumbnails
+    THUMBNAIL_PATH: str = "./thumbnails"
+    THUMBNAIL_WIDTH: int = 320  # Longest thumbnail side (pixels)
+    THUMBNAIL_QUALITY: int = 80
+    STATS_MAX_WIDTH: int = 1024  # Images are decoded at about this width for stats
+
+    # Deep zoom tile settings
+    TILE_CACHE_PATH: str = "./tiles"
+    TILE_CACHE_MAX_BYTES: int = 512 * 1024 * 1024  # Rendered levels kept on disk
+    TILE_SIZE: int = 256  # Tile edge (pixels)
+    TILE_QUALITY: int = 85  # Tile JPEG quality
+    TILE_WORKERS: int = 1  # Processes rendering pyramid levels, 0 = one per CPU core
+
+    # Storage retention settings
+    STORAGE_QUOTA_BYTES: int = (
+        0  # Max bytes of captures and derived files, 0 = no quota
+    )
+    STORAGE_MIN_FREE_BYTES: int = (
+        1024 * 1024 * 1024
+    )  # Free space floor on the capture disk
+    STORAGE_MAX_AGE_DAYS: float = (
+        0  # Evict exported/derived files older than this, 0 = never
+    )
+    STORAGE_CHECK_INTERVAL: float = 60.0  # Seconds between background storage checks
+    DELETE_BATCH_SIZE: int = (
+        500  # Files deleted per catalog transaction in bulk deletes
+    )
+
+    # Calibration library settings
+    CALIBRATION_PATH: str = "./calibration"
+    CALIBRATION_WORKERS: int = 0  # Threads combining masters, 0 = one per CPU core
+    CALIBRATION_TILE_BYTES: int = 32 * 1024 * 1024  # Frame stack rows combined at once
+    CALIBRATION_TEMP_TOLERANCE: float = 3.0  # Max deg C between a frame and its dark
+    CALIBRATION_APPLY_TO_CAPTURES: bool = False  # Write a calibrated copy of captures
+
+    # FITS conversion settings
+    FITS_PATH: str = "./fits"
+    FITS_WORKERS: int = 0  # Conversion processes, 0 = one per CPU core
+    FITS_CONVERT_CAPTURES: bool = False  # Convert every new capture to FITS
+
+    # Timelapse settings
+    TIMELAPSE_PATH: str = "./timelapses"
+    TIMELAPSE_WORKERS: int = 0  # Processes resizing frames, 0 = one per CPU core
 
     # Server settings
     HOST: str = "0.0.0.0"
     PORT: int = 8000
     DEBUG: bool = False
 
+    # Profiling settings
+    PROFILING_TOKEN: Optional[str] = (
+        None  # Enables profiling for this token, None = off
+    )
+    PROFILING_PATH: str = "./profiles"  # Collapsed-stack files of timed profiles
+    PROFILING_SAMPLE_INTERVAL: float = 0.01  # Seconds between stack samples
+    PROFILING_MAX_DURATION: float = 300.0  # Longest timed profile (seconds)
+    PROFILING_REQUEST_TIMEOUT: float = 30.0  # Profiled requests are cut off after this
+
+    # Logging settings
+    LOG_BUFFER_SIZE: int = 5000  # Records kept in memory for /api/system/logs
+    LOG_STREAM_QUEUE_SIZE: int = 1000  # Pending records per log stream client
+
+    # Event stream settings
+    EVENT_STREAM_MAX_TOPICS: int = 256  # Pending topics per client before a resync
+
     # USB settings
     USB_VENDOR_ID: Optional[str] = None
     USB_PRODUCT_ID: Optional[str] = None
@@ -3,6 +3,7 @@ from fastapi.staticfiles import StaticFiles
 from fastapi.responses import FileResponse, HTMLResponse
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.middleware.gzip import GZipMiddleware
+from contextlib import asynccontextmanager
 from datetime import datetime
 import logging
 import os
@@ -11,16 +12,69 @@ from pathlib import Path
 from api.camera import router as camera_router
 from api.system import router as system_router
 from api.files import router as files_router
+from api.events import router as events_router
+from api.jobs import router as jobs_router
+from api.calibration import router as calibration_router
 from config.settings import settings
+from services.calibration import calibration_library
+from services.camera_service import camera_service
+from services.camera_storage import camera_storage
+from services.capture_catalog import capture_catalog
+from services.log_buffer import log_buffer
+from services.file_service import file_service
+from services.fits_converter import fits_converter
+from services.focus_analysis import focus_service
+from services.image_stats import frame_stats
+from services.jobs import job_manager
+from services.live_stack import live_stack_service
+from services.preview_service import preview_service
+from services.preview_transcoder import preview_transcoder
+from services.staging import staging_tier
+from services.storage_manager import storage_manager
+from services.tiles import tile_service
+from services.timelapse import timelapse_service
+from services.ser_recorder import recorder_service
 
 # Configure logging
 logging.basicConfig(level=logging.INFO)
+logging.getLogger().addHandler(log_buffer)
 logger = logging.getLogger(__name__)
 
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Start background services
+    camera_service.start_monitoring()
+    capture_catalog.start()
+    storage_manager.start()
+    staging_tier.start()
+    tile_service.start()
+    camera_storage.start()
+    yield
+    await job_manager.shutdown()
+    await storage_manager.shutdown()
+    await staging_tier.shutdown()
+    await capture_catalog.shutdown()
+    await tile_service.shutdown()
+    await camera_storage.shutdown()
+    await focus_service.shutdown()
+    await live_stack_service.shutdown()
+    await recorder_service.shutdown()
+    await preview_service.shutdown()
+    preview_transcoder.shutdown()
+    calibration_library.shutdown()
+    fits_converter.shutdown()
+    file_service.shutdown()
+    timelapse_service.shutdown()
+    frame_stats.shutdown()
+    camera_service.shutdown()
+
+
 app = FastAPI(
     title="Camera Web App",
     description="Telescope Camera Control Interface",
     version="1.0.0",
+    lifespan=lifespan,
 )
 
 # Add gzip compression for better performance
@@ -68,8 +122,21 @@ app.mount("/static", OptimizedStaticFiles(directory=str(STATIC_DIR)), name="stat
 
 # Include API routers
 app.include_router(camera_router, prefix="/api/camera", tags=["camera"])
+app.include_router(camera_router, prefix="/api/cameras/{camera_id}", tags=["cameras"])
 app.include_router(system_router, prefix="/api/system", tags=["system"])
 app.include_router(files_router, prefix="/api/files", tags=["files"])
+app.include_router(events_router, prefix="/api/events", tags=["events"])
+app.include_router(jobs_router, prefix="/api/jobs", tags=["jobs"])
+app.include_router(
+    calibration_router, prefix="/api/calibration", tags=["calibration"]
+)
+
+if settings.PROFILING_TOKEN:
+    # Only installed when enabled, so profiling costs nothing otherwise
+    from api.profiling import ProfilingMiddleware, router as profiling_router
+
+    app.add_middleware(ProfilingMiddleware)
+    app.include_router(profiling_router, prefix="/api/profiling", tags=["profiling"])
 
 
 # Health check endpoint
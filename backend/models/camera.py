@@ -1,5 +1,5 @@
 from pydantic import BaseModel
-from typing import Optional
+from typing import List, Optional
 from datetime import datetime
 
 
@@ -8,6 +8,7 @@ class CameraStatus(BaseModel):
     model: Optional[str] = None
     battery: Optional[int] = None
     storage_available: Optional[int] = None
+    reconnecting: bool = False
 
 
 class CameraSettings(BaseModel):
@@ -22,6 +23,7 @@ class CameraSettings(BaseModel):
 class CaptureResult(BaseModel):
     success: bool
     filename: Optional[str] = None
+    files: List[str] = []  # Every file of the shot, e.g. RAW+JPEG
     url: Optional[str] = None
     message: Optional[str] = None
     timestamp: datetime
@@ -36,4 +38,7 @@ class PreviewResult(BaseModel):
 class FocusResult(BaseModel):
     success: bool
     message: Optional[str] = None
-    position: Optional[int] = None
+    position: Optional[int] = None  # Steps from where the focus run started
+    metric: Optional[str] = None
+    value: Optional[float] = None
+    frames: Optional[int] = None
@@ -1,10 +1,13 @@
-from pydantic import BaseModel
-from typing import Optional, Dict, Any
+from pydantic import BaseModel, Field
+from typing import Optional, Dict, Any, List, Literal
+from datetime import datetime
 
 
 class CaptureRequest(BaseModel):
     filename: Optional[str] = None
     settings: Optional[Dict[str, Any]] = None
+    # Also write a calibrated copy, defaults to CALIBRATION_APPLY_TO_CAPTURES
+    calibrate: Optional[bool] = None
 
 
 class SettingsUpdateRequest(BaseModel):
@@ -18,3 +21,100 @@ class SettingsUpdateRequest(BaseModel):
 class FocusRequest(BaseModel):
     direction: Optional[str] = None  # "near", "far"
     steps: Optional[int] = None
+
+
+class LiveViewZoomRequest(BaseModel):
+    magnification: Literal[1, 5, 10] = 1  # The steps Canon bodies accept
+    x: Optional[int] = None  # Zoom window centre in sensor pixels
+    y: Optional[int] = None
+
+
+class FocusAnalysisRequest(BaseModel):
+    # Optional region of the live view to measure, e.g. around a star
+    x: Optional[int] = Field(None, ge=0)
+    y: Optional[int] = Field(None, ge=0)
+    w: Optional[int] = Field(None, ge=1)
+    h: Optional[int] = Field(None, ge=1)
+    max_fps: Optional[float] = Field(None, gt=0)
+
+
+class AutofocusRequest(BaseModel):
+    metric: Literal["hfr", "fwhm", "laplacian_variance", "brenner"] = "hfr"
+    coarse_step: int = Field(40, ge=1)  # Focus drive steps between coarse samples
+    coarse_range: int = Field(6, ge=2)  # Coarse samples either side of the start
+    fine_step: int = Field(8, ge=1)  # Focus drive steps between fine samples
+    frames: int = Field(1, ge=1, le=10)  # Frames averaged per position
+    # Optional region of the live view to measure, e.g. around a star
+    x: Optional[int] = Field(None, ge=0)
+    y: Optional[int] = Field(None, ge=0)
+    w: Optional[int] = Field(None, ge=1)
+    h: Optional[int] = Field(None, ge=1)
+
+
+class LiveStackRequest(BaseModel):
+    source: Literal["preview", "capture"] = "preview"
+    mode: Literal["mean", "sigma_clip"] = "mean"
+    kappa: float = Field(3.0, gt=0)  # Sigma clipping threshold
+    align: bool = False  # Translation-only alignment by phase correlation
+    calibrate: bool = False  # Apply calibration masters (capture source only)
+
+
+class RecordRequest(BaseModel):
+    duration: float = Field(60.0, gt=0)  # Seconds, capped at RECORD_MAX_DURATION
+    max_frames: Optional[int] = Field(None, ge=1)
+    color: bool = True  # False records 8-bit mono, a third of the size
+
+
+class CalibrationBuildRequest(BaseModel):
+    type: Literal["bias", "dark", "flat"]
+    filenames: List[str] = Field(..., min_length=3)  # Frames in CAPTURE_PATH
+    method: Literal["median", "sigma_clip"] = "median"
+    kappa: float = Field(3.0, gt=0)  # Sigma clipping threshold
+    # Override what is read from the frames' EXIF
+    exposure: Optional[float] = Field(None, gt=0)
+    iso: Optional[int] = Field(None, gt=0)
+    temperature: Optional[float] = None
+
+
+class CalibrationApplyRequest(BaseModel):
+    filenames: List[str] = Field(..., min_length=1)
+    # Masters to use instead of the best match for each frame
+    bias_id: Optional[str] = None
+    dark_id: Optional[str] = None
+    flat_id: Optional[str] = None
+
+
+class FitsConvertRequest(BaseModel):
+    filenames: Optional[List[str]] = None  # All captures when omitted
+    force: bool = False  # Reconvert files whose FITS is up to date
+
+
+class CaptureDeleteRequest(BaseModel):
+    filenames: Optional[List[str]] = None  # Explicit selection, or filter below
+    pattern: Optional[str] = None  # Filename glob, e.g. "capture_17*.jpg"
+    before: Optional[datetime] = None  # Captured before this time
+    after: Optional[datetime] = None  # Captured at or after this time
+    camera_id: Optional[str] = None
+    exported: Optional[bool] = None
+
+
+class TimelapseRequest(BaseModel):
+    filenames: Optional[List[str]] = None  # Frames in order, or filter below
+    pattern: Optional[str] = None  # Filename glob selecting a sequence
+    before: Optional[datetime] = None  # Captured before this time
+    after: Optional[datetime] = None  # Captured at or after this time
+    camera_id: Optional[str] = None
+    fps: float = Field(24.0, gt=0, le=120)
+    width: Optional[int] = Field(None, ge=16, le=8192)  # Resize to this width
+    quality: int = Field(90, ge=10, le=100)  # JPEG quality of resized frames
+    name: Optional[str] = Field(None, pattern=r"^[\w.-]+\.avi$")  # Output file
+
+
+class CameraDownloadRequest(BaseModel):
+    files: List[str] = []  # Camera file paths, e.g. /DCIM/100CANON/IMG_0001.JPG
+    folders: List[str] = []  # Camera folders, downloaded recursively
+
+
+class ProfileRequest(BaseModel):
+    duration: float = Field(10.0, gt=0)  # Seconds to sample for
+    interval: Optional[float] = Field(None, ge=0.001, le=1.0)  # Seconds per sample
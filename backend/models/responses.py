@@ -1,5 +1,5 @@
 from pydantic import BaseModel
-from typing import Optional, Any
+from typing import Optional, Any, List
 from datetime import datetime
 
 
@@ -15,6 +15,34 @@ class FileInfo(BaseModel):
     date: datetime
     url: str
     thumbnail_url: Optional[str] = None
+    media_type: Optional[str] = None
+    companions: List[str] = []  # Other files of the same shot, e.g. its RAW
+
+
+class RecordingInfo(BaseModel):
+    filename: str
+    size: int
+    date: datetime
+    url: str
+    frames: int
+    width: int
+    height: int
+    color: bool
+    ranked: bool  # A sidecar with per-frame quality scores exists
+
+
+class CalibrationMaster(BaseModel):
+    id: str
+    type: str  # "bias", "dark" or "flat"
+    exposure: Optional[float] = None  # Seconds
+    iso: Optional[int] = None
+    temperature: Optional[float] = None  # Mean sensor/ambient temperature, deg C
+    frames: int
+    method: str  # "median" or "sigma_clip"
+    width: int
+    height: int
+    created: datetime
+    sources: List[str] = []
 
 
 class SystemInfo(BaseModel):
@@ -0,0 +1,319 @@
+from typing import Dict, List, Optional, Sequence, Tuple
+import asyncio
+import logging
+
+import numpy as np
+
+from camera.controller import CameraController
+from camera.exceptions import CameraException
+from config.settings import settings
+from models.camera import FocusResult
+from models.requests import AutofocusRequest
+from services.event_bus import event_bus
+from services.focus_analysis import focus_service
+from services.preview_service import PreviewBroadcaster, preview_service
+from services.preview_transcoder import Region
+
+logger = logging.getLogger(__name__)
+
+# Metrics where a smaller value means better focus
+LOWER_IS_BETTER = {"hfr", "fwhm"}
+
+# Stop a sweep once this many positions in a row are worse than the best
+STOP_AFTER_WORSE = 3
+
+# Minimum relative difference between the best and worst sample for the
+# curve to count as a focus curve rather than noise
+MIN_CURVE_CONTRAST = 0.1
+
+# Seconds to wait for a live view frame before giving up
+FRAME_TIMEOUT = 10.0
+
+
+class AutofocusError(CameraException):
+    """Autofocus could not find a best focus position"""
+
+
+def fit_v_curve(positions: np.ndarray, values: np.ndarray) -> Optional[float]:
+    """
+    Intersection of straight lines fitted to both sides of the minimum. HFR
+    grows linearly with defocus, so this is more robust than a parabola
+    when the samples reach far out of focus.
+    """
+    best = int(np.argmin(values))
+    if best < 2 or best > len(values) - 3:
+        return None
+    left_slope, left_icpt = np.polyfit(positions[: best + 1], values[: best + 1], 1)
+    right_slope, right_icpt = np.polyfit(positions[best:], values[best:], 1)
+    if left_slope >= 0 or right_slope <= 0:
+        return None
+    return float((right_icpt - left_icpt) / (left_slope - right_slope))
+
+
+def fit_parabola(
+    positions: np.ndarray, values: np.ndarray, lower_is_better: bool
+) -> Optional[float]:
+    """Vertex of a parabola through the samples around the best one"""
+    best = int(np.argmin(values) if lower_is_better else np.argmax(values))
+    lo, hi = max(0, best - 2), min(len(values), best + 3)
+    if hi - lo < 3:
+        return None
+    a, b, _ = np.polyfit(positions[lo:hi], values[lo:hi], 2)
+    if (a <= 0) if lower_is_better else (a >= 0):
+        return None
+    return float(-b / (2 * a))
+
+
+def estimate_best_position(
+    samples: Sequence[Tuple[int, float]], metric: str
+) -> Tuple[int, bool]:
+    """
+    Best focus position from (position, value) samples. Returns the position
+    and whether it is trustworthy: inside the sampled range (the curve
+    turned) and clearly better than the worst sample.
+    """
+    positions = np.array([p for p, _ in samples], dtype=np.float64)
+    values = np.array([v for _, v in samples], dtype=np.float64)
+    lower_is_better = metric in LOWER_IS_BETTER
+
+    best = int(np.argmin(values) if lower_is_better else np.argmax(values))
+    spread = values.max() - values.min()
+    scale = max(abs(values.max()), abs(values.min()), 1e-9)
+    inside = 0 < best < len(values) - 1 and spread / scale >= MIN_CURVE_CONTRAST
+
+    estimate = None
+    if lower_is_better:
+        estimate = fit_v_curve(positions, values)
+    if estimate is None:
+        estimate = fit_parabola(positions, values, lower_is_better)
+    if estimate is None:
+        estimate = positions[best]
+
+    estimate = min(max(estimate, positions.min()), positions.max())
+    return int(round(estimate)), inside
+
+
+class AutofocusRun:
+    """State of one autofocus run. Positions are steps from the start."""
+
+    def __init__(
+        self,
+        controller: CameraController,
+        broadcaster: PreviewBroadcaster,
+        request: AutofocusRequest,
+        region: Optional[Region],
+    ):
+        self.controller = controller
+        self.broadcaster = broadcaster
+        self.request = request
+        self.region = region
+        self.position = 0
+        self.frames = 0
+
+    def is_better(self, value: float, than: float) -> bool:
+        if self.request.metric in LOWER_IS_BETTER:
+            return value < than
+        return value > than
+
+    async def move_to(self, target: int):
+        steps = target - self.position
+        if steps == 0:
+            return
+        backlash = settings.FOCUS_BACKLASH_STEPS
+        # Finish every move in the outward direction so gear backlash is
+        # taken up the same way for every sample
+        if steps < 0 and backlash:
+            await self._drive(steps - backlash)
+            await self._drive(backlash)
+        else:
+            await self._drive(steps)
+        self.position = target
+
+    async def _drive(self, steps: int):
+        if not await self.controller.run(self.controller.drive_focus, steps):
+            raise AutofocusError("Manual focus drive not available")
+
+    async def measure(self) -> Optional[float]:
+        """Average metric over fresh frames taken after the lens settled"""
+        await asyncio.sleep(settings.FOCUS_SETTLE_TIME)
+        seq = self.broadcaster.latest.seq if self.broadcaster.latest else 0
+        values = []
+        for _ in range(self.request.frames):
+            try:
+                frame = await self.broadcaster.next_frame(seq, timeout=FRAME_TIMEOUT)
+            except asyncio.TimeoutError:
+                raise AutofocusError("No live view frames")
+            seq = frame.seq
+            self.frames += 1
+            sample = await focus_service.measure(frame, self.region)
+            if sample[self.request.metric] is None:
+                return None
+            values.append(sample[self.request.metric])
+        return sum(values) / len(values)
+
+    async def sweep(
+        self, phase: str, positions: Sequence[int]
+    ) -> List[Tuple[int, float]]:
+        """
+        Sample positions in increasing order and stop early once the metric
+        has clearly passed its best value.
+        """
+        samples: List[Tuple[int, float]] = []
+        best: Optional[float] = None
+        improved = False
+        worse = 0
+        for position in positions:
+            await self.move_to(position)
+            value = await self.measure()
+            self.publish(phase, value)
+            if value is None:
+                continue
+
+            samples.append((position, value))
+            if best is None or self.is_better(value, best):
+                improved = best is not None
+                best, worse = value, 0
+            else:
+                worse += 1
+                # Only stop once the metric has improved at least once, far
+                # out of focus the first samples are dominated by noise
+                if improved and worse >= STOP_AFTER_WORSE:
+                    break
+        return samples
+
+    def publish(self, phase: str, value: Optional[float]):
+        event_bus.publish(
+            f"focus.autofocus:{self.controller.address}",
+            "focus.autofocus",
+            {
+                "camera_id": self.controller.address,
+                "phase": phase,
+                "metric": self.request.metric,
+                "position": self.position,
+                "value": value,
+                "frames": self.frames,
+            },
+        )
+
+
+class AutofocusService:
+    """
+    Runs metric-driven autofocus, at most one run per camera.
+
+    A coarse sweep across the whole range brackets the best focus, then a
+    fine sweep around the coarse estimate refines it; both stop as soon as
+    the metric has clearly turned. The best position is taken from a
+    V-curve fit for star size metrics, or a parabola fit for sharpness
+    metrics.
+    """
+
+    def __init__(self):
+        self._runs: Dict[CameraController, asyncio.Task] = {}
+
+    def is_running(self, controller: CameraController) -> bool:
+        task = self._runs.get(controller)
+        return task is not None and not task.done()
+
+    async def run(
+        self,
+        controller: CameraController,
+        request: AutofocusRequest,
+        region: Optional[Region] = None,
+    ) -> FocusResult:
+        task = asyncio.get_running_loop().create_task(
+            self._autofocus(controller, request, region)
+        )
+        self._runs[controller] = task
+        task.add_done_callback(lambda _: self._runs.pop(controller, None))
+        try:
+            # Shielded so the run finishes even if the client goes away
+            return await asyncio.shield(task)
+        except asyncio.CancelledError:
+            if task.cancelled():
+                return FocusResult(success=False, message="Autofocus aborted")
+            raise
+
+    async def abort(self, controller: CameraController) -> bool:
+        task = self._runs.get(controller)
+        if task is None or task.done():
+            return False
+        task.cancel()
+        return True
+
+    async def _autofocus(
+        self,
+        controller: CameraController,
+        request: AutofocusRequest,
+        region: Optional[Region],
+    ) -> FocusResult:
+        broadcaster = preview_service.get_broadcaster(controller)
+        run = AutofocusRun(controller, broadcaster, request, region)
+        logger.info(f"Autofocus started on camera {controller.address}")
+        broadcaster.acquire()
+        try:
+            coarse = request.coarse_step
+            samples = await run.sweep(
+                "coarse",
+                range(
+                    -request.coarse_range * coarse,
+                    request.coarse_range * coarse + 1,
+                    coarse,
+                ),
+            )
+            if len(samples) < 3:
+                return await self._give_up(run, "Too few measurable frames")
+            estimate, found = estimate_best_position(samples, request.metric)
+            if not found:
+                return await self._give_up(
+                    run, "No focus curve found, start closer to focus"
+                )
+
+            samples = await run.sweep(
+                "fine",
+                range(estimate - coarse, estimate + coarse + 1, request.fine_step),
+            )
+            if len(samples) >= 3:
+                estimate, _ = estimate_best_position(samples, request.metric)
+
+            await run.move_to(estimate)
+            value = await run.measure()
+            run.publish("done", value)
+            logger.info(
+                f"Autofocus finished at step {estimate} ({request.metric}={value}, "
+                f"{run.frames} frames)"
+            )
+            return FocusResult(
+                success=True,
+                message=f"Best focus at step {estimate}",
+                position=estimate,
+                metric=request.metric,
+                value=value,
+                frames=run.frames,
+            )
+        except AutofocusError as e:
+            logger.warning(f"Autofocus failed: {e}")
+            return FocusResult(
+                success=False,
+                message=str(e),
+                position=run.position,
+                metric=request.metric,
+                frames=run.frames,
+            )
+        finally:
+            broadcaster.release()
+
+    async def _give_up(self, run: AutofocusRun, reason: str) -> FocusResult:
+        logger.warning(f"Autofocus failed: {reason}, returning to the start")
+        await run.move_to(0)
+        run.publish("failed", None)
+        return FocusResult(
+            success=False,
+            message=reason,
+            position=0,
+            metric=run.request.metric,
+            frames=run.frames,
+        )
+
+
+# Singleton instance
+autofocus_service = AutofocusService()
@@ -0,0 +1,501 @@
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from pathlib import Path
+from typing import Dict, List, Optional, Sequence, Tuple
+import asyncio
+import json
+import logging
+import os
+import threading
+
+import numpy as np
+from PIL import Image
+
+from config.settings import settings
+from models.responses import CalibrationMaster
+from models.requests import CalibrationBuildRequest
+from services.event_bus import event_bus
+from services.file_service import file_service
+from services.image_metadata import exposure_key, read_exif
+from services.jobs import Job
+from services.staging import staging_tier
+
+logger = logging.getLogger(__name__)
+
+# Clipping passes of the sigma-clip combine
+SIGMA_CLIP_ITERATIONS = 3
+
+# Floor of a normalised flat, so dust donuts and vignetted corners are not
+# amplified without bound
+MIN_FLAT = 0.05
+
+# Exposures within this relative difference count as equal
+EXPOSURE_TOLERANCE = 0.01
+
+# Masters kept loaded (or resized to a frame size) for calibrating frames
+MASTER_CACHE_SIZE = 6
+
+# Suffix of calibrated copies of captures
+CALIBRATED_SUFFIX = "_cal"
+
+
+def decode_frame(path: Path) -> np.ndarray:
+    """Decode a capture to a full resolution uint8 RGB array"""
+    with Image.open(path) as image:
+        return np.asarray(image.convert("RGB"))
+
+
+def combine_tile(stack: np.ndarray, method: str, kappa: float) -> np.ndarray:
+    """
+    Combine a (frames, rows, width, channels) tile along the frame axis to
+    float32: per-pixel median, or mean after iterative kappa-sigma clipping.
+    """
+    if method == "median":
+        return np.median(stack, axis=0).astype(np.float32)
+
+    data = stack.astype(np.float32)
+    keep = np.ones(data.shape, dtype=bool)
+    for _ in range(SIGMA_CLIP_ITERATIONS):
+        count = np.maximum(keep.sum(axis=0), 1)
+        mean = np.where(keep, data, 0).sum(axis=0) / count
+        deviation = data - mean
+        std = np.sqrt(np.where(keep, deviation * deviation, 0).sum(axis=0) / count)
+        clipped = np.abs(deviation) <= kappa * np.maximum(std, 0.5)
+        if np.array_equal(clipped, keep):
+            break
+        keep = clipped
+    count = keep.sum(axis=0)
+    total = np.where(keep, data, 0).sum(axis=0)
+    # A pixel whose values were all rejected falls back to the median
+    return np.where(
+        count > 0, total / np.maximum(count, 1), np.median(data, axis=0)
+    ).astype(np.float32)
+
+
+def tile_rows(frames: int, width: int, channels: int, tile_bytes: int) -> int:
+    """Rows per combine tile so one float32 tile stays within tile_bytes"""
+    return max(1, tile_bytes // (frames * width * channels * 4))
+
+
+def resize_master(master: np.ndarray, shape: Tuple[int, ...]) -> np.ndarray:
+    """Area-average a master to another frame size, one channel at a time"""
+    height, width = shape[:2]
+    channels = [
+        np.asarray(
+            Image.fromarray(np.ascontiguousarray(master[:, :, c])).resize(
+                (width, height), Image.BOX
+            )
+        )
+        for c in range(master.shape[2])
+    ]
+    return np.stack(channels, axis=2)
+
+
+class CalibrationLibrary:
+    """
+    Master bias, dark and flat frames built from captures.
+
+    Frames are decoded one by one into a memory-mapped stack on disk and
+    combined in row tiles on a pool of worker threads (one per core by
+    default), so peak memory is a small multiple of CALIBRATION_TILE_BYTES
+    per worker regardless of frame count or size. Masters are stored as
+    float32 .npy files with an index.json and matched to frames by exposure,
+    ISO and temperature.
+    """
+
+    def __init__(self, path: Path, workers: int, tile_bytes: int):
+        self.path = path
+        self.path.mkdir(parents=True, exist_ok=True)
+        self.tile_bytes = tile_bytes
+        self.workers = workers or os.cpu_count() or 1
+        self._executor = ThreadPoolExecutor(
+            max_workers=self.workers, thread_name_prefix="calibration"
+        )
+        self._lock = threading.Lock()
+        self._masters: Dict[str, CalibrationMaster] = self._load_index()
+        self._cache: "OrderedDict[Tuple[str, Tuple[int, ...]], np.ndarray]" = (
+            OrderedDict()
+        )
+
+    # Library index
+
+    def _load_index(self) -> Dict[str, CalibrationMaster]:
+        index = self.path / "index.json"
+        if not index.exists():
+            return {}
+        try:
+            entries = json.loads(index.read_text())
+            return {e["id"]: CalibrationMaster(**e) for e in entries}
+        except Exception as e:
+            logger.error(f"Could not read calibration index {index}: {e}")
+            return {}
+
+    def _save_index(self):
+        index = self.path / "index.json"
+        tmp = index.with_suffix(".tmp")
+        entries = [m.dict() for m in self._masters.values()]
+        tmp.write_text(json.dumps(entries, indent=1, default=str))
+        os.replace(tmp, index)
+
+    def master_path(self, master_id: str) -> Path:
+        return self.path / f"{master_id}.npy"
+
+    def list(self) -> List[CalibrationMaster]:
+        return sorted(self._masters.values(), key=lambda m: m.created, reverse=True)
+
+    def get(self, master_id: str) -> Optional[CalibrationMaster]:
+        return self._masters.get(master_id)
+
+    def delete(self, master_id: str) -> bool:
+        with self._lock:
+            if self._masters.pop(master_id, None) is None:
+                return False
+            self._save_index()
+            for key in [k for k in self._cache if k[0] == master_id]:
+                del self._cache[key]
+        self.master_path(master_id).unlink(missing_ok=True)
+        return True
+
+    def find(
+        self,
+        master_type: str,
+        exposure: Optional[float] = None,
+        iso: Optional[int] = None,
+        temperature: Optional[float] = None,
+    ) -> Optional[CalibrationMaster]:
+        """
+        Best master of a type for a frame. Darks must match exposure and
+        ISO, biases ISO; flats only depend on the optics so the newest one
+        is used. Among matches the closest temperature wins (within
+        CALIBRATION_TEMP_TOLERANCE), then the newest. Unknown ISO or
+        temperature on either side matches anything, but a dark is only
+        chosen for a known, matching exposure.
+        """
+        candidates = []
+        for master in self.list():
+            if master.type != master_type:
+                continue
+            if master_type in ("bias", "dark") and None not in (iso, master.iso):
+                if iso != master.iso:
+                    continue
+            if master_type == "dark":
+                if None in (exposure, master.exposure):
+                    continue
+                if abs(exposure - master.exposure) > EXPOSURE_TOLERANCE * exposure:
+                    continue
+            distance = 0.0
+            if master_type != "flat" and None not in (temperature, master.temperature):
+                distance = abs(temperature - master.temperature)
+                if distance > settings.CALIBRATION_TEMP_TOLERANCE:
+                    continue
+            candidates.append((distance, master))
+        if not candidates:
+            return None
+        # list() is newest first and min() keeps the first of equal distances
+        return min(candidates, key=lambda c: c[0])[1]
+
+    # Building masters
+
+    async def build(self, job: Job, request: CalibrationBuildRequest):
+        """Build a master from captures, run as a job"""
+        paths = []
+        for filename in request.filenames:
+            path = staging_tier.find(filename)
+            if path is None:
+                raise ValueError(f"Capture not found: {filename}")
+            paths.append(path)
+
+        loop = asyncio.get_running_loop()
+        exif = await loop.run_in_executor(
+            self._executor, lambda: [read_exif(p) for p in paths]
+        )
+        width, height = exif[0].get("width"), exif[0].get("height")
+        if not width or not height:
+            raise ValueError(f"Could not read {paths[0].name}")
+        for path, info in zip(paths, exif):
+            if (info.get("width"), info.get("height")) != (width, height):
+                raise ValueError(f"{path.name} is not {width}x{height}")
+
+        def common(field: str):
+            values = [info[field] for info in exif if field in info]
+            return values[0] if values else None
+
+        temperatures = [info["temperature"] for info in exif if "temperature" in info]
+        exposure = request.exposure or common("exposure")
+        iso = request.iso or common("iso")
+        temperature = request.temperature
+        if temperature is None and temperatures:
+            temperature = round(float(np.mean(temperatures)), 1)
+
+        master_id = self._new_id(request.type)
+        frames = len(paths)
+        tiles = -(-height // tile_rows(frames, width, 3, self.tile_bytes))
+        job.update(0, frames + tiles, f"Decoding {frames} frames")
+
+        tmp_dir = self.path / "tmp"
+        tmp_dir.mkdir(exist_ok=True)
+        stack_path = tmp_dir / f"{master_id}.stack"
+        out_path = tmp_dir / f"{master_id}.npy"
+        try:
+            stack = np.memmap(
+                stack_path, dtype=np.uint8, mode="w+", shape=(frames, height, width, 3)
+            )
+            await self._decode_into(job, stack, paths)
+            out = np.lib.format.open_memmap(
+                out_path, mode="w+", dtype=np.float32, shape=(height, width, 3)
+            )
+            await self._combine(job, stack, out, request.method, request.kappa)
+            del stack
+
+            if request.type == "flat":
+                job.update(message="Normalising flat")
+                bias = self.find("bias", iso=iso)
+                await loop.run_in_executor(self._executor, self._normalise, out, bias)
+            out.flush()
+            del out
+            os.replace(out_path, self.master_path(master_id))
+        finally:
+            stack_path.unlink(missing_ok=True)
+            out_path.unlink(missing_ok=True)
+
+        master = CalibrationMaster(
+            id=master_id,
+            type=request.type,
+            exposure=exposure,
+            iso=iso,
+            temperature=temperature,
+            frames=frames,
+            method=request.method,
+            width=width,
+            height=height,
+            created=datetime.now(),
+            sources=[p.name for p in paths],
+        )
+        with self._lock:
+            self._masters[master_id] = master
+            self._save_index()
+        logger.info(
+            f"Built master {master_id} ({exposure_key(exposure, iso, temperature)}) "
+            f"from {frames} frames"
+        )
+        return master.dict()
+
+    def _new_id(self, master_type: str) -> str:
+        stamp = datetime.now().strftime("%Y%m%d_%H%M%S")
+        master_id, n = f"{master_type}_{stamp}", 1
+        while master_id in self._masters or self.master_path(master_id).exists():
+            n += 1
+            master_id = f"{master_type}_{stamp}_{n}"
+        return master_id
+
+    async def _decode_into(self, job: Job, stack: np.ndarray, paths: Sequence[Path]):
+        loop = asyncio.get_running_loop()
+        done = 0
+
+        def decode(i: int):
+            job.check_cancelled()
+            stack[i] = decode_frame(paths[i])
+
+        # At most one decoded frame per worker is held in memory
+        for future in asyncio.as_completed(
+            [loop.run_in_executor(self._executor, decode, i) for i in range(len(paths))]
+        ):
+            await future
+            done += 1
+            job.update(done, message=f"Decoded {done}/{len(paths)} frames")
+
+    async def _combine(
+        self, job: Job, stack: np.ndarray, out: np.ndarray, method: str, kappa: float
+    ):
+        loop = asyncio.get_running_loop()
+        frames, height, width, channels = stack.shape
+        rows = tile_rows(frames, width, channels, self.tile_bytes)
+        done = job.done
+
+        def combine(top: int):
+            job.check_cancelled()
+            out[top : top + rows] = combine_tile(
+                stack[:, top : top + rows], method, kappa
+            )
+
+        for future in asyncio.as_completed(
+            [
+                loop.run_in_executor(self._executor, combine, top)
+                for top in range(0, height, rows)
+            ]
+        ):
+            await future
+            done += 1
+            job.update(done, message=f"Combining rows ({method})")
+
+    def _normalise(self, flat: np.ndarray, offset: Optional[CalibrationMaster]):
+        """Remove the bias and scale each channel of a flat to a median of 1"""
+        rows = tile_rows(1, flat.shape[1], 3, self.tile_bytes)
+        bias = None
+        if offset and (offset.height, offset.width) == flat.shape[:2]:
+            bias = self.load(offset, flat.shape)
+        if bias is not None:
+            for top in range(0, flat.shape[0], rows):
+                flat[top : top + rows] -= bias[top : top + rows]
+        medians = np.median(flat[::4, ::4].reshape(-1, 3), axis=0)
+        medians = np.maximum(medians, 1e-3)
+        for top in range(0, flat.shape[0], rows):
+            band = flat[top : top + rows]
+            band /= medians
+            np.maximum(band, MIN_FLAT, out=band)
+
+    # Applying masters
+
+    def load(self, master: CalibrationMaster, shape: Tuple[int, ...]) -> np.ndarray:
+        """A master at the given frame size; full size masters are memory-mapped"""
+        key = (master.id, tuple(shape[:2]))
+        with self._lock:
+            data = self._cache.get(key)
+            if data is not None:
+                self._cache.move_to_end(key)
+                return data
+        data = np.load(self.master_path(master.id), mmap_mode="r")
+        if data.shape[:2] != tuple(shape[:2]):
+            data = resize_master(data, shape)
+        with self._lock:
+            self._cache[key] = data
+            while len(self._cache) > MASTER_CACHE_SIZE:
+                self._cache.popitem(last=False)
+        return data
+
+    def select(
+        self,
+        exposure: Optional[float] = None,
+        iso: Optional[int] = None,
+        temperature: Optional[float] = None,
+        bias_id: Optional[str] = None,
+        dark_id: Optional[str] = None,
+        flat_id: Optional[str] = None,
+    ) -> Tuple[Optional[CalibrationMaster], Optional[CalibrationMaster]]:
+        """
+        (offset, flat) masters for a frame. The offset is a matching dark,
+        which includes the bias, or a bias when there is no dark.
+        """
+        offset = self._masters.get(dark_id or bias_id or "")
+        if offset is None:
+            if exposure is None:
+                logger.warning("Frame exposure unknown, calibrating without a dark")
+            offset = self.find("dark", exposure, iso, temperature) or self.find(
+                "bias", exposure, iso, temperature
+            )
+        flat = self._masters.get(flat_id or "") or self.find("flat")
+        return offset, flat
+
+    def calibrate(
+        self,
+        image: np.ndarray,
+        offset: Optional[CalibrationMaster],
+        flat: Optional[CalibrationMaster],
+    ) -> np.ndarray:
+        """Subtract the offset and divide by the flat, in place on a float array"""
+        offset_data = self.load(offset, image.shape) if offset else None
+        flat_data = self.load(flat, image.shape) if flat else None
+        if offset_data is not None:
+            image -= offset_data
+        if flat_data is not None:
+            image /= flat_data
+        np.maximum(image, 0, out=image)
+        return image
+
+    def calibrate_file(
+        self,
+        path: Path,
+        bias_id: Optional[str] = None,
+        dark_id: Optional[str] = None,
+        flat_id: Optional[str] = None,
+    ) -> Optional[Path]:
+        """
+        Write a calibrated copy of a capture next to it. Returns the new
+        path, or None if there is no master to apply.
+        """
+        info = read_exif(path)
+        offset, flat = self.select(
+            info.get("exposure"),
+            info.get("iso"),
+            info.get("temperature"),
+            bias_id,
+            dark_id,
+            flat_id,
+        )
+        if not offset and not flat:
+            return None
+
+        with Image.open(path) as source:
+            exif = source.info.get("exif")
+            pixels = np.asarray(source.convert("RGB"))
+        offset_data = self.load(offset, pixels.shape) if offset else None
+        flat_data = self.load(flat, pixels.shape) if flat else None
+        result = np.empty_like(pixels)
+        # Float conversion band by band keeps memory near the uint8 frame size
+        for top in range(0, pixels.shape[0], 256):
+            band = pixels[top : top + 256].astype(np.float32)
+            if offset_data is not None:
+                band -= offset_data[top : top + 256]
+            if flat_data is not None:
+                band /= flat_data[top : top + 256]
+            result[top : top + 256] = np.clip(band + 0.5, 0, 255)
+
+        # Derived copies skip the staging tier, nothing waits for them
+        target = Path(settings.CAPTURE_PATH) / (
+            f"{path.stem}{CALIBRATED_SUFFIX}{path.suffix}"
+        )
+        tmp = target.with_name(f".{target.name}.tmp")
+        save_args = {"quality": 95}
+        if exif:
+            save_args["exif"] = exif
+        Image.fromarray(result).save(tmp, "JPEG", **save_args)
+        os.replace(tmp, target)
+        logger.info(
+            f"Calibrated {path.name} with "
+            f"{', '.join(m.id for m in (offset, flat) if m)}"
+        )
+        return target
+
+    async def calibrate_files(
+        self,
+        job: Job,
+        filenames: Sequence[str],
+        bias_id: Optional[str] = None,
+        dark_id: Optional[str] = None,
+        flat_id: Optional[str] = None,
+    ) -> List[str]:
+        """Calibrate captures one after another, run as a job"""
+        loop = asyncio.get_running_loop()
+        written = []
+        job.update(0, len(filenames))
+        for i, filename in enumerate(filenames):
+            job.check_cancelled()
+            path = staging_tier.find(filename)
+            if path is None:
+                raise ValueError(f"Capture not found: {filename}")
+            target = await loop.run_in_executor(
+                self._executor, self.calibrate_file, path, bias_id, dark_id, flat_id
+            )
+            if target:
+                written.append(target.name)
+                file_info = file_service.get_file_info(target.name)
+                if file_info:
+                    event_bus.publish(
+                        f"capture:{target.name}",
+                        "capture.completed",
+                        {"calibrated_from": filename, **file_info.dict()},
+                    )
+            job.update(i + 1, message=f"Calibrated {i + 1}/{len(filenames)}")
+        return written
+
+    def shutdown(self):
+        self._executor.shutdown(wait=False)
+
+
+# Singleton instance
+calibration_library = CalibrationLibrary(
+    path=Path(settings.CALIBRATION_PATH),
+    workers=settings.CALIBRATION_WORKERS,
+    tile_bytes=settings.CALIBRATION_TILE_BYTES,
+)
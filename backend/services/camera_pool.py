@@ -0,0 +1,135 @@
+from typing import Dict, List, Optional
+import logging
+import threading
+
+from camera.controller import CameraController
+from services.camera_registry import CameraRegistry
+
+logger = logging.getLogger(__name__)
+
+
+class CameraNotFoundError(KeyError):
+    """Raised when a camera id does not match any known camera"""
+
+    pass
+
+
+class CameraPool:
+    """
+    Pool of CameraController instances keyed by gphoto2 port address.
+
+    The port address (e.g. "usb:001,005") doubles as the camera id in the
+    API. Each controller owns its own gp.Context and worker thread, so
+    different cameras can capture and preview in parallel. When no camera
+    id is given the default camera is used: the first connected one, else
+    the first detected one.
+    """
+
+    def __init__(self, registry: CameraRegistry):
+        self.registry = registry
+        self._controllers: Dict[str, CameraController] = {}
+        self._lock = threading.Lock()
+        # Stand-in used when no camera has been detected at all
+        self._unbound = CameraController()
+        # Last explicitly connected camera, stays default while reconnecting
+        self._default: Optional[CameraController] = None
+
+    def controllers(self) -> List[CameraController]:
+        with self._lock:
+            return list(self._controllers.values())
+
+    def get(self, camera_id: Optional[str] = None) -> CameraController:
+        """Return the controller for a camera id, creating it on first use"""
+        if camera_id is None:
+            return self.get_default()
+
+        with self._lock:
+            controller = self._controllers.get(camera_id)
+            if controller:
+                return controller
+
+        for name, addr in self.registry.get_cameras():
+            if addr == camera_id:
+                return self._get_or_create(addr, name)
+        raise CameraNotFoundError(camera_id)
+
+    def get_default(self) -> CameraController:
+        with self._lock:
+            if self._default and self._default.connected:
+                return self._default
+            for controller in self._controllers.values():
+                if controller.connected:
+                    return controller
+            if self._default:
+                return self._default
+
+        cameras = self.registry.get_cameras()
+        if cameras:
+            name, addr = cameras[0]
+            return self._get_or_create(addr, name)
+        return self._unbound
+
+    def _get_or_create(self, address: str, model: Optional[str]) -> CameraController:
+        with self._lock:
+            controller = self._controllers.get(address)
+            if controller is None:
+                controller = CameraController(address=address, model=model)
+                self._controllers[address] = controller
+                logger.info(f"Added camera {model} at {address} to pool")
+            return controller
+
+    async def connect(self, camera_id: Optional[str] = None) -> CameraController:
+        """
+        Connect a camera. Without an id this rescans the bus and connects
+        the first camera that is not already connected.
+        """
+        if camera_id is None:
+            await self._unbound.run(self.registry.refresh)
+            cameras = self.registry.get_cameras()
+            if not cameras:
+                return self._unbound
+            with self._lock:
+                connected = {
+                    addr for addr, c in self._controllers.items() if c.connected
+                }
+            name, addr = next(
+                ((n, a) for n, a in cameras if a not in connected), cameras[0]
+            )
+            controller = self._get_or_create(addr, name)
+        else:
+            controller = self.get(camera_id)
+
+        if not controller.connected:
+            await controller.run(controller.connect)
+        if controller.connected:
+            with self._lock:
+                if not (self._default and self._default.connected):
+                    self._default = controller
+        return controller
+
+    def rebind(self, controller: CameraController, address: str):
+        """Move a controller to a new address, e.g. after the camera was replugged"""
+        with self._lock:
+            if self._controllers.get(controller.address) is controller:
+                del self._controllers[controller.address]
+            old_address = controller.address
+            controller.rebind(address)
+            self._controllers[address] = controller
+        logger.info(f"Camera {controller.model} moved from {old_address} to {address}")
+
+    def is_known(self, address: str) -> bool:
+        with self._lock:
+            return address in self._controllers
+
+    def is_connected(self, address: str) -> bool:
+        with self._lock:
+            controller = self._controllers.get(address)
+        return bool(controller and controller.connected)
+
+    def close(self):
+        """Disconnect every camera and stop the worker threads"""
+        for controller in self.controllers() + [self._unbound]:
+            try:
+                controller.shutdown()
+            except Exception as e:
+                logger.error(f"Error shutting down camera {controller.address}: {e}")
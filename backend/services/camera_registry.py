@@ -0,0 +1,189 @@
+from typing import Dict, List, Optional, Tuple
+import logging
+import socket
+import threading
+import time
+
+import gphoto2 as gp
+
+from camera.backend import get_backend
+
+logger = logging.getLogger(__name__)
+
+# From linux/netlink.h, not exposed by the socket module
+NETLINK_KOBJECT_UEVENT = 15
+KERNEL_UEVENT_GROUP = 1
+
+
+class CameraRegistry:
+    """
+    Caches the result of camera autodetection.
+
+    Autodetect walks the whole USB bus, so it only runs when a USB hotplug
+    event has been seen, when explicitly invalidated, or after the periodic
+    fallback interval. Hotplug events come from the kernel uevent netlink
+    socket where available; otherwise only the periodic rescan applies.
+    """
+
+    def __init__(self, rescan_interval: float = 60.0, settle_delay: float = 1.0):
+        self.rescan_interval = rescan_interval
+        self.settle_delay = settle_delay
+
+        self._lock = threading.Lock()
+        self._cameras: List[Tuple[str, str]] = []
+        self._last_scan: Optional[float] = None
+        self._due: Optional[float] = 0.0
+        self._changed = threading.Event()
+
+        self._hotplug_thread: Optional[threading.Thread] = None
+        self._hotplug_socket: Optional[socket.socket] = None
+        self._stop = threading.Event()
+
+    @property
+    def hotplug_active(self) -> bool:
+        return self._hotplug_thread is not None and self._hotplug_thread.is_alive()
+
+    def start_hotplug_listener(self) -> bool:
+        """Listen for USB add/remove uevents, returns False if unsupported"""
+        if self.hotplug_active:
+            return True
+
+        try:
+            sock = socket.socket(
+                socket.AF_NETLINK, socket.SOCK_DGRAM, NETLINK_KOBJECT_UEVENT
+            )
+            sock.bind((0, KERNEL_UEVENT_GROUP))
+            sock.settimeout(1.0)
+        except (AttributeError, OSError) as e:
+            logger.warning(
+                f"USB hotplug events unavailable ({e}), "
+                f"falling back to rescanning every {self.rescan_interval}s"
+            )
+            return False
+
+        self._stop.clear()
+        self._hotplug_socket = sock
+        self._hotplug_thread = threading.Thread(
+            target=self._hotplug_loop, name="camera-hotplug", daemon=True
+        )
+        self._hotplug_thread.start()
+        logger.info("Listening for USB hotplug events")
+        return True
+
+    def stop_hotplug_listener(self):
+        self._stop.set()
+        if self._hotplug_thread:
+            self._hotplug_thread.join(timeout=2)
+            self._hotplug_thread = None
+        if self._hotplug_socket:
+            self._hotplug_socket.close()
+            self._hotplug_socket = None
+
+    def _hotplug_loop(self):
+        while not self._stop.is_set():
+            try:
+                data = self._hotplug_socket.recv(16384)
+            except socket.timeout:
+                continue
+            except OSError as e:
+                logger.error(f"USB hotplug listener stopped: {e}")
+                break
+
+            event = self._parse_uevent(data)
+            if (
+                event.get("SUBSYSTEM") == "usb"
+                and event.get("DEVTYPE") == "usb_device"
+                and event.get("ACTION") in ("add", "remove")
+            ):
+                logger.debug(
+                    f"USB {event['ACTION']} event for {event.get('DEVPATH')}"
+                )
+                # Give the device node time to settle before probing the bus
+                self.invalidate(delay=self.settle_delay)
+
+    @staticmethod
+    def _parse_uevent(data: bytes) -> Dict[str, str]:
+        event = {}
+        # Kernel uevents are "action@devpath" followed by NUL separated KEY=VALUE
+        for field in data.split(b"\0")[1:]:
+            key, sep, value = field.partition(b"=")
+            if sep:
+                event[key.decode(errors="replace")] = value.decode(errors="replace")
+        return event
+
+    def invalidate(self, delay: float = 0.0):
+        """Schedule a rescan after `delay` seconds"""
+        due = time.monotonic() + delay
+        with self._lock:
+            if self._due is None or due < self._due:
+                self._due = due
+        self._changed.set()
+
+    def seconds_until_due(self, default: float) -> float:
+        """Time until the next pending or periodic rescan, capped at `default`"""
+        now = time.monotonic()
+        with self._lock:
+            candidates = [default]
+            if self._due is not None:
+                candidates.append(self._due - now)
+            if self._last_scan is not None:
+                candidates.append(self._last_scan + self.rescan_interval - now)
+        return max(0.0, min(candidates))
+
+    def wake(self):
+        """Wake anyone blocked in wait_for_change without scheduling a rescan"""
+        self._changed.set()
+
+    def wait_for_change(self, timeout: float) -> bool:
+        """Block until a rescan is scheduled or `timeout` elapses"""
+        changed = self._changed.wait(timeout)
+        self._changed.clear()
+        return changed
+
+    def refresh_if_needed(self) -> bool:
+        """Rescan if invalidated or stale, returns True if the camera list changed"""
+        now = time.monotonic()
+        with self._lock:
+            needed = (self._due is not None and now >= self._due) or (
+                self._last_scan is not None
+                and now - self._last_scan >= self.rescan_interval
+            )
+        if not needed:
+            return False
+        return self.refresh()
+
+    def refresh(self) -> bool:
+        """Run camera autodetection now, returns True if the camera list changed"""
+        try:
+            context = gp.Context()
+            cameras = get_backend().autodetect(context)
+        except gp.GPhoto2Error as e:
+            logger.error(f"Camera autodetection failed: {e}")
+            with self._lock:
+                # Keep the previous result and retry on the periodic schedule
+                self._last_scan = time.monotonic()
+                self._due = None
+            return False
+
+        with self._lock:
+            changed = cameras != self._cameras
+            self._cameras = cameras
+            self._last_scan = time.monotonic()
+            self._due = None
+
+        if changed:
+            logger.info(
+                f"Detected cameras: {', '.join(f'{n} ({a})' for n, a in cameras) or 'none'}"
+            )
+        return changed
+
+    def get_cameras(self) -> List[Tuple[str, str]]:
+        """Return cached (name, address) pairs, scanning once if never scanned"""
+        if self._last_scan is None:
+            self.refresh()
+        with self._lock:
+            return list(self._cameras)
+
+    def is_present(self, address: Optional[str]) -> bool:
+        with self._lock:
+            return any(addr == address for _, addr in self._cameras)
@@ -1,22 +1,54 @@
-from typing import Optional
+from concurrent.futures import Future
+from typing import Dict, Optional
 import logging
 import threading
 import time
 
 from camera.controller import CameraController
+from camera.exceptions import CameraConnectionLostException
+from config.settings import settings
 from models.camera import CameraStatus
+from services.camera_pool import CameraPool
+from services.camera_registry import CameraRegistry
+from services.event_bus import event_bus
 
 logger = logging.getLogger(__name__)
 
+MONITOR_TICK = 1.0
+
+
+class CameraHealth:
+    """Monitor bookkeeping for one camera"""
+
+    def __init__(self):
+        self.status: Optional[CameraStatus] = None
+        self.sampled_at = 0.0
+        self.pending: Optional[Future] = None
+        self.lost = False
+        self.backoff = settings.CAMERA_RECONNECT_MIN_DELAY
+        self.next_attempt = 0.0
+
+    def busy(self) -> bool:
+        return self.pending is not None and not self.pending.done()
+
 
 class CameraService:
-    """Service to manage camera connections and operations"""
+    """
+    Service to manage camera connections and operations.
+
+    The monitor thread owns camera status: it samples every connected camera
+    in the background on that camera's worker, and API requests are answered
+    from the cached result. A camera that drops off the USB bus is
+    reconnected automatically with exponential backoff.
+    """
 
     def __init__(self):
-        self.camera_controller = CameraController()
+        self.registry = CameraRegistry(rescan_interval=settings.CAMERA_RESCAN_INTERVAL)
+        self.pool = CameraPool(self.registry)
         self._status_monitor_thread: Optional[threading.Thread] = None
         self._monitoring = False
-        self._last_status: Optional[CameraStatus] = None
+        self._health: Dict[CameraController, CameraHealth] = {}
+        self._health_lock = threading.Lock()
 
     def start_monitoring(self):
         """Start background monitoring of camera status"""
@@ -24,8 +56,10 @@ class CameraService:
             return
 
         self._monitoring = True
+        if settings.CAMERA_HOTPLUG:
+            self.registry.start_hotplug_listener()
         self._status_monitor_thread = threading.Thread(
-            target=self._monitor_camera_status, daemon=True
+            target=self._monitor_camera_status, name="camera-monitor", daemon=True
         )
         self._status_monitor_thread.start()
         logger.info("Camera monitoring started")
@@ -33,40 +67,162 @@ class CameraService:
     def stop_monitoring(self):
         """Stop background monitoring"""
         self._monitoring = False
+        # Wake the monitor thread so it notices the flag
+        self.registry.wake()
         if self._status_monitor_thread:
             self._status_monitor_thread.join(timeout=5)
+        self.registry.stop_hotplug_listener()
         logger.info("Camera monitoring stopped")
 
+    def _get_health(self, controller: CameraController) -> CameraHealth:
+        with self._health_lock:
+            health = self._health.get(controller)
+            if health is None:
+                health = self._health[controller] = CameraHealth()
+            return health
+
     def _monitor_camera_status(self):
         """Background thread to monitor camera status"""
         while self._monitoring:
             try:
-                current_status = self.camera_controller.get_status()
-
-                # Check for status changes
-                if (
-                    self._last_status
-                    and current_status.connected != self._last_status.connected
-                ):
-                    if current_status.connected:
-                        logger.info("Camera connected")
-                    else:
-                        logger.warning("Camera disconnected")
-
-                self._last_status = current_status
+                self.registry.refresh_if_needed()
+                now = time.monotonic()
+
+                for controller in self.pool.controllers():
+                    health = self._get_health(controller)
+                    # Never queue more than one monitor job behind a long capture
+                    if health.busy():
+                        continue
+
+                    if controller.connected:
+                        if not self.registry.is_present(controller.address):
+                            health.pending = controller.submit(
+                                self._handle_lost, controller, health
+                            )
+                        elif now - health.sampled_at >= settings.CAMERA_STATUS_INTERVAL:
+                            health.pending = controller.submit(
+                                self._sample_status, controller, health
+                            )
+                    elif health.lost and now >= health.next_attempt:
+                        health.pending = controller.submit(
+                            self._reconnect, controller, health
+                        )
 
             except Exception as e:
                 logger.error(f"Error monitoring camera status: {e}")
 
-            time.sleep(5)  # Check every 5 seconds
+            self.registry.wait_for_change(self.registry.seconds_until_due(MONITOR_TICK))
 
-    def get_controller(self) -> CameraController:
-        """Get the camera controller instance"""
-        return self.camera_controller
+    def _sample_status(self, controller: CameraController, health: CameraHealth):
+        """Runs on the camera worker"""
+        if not controller.connected:
+            return
+        try:
+            status = controller.get_status()
+            health.sampled_at = time.monotonic()
+            if status != health.status:
+                health.status = status
+                self._publish_status(controller)
+            added = controller.poll_file_events()
+            if added:
+                event_bus.publish(
+                    f"camera.files:{controller.address}",
+                    "camera.files_changed",
+                    {"camera_id": controller.address, "added": added},
+                )
+        except CameraConnectionLostException:
+            self._handle_lost(controller, health)
+
+    def _handle_lost(self, controller: CameraController, health: CameraHealth):
+        """Runs on the camera worker"""
+        if not controller.connected:
+            return
+        controller.drop()
+        health.status = None
+        health.lost = True
+        health.backoff = settings.CAMERA_RECONNECT_MIN_DELAY
+        health.next_attempt = time.monotonic() + health.backoff
+        self._publish_status(controller)
+
+    def _reconnect(self, controller: CameraController, health: CameraHealth):
+        """Runs on the camera worker"""
+        if not health.lost or controller.connected:
+            return
+
+        if not self.registry.is_present(controller.address):
+            # A replugged camera comes back with a new USB device number
+            replacement = next(
+                (
+                    addr
+                    for name, addr in self.registry.get_cameras()
+                    if name == controller.model and not self.pool.is_known(addr)
+                ),
+                None,
+            )
+            if replacement:
+                self.pool.rebind(controller, replacement)
+
+        if controller.connect():
+            logger.info(f"Camera {controller.address} reconnected")
+            health.lost = False
+            health.backoff = settings.CAMERA_RECONNECT_MIN_DELAY
+            self._sample_status(controller, health)
+        else:
+            health.backoff = min(
+                health.backoff * 2, settings.CAMERA_RECONNECT_MAX_DELAY
+            )
+            health.next_attempt = time.monotonic() + health.backoff
+            logger.info(
+                f"Reconnecting camera {controller.address} again in {health.backoff}s"
+            )
+
+    def on_connected(self, controller: CameraController):
+        """Reset monitor state after an explicit connect and sample right away"""
+        health = self._get_health(controller)
+        health.lost = False
+        health.status = None
+        health.sampled_at = 0.0
+        self._publish_status(controller)
+        self.registry.wake()
+
+    def on_disconnected(self, controller: CameraController):
+        """An explicit disconnect cancels any pending reconnect"""
+        health = self._get_health(controller)
+        health.lost = False
+        health.status = None
+        self._publish_status(controller)
+
+    def _publish_status(self, controller: CameraController):
+        status = self.get_status(controller)
+        event_bus.publish(
+            f"camera.status:{controller.address}",
+            "camera.status",
+            {"camera_id": controller.address, **status.dict()},
+        )
 
-    def get_current_status(self) -> Optional[CameraStatus]:
+    def get_status(self, controller: CameraController) -> CameraStatus:
+        """Cached status for a camera, never touches the USB bus"""
+        health = self._get_health(controller)
+        if controller.connected:
+            if health.status and health.status.connected:
+                return health.status
+            return CameraStatus(connected=True, model=controller.model)
+        return CameraStatus(
+            connected=False, model=controller.model, reconnecting=health.lost
+        )
+
+    def get_controller(self, camera_id: Optional[str] = None) -> CameraController:
+        """Get the controller for a camera id, or the default camera"""
+        return self.pool.get(camera_id)
+
+    def get_current_status(self, camera_id: Optional[str] = None) -> CameraStatus:
         """Get the last known camera status"""
-        return self._last_status
+        return self.get_status(self.pool.get(camera_id))
+
+    def shutdown(self):
+        """Stop monitoring and release all cameras"""
+        self.stop_monitoring()
+        self.pool.close()
 
 
 # Singleton instance
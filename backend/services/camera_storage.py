@@ -0,0 +1,274 @@
+from collections import Counter, OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Tuple
+import asyncio
+import logging
+import os
+import posixpath
+import time
+
+from camera.controller import CameraController
+from camera.exceptions import CameraStorageException
+from config.settings import settings
+from services.event_bus import event_bus
+from services.file_service import file_service
+from services.jobs import Job
+from services.storage_manager import storage_manager
+
+logger = logging.getLogger(__name__)
+
+# Download selections remembered for resuming
+MAX_DOWNLOADS = 100
+
+# (camera folder, file entry from CameraController.list_folder)
+CameraFile = Tuple[str, Dict[str, Any]]
+
+
+class CameraStorageBrowser:
+    """
+    Browses the camera's memory card and copies files from it into
+    CAPTURE_PATH, e.g. frames shot without the server attached.
+
+    Folder listings are cached per camera for CAMERA_LISTING_TTL seconds
+    and dropped as soon as a camera event says the card may have changed:
+    a status change (reconnect, card swap), files added on the camera,
+    or a capture.
+
+    Downloads run as jobs that stream each file in CAMERA_DOWNLOAD_CHUNK
+    reads, one camera worker call per chunk, so live view and captures
+    interleave with a long download. A file is written to a hidden .part
+    file and renamed when complete; files already downloaded are skipped
+    and partial ones continue where they stopped, which makes a cancelled
+    or failed download resumable.
+    """
+
+    def __init__(self, capture_path: Path, ttl: float, chunk_size: int):
+        self.capture_path = capture_path
+        self.ttl = ttl
+        self.chunk_size = chunk_size
+        self._listings: Dict[Tuple[str, str], Tuple[float, Dict[str, Any]]] = {}
+        # job id -> (camera id, files), for resuming
+        self._downloads: "OrderedDict[str, Tuple[str, List[CameraFile]]]" = (
+            OrderedDict()
+        )
+        self._io = ThreadPoolExecutor(max_workers=1, thread_name_prefix="camera-files")
+        self._task: Optional[asyncio.Task] = None
+
+    # Listings
+
+    async def list_folder(
+        self, camera: CameraController, folder: str = "/", refresh: bool = False
+    ) -> Dict[str, Any]:
+        key = (camera.address, folder)
+        cached = self._listings.get(key)
+        if cached and not refresh and time.monotonic() - cached[0] < self.ttl:
+            return {**cached[1], "cached": True}
+        listing = await camera.run(camera.list_folder, folder)
+        self._listings[key] = (time.monotonic(), listing)
+        return {**listing, "cached": False}
+
+    def invalidate(self, camera_id: Optional[str]):
+        for key in [k for k in self._listings if k[0] == camera_id]:
+            del self._listings[key]
+
+    async def _walk(self, camera: CameraController, folder: str) -> List[CameraFile]:
+        listing = await self.list_folder(camera, folder)
+        files = [(folder, entry) for entry in listing["files"]]
+        for name in listing["folders"]:
+            files.extend(await self._walk(camera, posixpath.join(folder, name)))
+        return files
+
+    async def resolve(
+        self, camera: CameraController, files: List[str], folders: List[str]
+    ) -> List[CameraFile]:
+        """Camera files selected by path and by (recursive) folder"""
+        selected: Dict[str, CameraFile] = {}
+        for path in files:
+            folder, name = posixpath.split(path)
+            listing = await self.list_folder(camera, folder or "/")
+            entry = next((e for e in listing["files"] if e["name"] == name), None)
+            if entry is None:
+                raise FileNotFoundError(f"Not on the camera: {path}")
+            selected[path] = (folder or "/", entry)
+        for folder in folders:
+            for item in await self._walk(camera, folder):
+                selected[posixpath.join(item[0], item[1]["name"])] = item
+        return list(selected.values())
+
+    # Downloads
+
+    def _target(self, folder: str, entry: Dict[str, Any], duplicate: bool) -> Path:
+        """
+        Local file for a camera file: its own name unless that is taken by
+        a different file, then prefixed with the camera folder. An existing
+        file of the same size counts as already downloaded.
+        """
+        name = entry["name"]
+        prefixed = f"{posixpath.basename(folder.rstrip('/')) or 'camera'}_{name}"
+        candidates = [prefixed] if duplicate else [name, prefixed]
+        stem, suffix = posixpath.splitext(prefixed)
+        candidates += [f"{stem}_{i}{suffix}" for i in range(1, 100)]
+        for candidate in candidates:
+            path = self.capture_path / candidate
+            try:
+                if path.stat().st_size == entry["size"]:
+                    return path
+            except FileNotFoundError:
+                return path
+        raise FileExistsError(f"No free local name for {folder}/{name}")
+
+    def _open_part(self, part: Path, size: int):
+        """Open a partial download for appending (io thread)"""
+        f = open(part, "ab")
+        if f.tell() > size:
+            # Not the file we are downloading, start over
+            f.truncate(0)
+            f.seek(0)
+        return f
+
+    def _finish(self, f, part: Path, target: Path, mtime: int):
+        """Flush a completed download and move it into place (io thread)"""
+        f.flush()
+        os.fsync(f.fileno())
+        f.close()
+        if mtime:
+            os.utime(part, (mtime, mtime))
+        os.replace(part, target)
+
+    async def _download_file(
+        self,
+        job: Job,
+        camera: CameraController,
+        folder: str,
+        entry: Dict[str, Any],
+        target: Path,
+        progress: Dict[str, Any],
+    ):
+        loop = asyncio.get_running_loop()
+        part = target.with_name(f".{target.name}.part")
+        f = await loop.run_in_executor(self._io, self._open_part, part, entry["size"])
+        try:
+            offset = f.tell()
+            progress["done"] += offset
+            while offset < entry["size"]:
+                chunk = await camera.run(
+                    camera.read_file_chunk,
+                    folder,
+                    entry["name"],
+                    offset,
+                    min(self.chunk_size, entry["size"] - offset),
+                )
+                if not chunk:
+                    raise CameraStorageException(
+                        f"Camera returned no data for {folder}/{entry['name']} "
+                        f"at offset {offset}"
+                    )
+                await loop.run_in_executor(self._io, f.write, chunk)
+                offset += len(chunk)
+                progress["done"] += len(chunk)
+                progress["transferred"] += len(chunk)
+                elapsed = max(time.monotonic() - progress["started"], 1e-6)
+                job.update(
+                    progress["done"],
+                    message=f"{progress['files']} files, "
+                    f"{progress['transferred'] / elapsed / 1e6:.1f} MB/s",
+                )
+                job.check_cancelled()
+            await loop.run_in_executor(
+                self._io, self._finish, f, part, target, entry["mtime"]
+            )
+        finally:
+            if not f.closed:
+                await loop.run_in_executor(self._io, f.close)
+
+    async def download(
+        self, job: Job, camera: CameraController, files: List[CameraFile]
+    ) -> Dict[str, Any]:
+        """Copy camera files into CAPTURE_PATH, run as a job"""
+        self._downloads[job.id] = (camera.address, files)
+        while len(self._downloads) > MAX_DOWNLOADS:
+            self._downloads.popitem(last=False)
+
+        names = Counter(entry["name"] for _, entry in files)
+        progress = {
+            "done": 0,
+            "transferred": 0,
+            "files": 0,
+            "started": time.monotonic(),
+        }
+        skipped = 0
+        job.update(0, sum(entry["size"] for _, entry in files))
+        for folder, entry in files:
+            job.check_cancelled()
+            target = self._target(folder, entry, names[entry["name"]] > 1)
+            if target.exists():
+                skipped += 1
+                progress["done"] += entry["size"]
+                continue
+
+            storage_manager.check_capture()
+            await self._download_file(job, camera, folder, entry, target, progress)
+            progress["files"] += 1
+            storage_manager.wake()
+
+            file_info = file_service.get_file_info(target.name)
+            if file_info:
+                event_bus.publish(
+                    f"capture:{target.name}",
+                    "capture.completed",
+                    {
+                        "camera_id": camera.address,
+                        "camera_path": posixpath.join(folder, entry["name"]),
+                        **file_info.dict(),
+                    },
+                )
+
+        elapsed = time.monotonic() - progress["started"]
+        job.update(message=f"{progress['files']} files downloaded")
+        return {
+            "downloaded": progress["files"],
+            "skipped": skipped,
+            "bytes": progress["transferred"],
+            "seconds": round(elapsed, 2),
+            "bytes_per_second": round(progress["transferred"] / max(elapsed, 1e-6)),
+        }
+
+    def resumable(self, job_id: str) -> Optional[Tuple[str, List[CameraFile]]]:
+        """Camera id and files of an earlier download job"""
+        return self._downloads.get(job_id)
+
+    async def _watch(self):
+        subscription = event_bus.subscribe(["camera.status", "camera.files", "capture"])
+        try:
+            while True:
+                for event in await subscription.next_batch(timeout=60):
+                    data = event.data or {}
+                    if event.type in ("camera.status", "camera.files_changed") or (
+                        event.type == "capture.completed" and "camera_path" not in data
+                    ):
+                        self.invalidate(data.get("camera_id"))
+        finally:
+            event_bus.unsubscribe(subscription)
+
+    def start(self):
+        if self._task is None or self._task.done():
+            self._task = asyncio.get_running_loop().create_task(self._watch())
+
+    async def shutdown(self):
+        if self._task:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        self._io.shutdown(wait=False)
+
+
+# Singleton instance
+camera_storage = CameraStorageBrowser(
+    capture_path=Path(settings.CAPTURE_PATH),
+    ttl=settings.CAMERA_LISTING_TTL,
+    chunk_size=settings.CAMERA_DOWNLOAD_CHUNK,
+)
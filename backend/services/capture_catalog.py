@@ -0,0 +1,566 @@
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from typing import Any, Dict, List, Optional
+import asyncio
+import json
+import logging
+import os
+import sqlite3
+import threading
+import time
+
+from config.settings import settings
+from services.capture_formats import (
+    capture_stem,
+    embedded_preview,
+    is_capture,
+    is_raw,
+    primary_first,
+)
+from services.event_bus import RESYNC_TOPIC, event_bus
+from services.image_stats import image_stats, open_downsampled
+from services.staging import staging_tier
+
+logger = logging.getLogger(__name__)
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS captures (
+    filename TEXT PRIMARY KEY,
+    size INTEGER NOT NULL,
+    mtime_ns INTEGER NOT NULL,
+    added REAL NOT NULL,
+    camera_id TEXT,
+    derived_from TEXT,
+    exported INTEGER NOT NULL DEFAULT 0,
+    stats TEXT,
+    stats_size INTEGER,
+    stats_mtime_ns INTEGER,
+    stem TEXT
+);
+CREATE INDEX IF NOT EXISTS captures_mtime ON captures (mtime_ns);
+CREATE TABLE IF NOT EXISTS derived (
+    path TEXT PRIMARY KEY,
+    filename TEXT NOT NULL,
+    kind TEXT NOT NULL,
+    size INTEGER NOT NULL,
+    created REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS derived_filename ON derived (filename);
+"""
+
+# Derived kinds that are caches of their capture, deleted along with it
+CACHE_KINDS = ("thumbnail",)
+
+
+class CaptureCatalog:
+    """
+    SQLite index of the capture directory and of files derived from
+    captures (thumbnails, FITS files, preview snapshots), with cached image
+    statistics. Storage accounting and eviction work from this index.
+
+    The files of one shot (RAW+JPEG) share a stem and are grouped into
+    one logical capture, shown by its JPEG.
+
+    The directory is scanned once at startup; after that the catalog
+    follows capture.completed / capture.deleted events. New captures are
+    decoded once at reduced size in the background to compute their
+    statistics and thumbnail, so browsing the gallery never decodes a
+    full frame. Cached results are keyed on the file's size and mtime and
+    recomputed when either changes.
+    """
+
+    def __init__(
+        self, db_path: Path, capture_path: Path, thumbnail_path: Path, workers: int
+    ):
+        self.capture_path = capture_path
+        self.thumbnail_path = thumbnail_path
+        self.thumbnail_path.mkdir(parents=True, exist_ok=True)
+        self._db = sqlite3.connect(str(db_path), check_same_thread=False)
+        self._db.row_factory = sqlite3.Row
+        self._lock = threading.Lock()
+        with self._lock, self._db:
+            self._db.execute("PRAGMA journal_mode=WAL")
+            self._db.execute("PRAGMA synchronous=NORMAL")
+            self._db.executescript(SCHEMA)
+            self._migrate()
+
+        self._executor = ThreadPoolExecutor(
+            max_workers=workers, thread_name_prefix="catalog"
+        )
+        self._task: Optional[asyncio.Task] = None
+        # Set once the startup scan has brought the index up to date
+        self.ready = asyncio.Event()
+        # Captures whose stats and thumbnail are being computed right now
+        self._deriving: Dict[str, asyncio.Future] = {}
+
+    def _migrate(self):
+        """Bring a catalog from an older version up to SCHEMA"""
+        columns = {
+            row["name"] for row in self._db.execute("PRAGMA table_info(captures)")
+        }
+        if "stem" not in columns:
+            self._db.execute("ALTER TABLE captures ADD COLUMN stem TEXT")
+            self._db.executemany(
+                "UPDATE captures SET stem = ? WHERE filename = ?",
+                [
+                    (capture_stem(row["filename"]), row["filename"])
+                    for row in self._db.execute("SELECT filename FROM captures")
+                ],
+            )
+        # Covers both the files of one shot and a shot's newest mtime
+        self._db.execute("DROP INDEX IF EXISTS captures_stem")
+        self._db.execute(
+            "CREATE INDEX IF NOT EXISTS captures_stem_mtime ON captures (stem, mtime_ns)"
+        )
+
+    # Index
+
+    def _stat(self, filename: str) -> Optional[os.stat_result]:
+        try:
+            return staging_tier.locate(filename).stat()
+        except OSError:
+            return None
+
+    def add(
+        self,
+        filename: str,
+        camera_id: Optional[str] = None,
+        derived_from: Optional[str] = None,
+    ) -> Optional[Dict[str, Any]]:
+        """Index (or refresh) a capture, returns its entry"""
+        stat = self._stat(filename)
+        if stat is None:
+            return None
+        self._upsert([(filename, stat, camera_id, derived_from)])
+        return self.get(filename)
+
+    def _upsert(self, entries: List[tuple]):
+        """Insert or refresh (filename, stat, camera_id, derived_from) rows"""
+        now = time.time()
+        with self._lock, self._db:
+            self._db.executemany(
+                """
+                INSERT INTO captures
+                    (filename, size, mtime_ns, added, camera_id, derived_from, stem)
+                VALUES (?, ?, ?, ?, ?, ?, ?)
+                ON CONFLICT (filename) DO UPDATE SET
+                    size = excluded.size,
+                    mtime_ns = excluded.mtime_ns,
+                    camera_id = COALESCE(excluded.camera_id, camera_id),
+                    derived_from = COALESCE(excluded.derived_from, derived_from)
+                """,
+                [
+                    (
+                        filename,
+                        stat.st_size,
+                        stat.st_mtime_ns,
+                        now,
+                        camera,
+                        source,
+                        capture_stem(filename),
+                    )
+                    for filename, stat, camera, source in entries
+                ],
+            )
+
+    def get(self, filename: str) -> Optional[Dict[str, Any]]:
+        with self._lock:
+            row = self._db.execute(
+                "SELECT * FROM captures WHERE filename = ?", (filename,)
+            ).fetchone()
+        return dict(row) if row else None
+
+    def remove(self, filename: str):
+        """
+        Drop a capture and delete its cached thumbnail. Exports made from
+        it (FITS files) stay indexed as derived files.
+        """
+        self.remove_many([filename])
+
+    def remove_many(self, filenames: List[str]):
+        """
+        Drop captures and their cached thumbnails in one transaction; the
+        thumbnail files are deleted before it commits
+        """
+        with self._lock, self._db:
+            self._db.execute("CREATE TEMP TABLE IF NOT EXISTS doomed (filename TEXT)")
+            self._db.execute("DELETE FROM doomed")
+            self._db.executemany(
+                "INSERT INTO doomed VALUES (?)", [(f,) for f in filenames]
+            )
+            paths = [
+                row["path"]
+                for row in self._db.execute(
+                    "SELECT path FROM derived WHERE filename IN "
+                    "(SELECT filename FROM doomed) AND kind IN "
+                    f"({', '.join('?' * len(CACHE_KINDS))})",
+                    CACHE_KINDS,
+                )
+            ]
+            self._db.executemany(
+                "DELETE FROM derived WHERE path = ?", [(p,) for p in paths]
+            )
+            self._db.execute(
+                "DELETE FROM captures WHERE filename IN (SELECT filename FROM doomed)"
+            )
+            for path in paths:
+                Path(path).unlink(missing_ok=True)
+
+    def select(
+        self,
+        pattern: Optional[str] = None,
+        before: Optional[float] = None,
+        after: Optional[float] = None,
+        camera_id: Optional[str] = None,
+        exported: Optional[bool] = None,
+        grouped: bool = False,
+    ) -> List[str]:
+        """
+        Filenames of indexed captures matching every given filter, oldest
+        first. `pattern` is a glob, `before`/`after` are Unix times
+        compared with the file mtime. With `grouped` each shot is listed
+        once, by its primary file.
+        """
+        clauses, params = [], []
+        if pattern is not None:
+            clauses.append("filename GLOB ?")
+            params.append(pattern)
+        if before is not None:
+            clauses.append("mtime_ns < ?")
+            params.append(int(before * 1e9))
+        if after is not None:
+            clauses.append("mtime_ns >= ?")
+            params.append(int(after * 1e9))
+        if camera_id is not None:
+            clauses.append("camera_id = ?")
+            params.append(camera_id)
+        if exported is not None:
+            clauses.append("exported = ?")
+            params.append(int(exported))
+        where = f"WHERE {' AND '.join(clauses)}" if clauses else ""
+        with self._lock:
+            rows = self._db.execute(
+                f"SELECT filename, stem FROM captures {where} ORDER BY mtime_ns",
+                params,
+            ).fetchall()
+        if not grouped:
+            return [row["filename"] for row in rows]
+        groups: Dict[str, List[str]] = {}
+        for row in rows:
+            groups.setdefault(row["stem"], []).append(row["filename"])
+        return [primary_first(files)[0] for files in groups.values()]
+
+    def groups(
+        self, limit: Optional[int] = None, offset: int = 0
+    ) -> List[Dict[str, Any]]:
+        """
+        Captures as one entry per shot, newest first: the primary file's
+        name, size and mtime plus the names of its companions. Shots are
+        paged in SQL, so only the files of the requested page are read.
+        """
+        with self._lock:
+            rows = self._db.execute(
+                """
+                WITH shots AS (
+                    SELECT stem, MAX(mtime_ns) AS newest FROM captures
+                    GROUP BY stem ORDER BY newest DESC, stem LIMIT ? OFFSET ?
+                )
+                SELECT filename, size, mtime_ns, stem FROM captures
+                JOIN shots USING (stem) ORDER BY newest DESC, stem
+                """,
+                (-1 if limit is None else limit, offset),
+            ).fetchall()
+        groups: Dict[str, Dict[str, Dict[str, Any]]] = {}
+        for row in rows:
+            groups.setdefault(row["stem"], {})[row["filename"]] = dict(row)
+        entries = []
+        for files in groups.values():
+            names = primary_first(files)
+            entries.append({**files[names[0]], "companions": names[1:]})
+        return entries
+
+    async def page(
+        self, limit: Optional[int] = None, offset: int = 0
+    ) -> List[Dict[str, Any]]:
+        """groups() on the catalog executor"""
+        return await asyncio.get_running_loop().run_in_executor(
+            self._executor, self.groups, limit, offset
+        )
+
+    def group(self, filename: str) -> List[str]:
+        """Indexed files of the shot `filename` belongs to, primary first"""
+        with self._lock:
+            rows = self._db.execute(
+                "SELECT filename FROM captures WHERE stem = ?",
+                (capture_stem(filename),),
+            )
+            return primary_first(row["filename"] for row in rows)
+
+    def mark_exported(self, filenames: List[str]) -> int:
+        """Flag captures as copied off the device, making them evictable"""
+        with self._lock, self._db:
+            cursor = self._db.executemany(
+                "UPDATE captures SET exported = 1 WHERE filename = ?",
+                [(f,) for f in filenames],
+            )
+            return cursor.rowcount
+
+    def add_derived(self, path: Path, filename: str, kind: str):
+        """Index a file made from a capture (or a standalone preview snapshot)"""
+        with self._lock, self._db:
+            self._db.execute(
+                """
+                INSERT OR REPLACE INTO derived (path, filename, kind, size, created)
+                VALUES (?, ?, ?, ?, ?)
+                """,
+                (str(path), filename, kind, path.stat().st_size, time.time()),
+            )
+
+    def remove_derived(self, path: Path):
+        with self._lock, self._db:
+            self._db.execute("DELETE FROM derived WHERE path = ?", (str(path),))
+
+    def usage(self) -> Dict[str, int]:
+        """Indexed bytes and file counts, from the index alone"""
+        with self._lock:
+            captures = self._db.execute("""
+                SELECT COUNT(*), COALESCE(SUM(size), 0),
+                    COALESCE(SUM(CASE WHEN exported = 0 AND derived_from IS NULL
+                        THEN size END), 0)
+                FROM captures
+                """).fetchone()
+            derived = self._db.execute(
+                "SELECT COUNT(*), COALESCE(SUM(size), 0) FROM derived"
+            ).fetchone()
+            recent = self._db.execute("""
+                SELECT COALESCE(MAX(size), 0) FROM (
+                    SELECT size FROM captures WHERE derived_from IS NULL
+                    ORDER BY added DESC LIMIT 20
+                )
+                """).fetchone()
+        return {
+            "captures": captures[0],
+            "capture_bytes": captures[1],
+            "unexported_bytes": captures[2],
+            "derived": derived[0],
+            "derived_bytes": derived[1],
+            "used_bytes": captures[1] + derived[1],
+            "recent_capture_max_bytes": recent[0],
+        }
+
+    def eviction_candidates(
+        self, limit: int, older_than: Optional[float] = None
+    ) -> List[Dict[str, Any]]:
+        """
+        Files that may be deleted to free space, in eviction order: cached
+        and derived files (thumbnails, preview snapshots, FITS files whose
+        capture still exists), then calibrated copies, then exported
+        captures; oldest first within each tier. Captures that were never
+        exported are never candidates, nor are FITS files whose capture is
+        gone, since they are then the only copy.
+        """
+        query = """
+            SELECT * FROM (
+                SELECT 0 AS tier, path, filename, kind, size, created AS age
+                FROM derived
+                WHERE kind != 'fits' OR filename IN (SELECT filename FROM captures)
+                UNION ALL
+                SELECT 1, NULL, filename, 'capture', size, mtime_ns / 1e9
+                FROM captures WHERE derived_from IS NOT NULL
+                UNION ALL
+                SELECT 2, NULL, filename, 'capture', size, mtime_ns / 1e9
+                FROM captures WHERE derived_from IS NULL AND exported = 1
+            )
+            WHERE ? IS NULL OR age < ?
+            ORDER BY tier, age
+            LIMIT ?
+        """
+        with self._lock:
+            rows = self._db.execute(query, (older_than, older_than, limit))
+            return [dict(row) for row in rows]
+
+    def reconcile(self) -> Dict[str, int]:
+        """Bring the index in line with the capture directory and staging tier"""
+        on_disk = {p.name for p in staging_tier.capture_files() if is_capture(p.name)}
+        with self._lock:
+            indexed = {
+                row["filename"]: (row["size"], row["mtime_ns"])
+                for row in self._db.execute(
+                    "SELECT filename, size, mtime_ns FROM captures"
+                )
+            }
+        changed = []
+        for filename in on_disk:
+            stat = self._stat(filename)
+            if stat and indexed.get(filename) != (stat.st_size, stat.st_mtime_ns):
+                changed.append((filename, stat, None, None))
+        self._upsert(changed)
+        added = len(changed)
+        removed = indexed.keys() - on_disk
+        for filename in removed:
+            self.remove(filename)
+        logger.info(
+            f"Capture catalog: {len(on_disk)} captures, {added} indexed, "
+            f"{len(removed)} removed"
+        )
+        return {"captures": len(on_disk), "added": added, "removed": len(removed)}
+
+    # Derived data
+
+    def thumbnail_file(self, filename: str) -> Path:
+        return self.thumbnail_path / f"{filename}.jpg"
+
+    def _is_current(self, entry: Dict[str, Any]) -> bool:
+        """Whether cached stats still belong to the file on disk"""
+        return entry["stats"] is not None and (
+            entry["stats_size"],
+            entry["stats_mtime_ns"],
+        ) == (entry["size"], entry["mtime_ns"])
+
+    def _derive(self, filename: str):
+        """
+        Stats and thumbnail from one reduced-size decode (worker thread).
+        RAW files are measured on the JPEG preview the camera embedded,
+        which avoids decoding the sensor data.
+        """
+        stat = self._stat(filename)
+        if stat is None:
+            return
+        source = staging_tier.locate(filename)
+        image = open_downsampled(
+            embedded_preview(source) if is_raw(filename) else source,
+            settings.STATS_MAX_WIDTH,
+        )
+        stats = image_stats(image)
+
+        thumbnail = self.thumbnail_file(filename)
+        tmp = thumbnail.with_name(f".{thumbnail.name}.tmp")
+        image.thumbnail((settings.THUMBNAIL_WIDTH, settings.THUMBNAIL_WIDTH))
+        image.save(tmp, "JPEG", quality=settings.THUMBNAIL_QUALITY)
+        os.replace(tmp, thumbnail)
+
+        with self._lock, self._db:
+            self._db.execute(
+                """
+                UPDATE captures SET size = ?, mtime_ns = ?, stats = ?,
+                    stats_size = ?, stats_mtime_ns = ?
+                WHERE filename = ?
+                """,
+                (
+                    stat.st_size,
+                    stat.st_mtime_ns,
+                    json.dumps(stats),
+                    stat.st_size,
+                    stat.st_mtime_ns,
+                    filename,
+                ),
+            )
+            self._db.execute(
+                """
+                INSERT OR REPLACE INTO derived (path, filename, kind, size, created)
+                VALUES (?, ?, 'thumbnail', ?, ?)
+                """,
+                (str(thumbnail), filename, thumbnail.stat().st_size, time.time()),
+            )
+
+    async def derive(self, filename: str):
+        """Compute stats and thumbnail once, even for concurrent callers"""
+        future = self._deriving.get(filename)
+        if future is None:
+            future = asyncio.get_running_loop().run_in_executor(
+                self._executor, self._derive, filename
+            )
+            self._deriving[filename] = future
+            future.add_done_callback(lambda _: self._deriving.pop(filename, None))
+        await asyncio.shield(future)
+
+    async def _current_entry(self, filename: str) -> Optional[Dict[str, Any]]:
+        """Entry with up-to-date derived data, computing it if needed"""
+        entry = self.get(filename)
+        stat = self._stat(filename)
+        if stat is None:
+            return None
+        if entry is None or (entry["size"], entry["mtime_ns"]) != (
+            stat.st_size,
+            stat.st_mtime_ns,
+        ):
+            entry = self.add(filename)
+            if entry is None:  # Deleted since the stat
+                return None
+        if not self._is_current(entry) or not self.thumbnail_file(filename).exists():
+            await self.derive(filename)
+            entry = self.get(filename)
+        return entry
+
+    async def get_stats(self, filename: str) -> Optional[Dict[str, Any]]:
+        entry = await self._current_entry(filename)
+        if entry is None or entry["stats"] is None:
+            return None
+        return json.loads(entry["stats"])
+
+    async def get_thumbnail(self, filename: str) -> Optional[Path]:
+        entry = await self._current_entry(filename)
+        return self.thumbnail_file(filename) if entry else None
+
+    # Background indexing
+
+    def start(self):
+        if self._task is None or self._task.done():
+            self._task = asyncio.get_running_loop().create_task(self._watch())
+
+    async def _watch(self):
+        loop = asyncio.get_running_loop()
+        subscription = event_bus.subscribe(["capture"])
+        try:
+            await loop.run_in_executor(self._executor, self.reconcile)
+            self.ready.set()
+            while True:
+                for event in await subscription.next_batch(timeout=60):
+                    try:
+                        await self._handle(event)
+                    except Exception as e:
+                        logger.warning(f"Capture catalog could not handle {event}: {e}")
+        finally:
+            event_bus.unsubscribe(subscription)
+
+    async def _handle(self, event):
+        loop = asyncio.get_running_loop()
+        if event.type == "capture.completed":
+            filename = event.data["filename"]
+            await loop.run_in_executor(
+                self._executor,
+                lambda: self.add(
+                    filename,
+                    event.data.get("camera_id"),
+                    event.data.get("calibrated_from"),
+                ),
+            )
+            # Companions of a shot are derived when first shown on their own
+            companions = event.data.get("companions", [])
+            if primary_first([filename, *companions])[0] == filename:
+                await self.derive(filename)
+        elif event.type == "capture.deleted":
+            await loop.run_in_executor(
+                self._executor, self.remove, event.data["filename"]
+            )
+        elif event.type == "captures.cleared" or event.topic == RESYNC_TOPIC:
+            await loop.run_in_executor(self._executor, self.reconcile)
+
+    async def shutdown(self):
+        if self._task:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        self._executor.shutdown(wait=False)
+
+
+# Singleton instance
+capture_catalog = CaptureCatalog(
+    db_path=Path(settings.CATALOG_PATH),
+    capture_path=Path(settings.CAPTURE_PATH),
+    thumbnail_path=Path(settings.THUMBNAIL_PATH),
+    workers=settings.CATALOG_WORKERS,
+)
@@ -0,0 +1,212 @@
+from pathlib import Path
+from typing import BinaryIO, Iterable, List, Tuple
+import io
+import struct
+
+from PIL import Image
+
+try:
+    import rawpy
+except ImportError:  # Embedded previews are then read by the TIFF parser below
+    rawpy = None
+
+RAW_MEDIA_TYPES = {
+    ".cr2": "image/x-canon-cr2",
+    ".cr3": "image/x-canon-cr3",
+    ".nef": "image/x-nikon-nef",
+    ".arw": "image/x-sony-arw",
+    ".dng": "image/x-adobe-dng",
+    ".raf": "image/x-fuji-raf",
+    ".orf": "image/x-olympus-orf",
+    ".rw2": "image/x-panasonic-rw2",
+}
+RAW_EXTENSIONS = set(RAW_MEDIA_TYPES)
+JPEG_EXTENSIONS = {".jpg", ".jpeg"}
+
+MEDIA_TYPES = {
+    ".jpg": "image/jpeg",
+    ".jpeg": "image/jpeg",
+    ".tif": "image/tiff",
+    ".tiff": "image/tiff",
+    **RAW_MEDIA_TYPES,
+}
+
+# Extensions of files a camera writes, i.e. what counts as a capture
+CAPTURE_EXTENSIONS = set(MEDIA_TYPES)
+
+# TIFF tags locating embedded JPEG previews
+TAG_SUBFILE_TYPE = 0x00FE
+TAG_COMPRESSION = 0x0103
+TAG_STRIP_OFFSETS = 0x0111
+TAG_STRIP_BYTE_COUNTS = 0x0117
+TAG_SUB_IFDS = 0x014A
+TAG_JPEG_OFFSET = 0x0201
+TAG_JPEG_LENGTH = 0x0202
+TAG_PANASONIC_JPEG = 0x002E
+
+# Baseline, extended and progressive JPEG; lossless JPEG (SOF3) holds raw
+# sensor data in DNG and CR2 files, not a viewable preview
+VIEWABLE_SOF = {0xC0, 0xC1, 0xC2}
+
+# Bytes read to check a JPEG candidate before reading all of it
+PREVIEW_PEEK_BYTES = 64 * 1024
+
+# Guards against malformed files with looping or huge IFD chains
+MAX_IFDS = 16
+
+
+def suffix(filename: str) -> str:
+    return Path(filename).suffix.lower()
+
+
+def is_capture(filename: str) -> bool:
+    return not filename.startswith(".") and suffix(filename) in CAPTURE_EXTENSIONS
+
+
+def is_raw(filename: str) -> bool:
+    return suffix(filename) in RAW_EXTENSIONS
+
+
+def media_type(filename: str) -> str:
+    return MEDIA_TYPES.get(suffix(filename), "application/octet-stream")
+
+
+def capture_stem(filename: str) -> str:
+    """Files of one shot (RAW+JPEG) share this name"""
+    return Path(filename).stem
+
+
+def primary_first(filenames: Iterable[str]) -> List[str]:
+    """
+    Files of one capture, the one shown in the gallery first: a JPEG,
+    then other decodable images, then RAW files
+    """
+
+    def rank(filename: str) -> Tuple[int, str]:
+        if suffix(filename) in JPEG_EXTENSIONS:
+            return 0, filename
+        return (2 if is_raw(filename) else 1), filename
+
+    return sorted(filenames, key=rank)
+
+
+def _viewable_jpeg(data: bytes) -> bool:
+    """Whether JPEG data decodes to a picture, judged by its frame marker"""
+    if data[:2] != b"\xff\xd8":
+        return False
+    position = 2
+    while position + 4 <= len(data):
+        if data[position] != 0xFF:
+            return False
+        marker = data[position + 1]
+        if 0xC0 <= marker <= 0xCF and marker not in (0xC4, 0xC8, 0xCC):
+            return marker in VIEWABLE_SOF
+        (length,) = struct.unpack(">H", data[position + 2 : position + 4])
+        position += 2 + length
+    return False
+
+
+def _tiff_previews(f: BinaryIO) -> List[Tuple[int, int]]:
+    """(offset, length) of JPEG candidates in a TIFF-based RAW file"""
+    f.seek(0)
+    header = f.read(8)
+    order = {b"II": "<", b"MM": ">"}.get(header[:2])
+    if order is None or len(header) < 8:
+        return []
+    (first,) = struct.unpack(order + "I", header[4:8])
+    size = f.seek(0, 2)
+
+    candidates = []
+    queue, seen = [first], set()
+    while queue and len(seen) < MAX_IFDS:
+        offset = queue.pop(0)
+        if not 0 < offset < size or offset in seen:
+            continue
+        seen.add(offset)
+        f.seek(offset)
+        (count,) = struct.unpack(order + "H", f.read(2))
+        tags = {}
+        for _ in range(count):
+            entry = f.read(12)
+            if len(entry) < 12:
+                break
+            tag, kind, n = struct.unpack(order + "HHI", entry[:8])
+            if kind == 3 and n == 1:
+                tags[tag] = struct.unpack(order + "H", entry[8:10])
+            elif kind in (4, 13) and n == 1:
+                tags[tag] = struct.unpack(order + "I", entry[8:12])
+            elif kind in (4, 13) and tag == TAG_SUB_IFDS:
+                position = f.tell()
+                f.seek(struct.unpack(order + "I", entry[8:12])[0])
+                tags[tag] = struct.unpack(order + f"{n}I", f.read(4 * n))
+                f.seek(position)
+            elif kind == 7 and tag == TAG_PANASONIC_JPEG:
+                candidates.append((struct.unpack(order + "I", entry[8:12])[0], n))
+        (next_ifd,) = struct.unpack(order + "I", f.read(4) or b"\0\0\0\0")
+        queue.append(next_ifd)
+        queue.extend(tags.get(TAG_SUB_IFDS, ()))
+
+        if TAG_JPEG_OFFSET in tags and TAG_JPEG_LENGTH in tags:
+            candidates.append((tags[TAG_JPEG_OFFSET][0], tags[TAG_JPEG_LENGTH][0]))
+        if (
+            tags.get(TAG_COMPRESSION, (0,))[0] in (6, 7)
+            and TAG_STRIP_OFFSETS in tags
+            and TAG_STRIP_BYTE_COUNTS in tags
+            and tags.get(TAG_SUBFILE_TYPE, (0,))[0] in (0, 1)
+        ):
+            candidates.append(
+                (tags[TAG_STRIP_OFFSETS][0], tags[TAG_STRIP_BYTE_COUNTS][0])
+            )
+    return [(o, n) for o, n in candidates if n > 0 and o + n <= size]
+
+
+def _raf_previews(f: BinaryIO) -> List[Tuple[int, int]]:
+    """(offset, length) of the JPEG in a Fujifilm RAF header"""
+    f.seek(0)
+    header = f.read(92)
+    if not header.startswith(b"FUJIFILMCCD-RAW") or len(header) < 92:
+        return []
+    return [struct.unpack(">II", header[84:92])]
+
+
+def embedded_preview(path: Path) -> bytes:
+    """
+    The largest viewable JPEG a camera embedded in a RAW file, read
+    without decoding the sensor data. Uses rawpy when installed, otherwise
+    reads the TIFF structure (CR2, NEF, ARW, DNG, RW2) or the RAF
+    header directly.
+    """
+    if rawpy is not None:
+        try:
+            with rawpy.imread(str(path)) as raw:
+                thumb = raw.extract_thumb()
+            if thumb.format == rawpy.ThumbFormat.JPEG:
+                return bytes(thumb.data)
+        except (rawpy.LibRawError, OSError):
+            pass
+
+    with open(path, "rb") as f:
+        try:
+            candidates = _raf_previews(f) or _tiff_previews(f)
+        except struct.error:  # Truncated file
+            candidates = []
+        best = b""
+        for offset, length in candidates:
+            if length <= len(best):
+                continue
+            # The markers before the frame header are enough to reject the
+            # lossless sensor data without reading all of it
+            f.seek(offset)
+            data = f.read(min(length, PREVIEW_PEEK_BYTES))
+            if _viewable_jpeg(data):
+                best = data + f.read(length - len(data))
+    if not best:
+        raise ValueError(f"No embedded preview in {path.name}")
+    return best
+
+
+def open_capture(path: Path) -> Image.Image:
+    """Open a capture with PIL, RAW files via their embedded preview"""
+    if is_raw(path.name):
+        return Image.open(io.BytesIO(embedded_preview(path)))
+    return Image.open(path)
@@ -0,0 +1,155 @@
+from collections import OrderedDict
+from typing import Any, Iterable, List, Optional
+import asyncio
+import itertools
+import json
+import logging
+import threading
+import time
+
+from config.settings import settings
+
+logger = logging.getLogger(__name__)
+
+RESYNC_TOPIC = "resync"
+
+
+class Event:
+    """A single message on the bus"""
+
+    __slots__ = ("seq", "topic", "type", "data", "timestamp")
+
+    def __init__(self, seq: int, topic: str, type: str, data: Any):
+        self.seq = seq
+        self.topic = topic
+        self.type = type
+        self.data = data
+        self.timestamp = time.time()
+
+    def to_sse(self) -> str:
+        payload = json.dumps(
+            {"topic": self.topic, "timestamp": self.timestamp, "data": self.data},
+            default=str,
+        )
+        return format_sse(payload, event=self.type, id=self.seq)
+
+
+class EventSubscription:
+    """
+    Per-client mailbox that keeps only the newest event per topic.
+
+    A slow client therefore never holds more than `max_topics` pending
+    events. If even that overflows, the backlog is replaced by a single
+    resync event telling the client to refetch its state.
+    """
+
+    def __init__(
+        self,
+        loop: asyncio.AbstractEventLoop,
+        topics: Optional[List[str]],
+        max_topics: int,
+    ):
+        self.loop = loop
+        self.topics = topics
+        self.max_topics = max_topics
+        self._pending: "OrderedDict[str, Event]" = OrderedDict()
+        self._ready = asyncio.Event()
+
+    def wants(self, topic: str) -> bool:
+        if not self.topics:
+            return True
+        return any(
+            topic == t or topic.startswith(t + ".") or topic.startswith(t + ":")
+            for t in self.topics
+        )
+
+    def offer(self, event: Event):
+        # Runs on the event loop thread
+        if event.topic in self._pending:
+            # Coalesce: the newest event replaces the queued one in place
+            del self._pending[event.topic]
+        elif len(self._pending) >= self.max_topics:
+            self._pending.clear()
+            event = Event(event.seq, RESYNC_TOPIC, RESYNC_TOPIC, None)
+        self._pending[event.topic] = event
+        self._ready.set()
+
+    async def next_batch(self, timeout: float) -> List[Event]:
+        """Wait for pending events, returns an empty list on timeout"""
+        try:
+            await asyncio.wait_for(self._ready.wait(), timeout)
+        except asyncio.TimeoutError:
+            return []
+        self._ready.clear()
+        batch = list(self._pending.values())
+        self._pending.clear()
+        return batch
+
+
+class EventBus:
+    """
+    In-process publish/subscribe bus feeding the /api/events stream.
+
+    publish() is safe to call from any thread, including camera workers.
+    Topics are dotted names with an optional ":<id>" suffix, e.g.
+    "camera.status:usb:001,005" or "job:3f2a". Subscribers filter on topic
+    prefixes and coalesce per full topic.
+    """
+
+    def __init__(self, max_topics: int = 256):
+        self.max_topics = max_topics
+        self._subscribers: List[EventSubscription] = []
+        self._lock = threading.Lock()
+        self._seq = itertools.count(1)
+
+    def publish(self, topic: str, type: str, data: Any = None):
+        if not self._subscribers:
+            return
+
+        event = Event(next(self._seq), topic, type, data)
+        with self._lock:
+            subscribers = list(self._subscribers)
+
+        for subscription in subscribers:
+            if not subscription.wants(topic):
+                continue
+            try:
+                subscription.loop.call_soon_threadsafe(subscription.offer, event)
+            except RuntimeError:
+                # Event loop already closed
+                self.unsubscribe(subscription)
+
+    def subscribe(self, topics: Optional[Iterable[str]] = None) -> EventSubscription:
+        """Register a subscriber on the running event loop"""
+        subscription = EventSubscription(
+            asyncio.get_running_loop(),
+            [t for t in topics if t] if topics else None,
+            self.max_topics,
+        )
+        with self._lock:
+            self._subscribers.append(subscription)
+        return subscription
+
+    def unsubscribe(self, subscription: EventSubscription):
+        with self._lock:
+            if subscription in self._subscribers:
+                self._subscribers.remove(subscription)
+
+    @property
+    def subscriber_count(self) -> int:
+        return len(self._subscribers)
+
+
+def format_sse(data: str, event: Optional[str] = None, id: Optional[Any] = None) -> str:
+    """Format one Server-Sent Events message"""
+    lines = []
+    if id is not None:
+        lines.append(f"id: {id}")
+    if event:
+        lines.append(f"event: {event}")
+    lines.extend(f"data: {line}" for line in data.splitlines() or [""])
+    return "\n".join(lines) + "\n\n"
+
+
+# Singleton instance
+event_bus = EventBus(max_topics=settings.EVENT_STREAM_MAX_TOPICS)
@@ -1,11 +1,26 @@
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
-from typing import Optional, Dict, Any
+from typing import Optional, Dict, Any, List
+import asyncio
 import shutil
 import logging
+import tempfile
+import zipfile
 from datetime import datetime
 
 from config.settings import settings
 from models.responses import FileInfo
+from services.capture_catalog import capture_catalog
+from services.capture_formats import (
+    CAPTURE_EXTENSIONS,
+    capture_stem,
+    is_capture,
+    media_type,
+    primary_first,
+)
+from services.event_bus import event_bus
+from services.jobs import Job
+from services.staging import staging_tier
 
 logger = logging.getLogger(__name__)
 
@@ -21,6 +36,10 @@ class FileService:
         self.capture_path.mkdir(exist_ok=True)
         self.preview_path.mkdir(exist_ok=True)
 
+        # Deletes and ZIP exports run here so unlinking or reading thousands
+        # of files on a slow card never blocks the event loop
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="files")
+
     def get_storage_info(self) -> Dict[str, Any]:
         """Get storage information"""
         try:
@@ -35,28 +54,10 @@ class FileService:
             logger.error(f"Error getting storage info: {e}")
             return {}
 
-    def cleanup_old_files(self, days_old: int = 30) -> int:
-        """Clean up files older than specified days"""
-        try:
-            cutoff_time = datetime.now().timestamp() - (days_old * 24 * 60 * 60)
-            deleted_count = 0
-
-            for file_path in self.capture_path.glob("*"):
-                if file_path.is_file() and file_path.stat().st_mtime < cutoff_time:
-                    file_path.unlink()
-                    deleted_count += 1
-
-            logger.info(f"Cleaned up {deleted_count} old files")
-            return deleted_count
-
-        except Exception as e:
-            logger.error(f"Error cleaning up old files: {e}")
-            return 0
-
     def get_file_info(self, filename: str) -> Optional[FileInfo]:
         """Get information about a specific file"""
         try:
-            file_path = self.capture_path / filename
+            file_path = staging_tier.locate(filename)
             if not file_path.exists():
                 return None
 
@@ -66,11 +67,112 @@ class FileService:
                 size=stat.st_size,
                 date=datetime.fromtimestamp(stat.st_mtime),
                 url=f"/api/files/captures/{filename}",
+                thumbnail_url=f"/api/files/captures/{filename}?thumbnail=true",
+                media_type=media_type(filename),
+                companions=self.companions(filename),
             )
         except Exception as e:
             logger.error(f"Error getting file info for {filename}: {e}")
             return None
 
+    def companions(self, filename: str) -> List[str]:
+        """Other files of the same shot (RAW+JPEG), by name lookups on disk"""
+        stem = capture_stem(filename)
+        names = {
+            f"{stem}{extension}"
+            for lower in CAPTURE_EXTENSIONS
+            for extension in (lower, lower.upper())
+        }
+        names.discard(filename)
+        return primary_first(n for n in names if staging_tier.locate(n).exists())
+
+    def _delete_batch(self, filenames: List[str]) -> List[str]:
+        """Delete captures and their catalog entries (worker thread)"""
+        deleted = [f for f in filenames if staging_tier.delete(f)]
+        capture_catalog.remove_many(filenames)
+        return deleted
+
+    async def delete_capture(self, filename: str) -> bool:
+        """Delete one capture, returns whether it existed"""
+        loop = asyncio.get_running_loop()
+        deleted = await loop.run_in_executor(
+            self._executor, self._delete_batch, [filename]
+        )
+        if deleted:
+            logger.info(f"Deleted file: {filename}")
+            event_bus.publish(
+                f"capture:{filename}", "capture.deleted", {"filename": filename}
+            )
+        return bool(deleted)
+
+    def capture_files(self, pattern: str = "*") -> List[Path]:
+        """Capture files (any camera format) in both storage tiers"""
+        return [p for p in staging_tier.capture_files(pattern) if is_capture(p.name)]
+
+    async def list_captures(self, pattern: str = "*") -> List[Path]:
+        """Capture files in both storage tiers, listed off the event loop"""
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self._executor, self.capture_files, pattern)
+
+    def _write_zip(self, paths: List[Path]) -> Path:
+        fd, name = tempfile.mkstemp(suffix=".zip")
+        try:
+            with open(fd, "wb") as f, zipfile.ZipFile(
+                f, "w", zipfile.ZIP_DEFLATED
+            ) as zip_file:
+                for path in paths:
+                    zip_file.write(path, path.name)
+        except BaseException:
+            Path(name).unlink(missing_ok=True)
+            raise
+        return Path(name)
+
+    async def build_zip(self, paths: List[Path]) -> Path:
+        """Write paths to a temporary ZIP file off the event loop"""
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self._executor, self._write_zip, paths)
+
+    async def delete_captures(
+        self, job: Job, filenames: List[str], clear: bool = False
+    ) -> Dict[str, int]:
+        """
+        Delete captures in batches of DELETE_BATCH_SIZE, run as a job.
+        Each batch is one catalog transaction. A selection publishes
+        capture.deleted per file, clearing everything publishes a single
+        captures.cleared at the end.
+        """
+        loop = asyncio.get_running_loop()
+        batch_size = max(1, settings.DELETE_BATCH_SIZE)
+        total = len(filenames)
+        deleted = 0
+        job.update(0, total)
+        try:
+            for start in range(0, total, batch_size):
+                job.check_cancelled()
+                batch = filenames[start : start + batch_size]
+                removed = await loop.run_in_executor(
+                    self._executor, self._delete_batch, batch
+                )
+                deleted += len(removed)
+                if not clear:
+                    for filename in removed:
+                        event_bus.publish(
+                            f"capture:{filename}",
+                            "capture.deleted",
+                            {"filename": filename},
+                        )
+                job.update(
+                    start + len(batch), total, f"Deleted {deleted} of {total} files"
+                )
+        finally:
+            logger.info(f"Deleted {deleted} capture files")
+            if clear:
+                event_bus.publish("capture", "captures.cleared", {"count": deleted})
+        return {"deleted": deleted, "missing": total - deleted}
+
+    def shutdown(self):
+        self._executor.shutdown(wait=False)
+
 
 # Singleton instance
 file_service = FileService()
@@ -0,0 +1,384 @@
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+import asyncio
+import logging
+import multiprocessing
+import os
+
+import numpy as np
+from PIL import Image
+
+from config.settings import settings
+from services.capture_catalog import capture_catalog
+from services.capture_formats import RAW_EXTENSIONS, capture_stem, primary_first
+from services.image_metadata import read_exif
+from services.jobs import Job
+from services.staging import staging_tier
+
+try:
+    import rawpy
+except ImportError:  # RAW conversion is optional
+    rawpy = None
+
+logger = logging.getLogger(__name__)
+
+FITS_BLOCK = 2880
+CARD_LENGTH = 80
+# ISO 8601 without a zone, as FITS dates are written
+FITS_DATE = "%Y-%m-%dT%H:%M:%S"
+
+IMAGE_EXTENSIONS = {".jpg", ".jpeg", ".tif", ".tiff", ".png"}
+
+# Camera settings written as header cards: setting -> (keyword, comment)
+SETTING_CARDS = {
+    "iso": ("ISOSPEED", "ISO speed"),
+    "shutter_speed": ("SHUTTER", "Shutter speed setting"),
+    "aperture": ("APERTURE", "Aperture setting"),
+    "white_balance": ("WHITEBAL", "White balance setting"),
+    "exposure_mode": ("EXPMODE", "Exposure mode"),
+    "focus_mode": ("FOCMODE", "Focus mode"),
+}
+
+Card = Tuple[str, Any, str]
+
+
+def format_card(keyword: str, value: Any, comment: str = "") -> bytes:
+    """One 80 character FITS header card"""
+    if isinstance(value, bool):
+        text = f"{'T' if value else 'F':>20}"
+    elif isinstance(value, (int, np.integer)):
+        text = f"{int(value):>20}"
+    elif isinstance(value, (float, np.floating)):
+        text = f"{float(value):>20.10G}"
+    else:
+        quoted = str(value).replace("'", "''")[:68]
+        text = f"'{quoted:<8}'"
+    card = f"{keyword:<8}= {text}"
+    if comment:
+        card += f" / {comment}"
+    return card[:CARD_LENGTH].ljust(CARD_LENGTH).encode("ascii", "replace")
+
+
+def build_header(cards: Sequence[Card]) -> bytes:
+    header = b"".join(format_card(*card) for card in cards)
+    header += b"END".ljust(CARD_LENGTH)
+    return header.ljust(-(-len(header) // FITS_BLOCK) * FITS_BLOCK, b" ")
+
+
+def read_header_cards(path: Path) -> Dict[str, str]:
+    """Raw keyword -> value text of a FITS header, empty if unreadable"""
+    cards: Dict[str, str] = {}
+    try:
+        with open(path, "rb") as f:
+            while True:
+                block = f.read(FITS_BLOCK)
+                if len(block) < FITS_BLOCK:
+                    return {}
+                for i in range(0, FITS_BLOCK, CARD_LENGTH):
+                    card = block[i : i + CARD_LENGTH].decode("ascii", "replace")
+                    keyword = card[:8].strip()
+                    if keyword == "END":
+                        return cards
+                    if card[8:10] == "= ":
+                        cards[keyword] = (
+                            card[10:].split(" / ")[0].strip().strip("'").rstrip()
+                        )
+    except OSError:
+        return {}
+
+
+def source_cards(source: Path) -> List[Card]:
+    """Cards identifying the source version a FITS file was made from"""
+    stat = source.stat()
+    return [
+        ("SRCFILE", source.name, "Converted from"),
+        ("SRCSIZE", stat.st_size, "Source size (bytes)"),
+        ("SRCMTIME", stat.st_mtime_ns, "Source mtime (ns)"),
+    ]
+
+
+def is_up_to_date(source: Path, target: Path) -> bool:
+    """Whether target was converted from the current size and mtime of source"""
+    if not target.exists():
+        return False
+    cards = read_header_cards(target)
+    stat = source.stat()
+    return cards.get("SRCSIZE") == str(stat.st_size) and cards.get("SRCMTIME") == str(
+        stat.st_mtime_ns
+    )
+
+
+def exif_cards(info: Dict[str, Any]) -> List[Card]:
+    cards: List[Card] = []
+    if "date_taken" in info:
+        try:
+            taken = datetime.strptime(info["date_taken"], "%Y:%m:%d %H:%M:%S")
+            cards.append(("DATE-LOC", taken.isoformat(), "Camera clock, local time"))
+            # DATE-OBS is UTC, only known if the camera recorded its offset
+            if "date_offset" in info:
+                offset = datetime.strptime(info["date_offset"], "%z").tzinfo
+                utc = taken.replace(tzinfo=offset).astimezone(timezone.utc)
+                cards.append(("DATE-OBS", utc.strftime(FITS_DATE), "UTC"))
+        except ValueError:
+            pass
+    if "exposure" in info:
+        cards.append(("EXPTIME", float(info["exposure"]), "Exposure time (s)"))
+    if "iso" in info:
+        cards.append(("ISOSPEED", int(info["iso"]), "ISO speed"))
+    if "temperature" in info:
+        cards.append(("CCD-TEMP", float(info["temperature"]), "Temperature (C)"))
+    if "focal_length" in info:
+        cards.append(("FOCALLEN", float(info["focal_length"]), "Focal length (mm)"))
+    if "f_number" in info:
+        cards.append(("FOCRATIO", float(info["f_number"]), "Focal ratio"))
+    model = " ".join(info[k] for k in ("make", "model") if info.get(k))
+    if model:
+        cards.append(("INSTRUME", model, "Camera"))
+    return cards
+
+
+def settings_cards(camera_settings: Dict[str, Any], present: set) -> List[Card]:
+    cards: List[Card] = []
+    for name, (keyword, comment) in SETTING_CARDS.items():
+        value = camera_settings.get(name)
+        if value is not None and keyword not in present:
+            cards.append((keyword, value, comment))
+    return cards
+
+
+def decode_source(source: Path) -> Tuple[np.ndarray, List[Card]]:
+    """
+    Pixel data in FITS axis order (planes, rows, columns) plus cards
+    describing it. RAW files keep the undebayered sensor data.
+    """
+    if source.suffix.lower() in RAW_EXTENSIONS:
+        if rawpy is None:
+            raise ValueError("RAW conversion needs the rawpy package")
+        with rawpy.imread(str(source)) as raw:
+            data = raw.raw_image_visible.copy()
+            pattern = "".join(chr(raw.color_desc[c]) for c in raw.raw_pattern.flat)
+            cards = [
+                ("BAYERPAT", pattern, "Sensor colour filter pattern"),
+                ("XBAYROFF", 0, "Bayer X offset"),
+                ("YBAYROFF", 0, "Bayer Y offset"),
+            ]
+            if raw.white_level:
+                cards.append(("DATAMAX", int(raw.white_level), "Sensor white level"))
+        return data[np.newaxis], cards
+
+    with Image.open(source) as image:
+        if image.mode in ("L", "I;16"):
+            data = np.asarray(image)[np.newaxis]
+        else:
+            data = np.asarray(image.convert("RGB")).transpose(2, 0, 1)
+    cards = []
+    if data.shape[0] == 3:
+        cards.append(("CTYPE3", "RGB", "Colour planes"))
+    return data, cards
+
+
+def write_fits(target: Path, data: np.ndarray, cards: Sequence[Card]):
+    """Write a FITS file atomically, via a temporary file in the same directory"""
+    if data.dtype == np.uint8:
+        bitpix, scaling = 8, []
+    elif data.dtype == np.uint16:
+        # FITS has no unsigned 16-bit type, the offset maps it onto int16
+        bitpix, scaling = 16, [
+            ("BZERO", 32768, "Offset for unsigned data"),
+            ("BSCALE", 1, ""),
+        ]
+    else:
+        raise ValueError(f"Unsupported pixel type {data.dtype}")
+
+    planes, height, width = data.shape
+    axes: List[Card] = [
+        ("SIMPLE", True, "Standard FITS"),
+        ("BITPIX", bitpix, "Bits per pixel"),
+        ("NAXIS", 3 if planes > 1 else 2, "Number of axes"),
+        ("NAXIS1", width, "Columns"),
+        ("NAXIS2", height, "Rows"),
+    ]
+    if planes > 1:
+        axes.append(("NAXIS3", planes, "Planes"))
+    header = build_header(
+        axes
+        + scaling
+        + [("ROWORDER", "TOP-DOWN", "First row is the top of the image")]
+        + list(cards)
+    )
+
+    tmp = target.with_name(f".{target.name}.tmp")
+    try:
+        with open(tmp, "wb") as f:
+            f.write(header)
+            size = 0
+            for plane in data:
+                if bitpix == 16:
+                    plane = (plane.astype(np.int32) - 32768).astype(">i2")
+                f.write(plane.tobytes())
+                size += plane.nbytes
+            f.write(b"\0" * (-size % FITS_BLOCK))
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp, target)
+    finally:
+        tmp.unlink(missing_ok=True)
+
+
+def convert_file(
+    source: str,
+    target: str,
+    camera_settings: Optional[Dict[str, Any]] = None,
+    force: bool = False,
+) -> Dict[str, Any]:
+    """
+    Convert one capture to FITS. Runs in a worker process, so it takes and
+    returns only plain values.
+    """
+    source_path, target_path = Path(source), Path(target)
+    result = {"filename": source_path.name, "fits": target_path.name}
+    try:
+        if not force and is_up_to_date(source_path, target_path):
+            return {**result, "status": "skipped"}
+        data, cards = decode_source(source_path)
+        if source_path.suffix.lower() in IMAGE_EXTENSIONS:
+            cards += exif_cards(read_exif(source_path))
+        cards += settings_cards(camera_settings or {}, {c[0] for c in cards})
+        cards += source_cards(source_path)
+        cards += [
+            ("DATE", datetime.now(timezone.utc).strftime(FITS_DATE), "File written"),
+            ("CREATOR", "Camera Web App", "Software"),
+        ]
+        write_fits(target_path, data, cards)
+        return {**result, "status": "converted"}
+    except Exception as e:
+        return {**result, "status": "failed", "error": str(e)}
+
+
+class FitsConverter:
+    """
+    Converts captures to FITS in a process pool (one process per core by
+    default), so decoding never competes with the server for the GIL.
+
+    Conversion is incremental: every FITS file records the size and mtime
+    of its source in SRCSIZE/SRCMTIME cards, and sources that haven't
+    changed since are skipped.
+    """
+
+    def __init__(self, path: Path, workers: int):
+        self.path = path
+        self.path.mkdir(parents=True, exist_ok=True)
+        self.workers = workers or os.cpu_count() or 1
+        self._executor: Optional[ProcessPoolExecutor] = None
+
+    def _get_executor(self) -> ProcessPoolExecutor:
+        # Created on first use; spawned rather than forked because the
+        # server process runs many threads
+        if self._executor is None:
+            self._executor = ProcessPoolExecutor(
+                max_workers=self.workers,
+                mp_context=multiprocessing.get_context("spawn"),
+            )
+        return self._executor
+
+    def target_for(self, source: Path) -> Path:
+        return self.path / f"{source.stem}.fits"
+
+    def source_for(self, filenames: Sequence[str]) -> str:
+        """
+        The file of a multi-file capture to convert: the RAW, for the
+        undebayered sensor data, when rawpy can read it
+        """
+        if rawpy:
+            for filename in filenames:
+                if Path(filename).suffix.lower() in RAW_EXTENSIONS:
+                    return filename
+        return primary_first(filenames)[0]
+
+    def one_per_shot(self, paths: Sequence[Path]) -> List[Path]:
+        """
+        The file to convert of each shot among paths: the files of a
+        RAW+JPEG shot share one FITS target, so only one may be converted
+        """
+        shots: Dict[str, Dict[str, Path]] = {}
+        for path in paths:
+            shots.setdefault(capture_stem(path.name), {})[path.name] = path
+        return sorted(
+            (files[self.source_for(list(files))] for files in shots.values()),
+            key=lambda p: p.name,
+        )
+
+    def sources(self) -> List[Path]:
+        """Captures that can be converted, one file per shot"""
+        extensions = IMAGE_EXTENSIONS | (RAW_EXTENSIONS if rawpy else set())
+        return self.one_per_shot(
+            [p for p in staging_tier.capture_files() if p.suffix.lower() in extensions]
+        )
+
+    async def convert(
+        self,
+        job: Job,
+        filenames: Optional[Sequence[str]] = None,
+        camera_settings: Optional[Dict[str, Any]] = None,
+        force: bool = False,
+    ) -> Dict[str, Any]:
+        """Convert captures (all of them by default), run as a job"""
+        if filenames is None:
+            paths = self.sources()
+        else:
+            paths = []
+            for filename in filenames:
+                path = staging_tier.find(filename)
+                if path is None:
+                    raise ValueError(f"Capture not found: {filename}")
+                paths.append(path)
+            paths = self.one_per_shot(paths)
+
+        executor = self._get_executor()
+        futures = [
+            asyncio.wrap_future(
+                executor.submit(
+                    convert_file,
+                    str(path),
+                    str(self.target_for(path)),
+                    camera_settings,
+                    force,
+                )
+            )
+            for path in paths
+        ]
+        counts = {"converted": 0, "skipped": 0, "failed": 0}
+        failures = []
+        job.update(0, len(futures), f"Converting {len(futures)} files")
+        try:
+            for i, future in enumerate(asyncio.as_completed(futures)):
+                result = await future
+                counts[result["status"]] += 1
+                if result["status"] == "converted":
+                    capture_catalog.add_derived(
+                        self.path / result["fits"], result["filename"], "fits"
+                    )
+                if result["status"] == "failed":
+                    failures.append(result)
+                    logger.warning(
+                        f"FITS conversion of {result['filename']} failed: "
+                        f"{result['error']}"
+                    )
+                job.update(i + 1, message=f"{counts['converted']} converted")
+                job.check_cancelled()
+        finally:
+            for future in futures:
+                future.cancel()
+        return {**counts, "failures": failures}
+
+    def shutdown(self):
+        if self._executor:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+
+
+# Singleton instance
+fits_converter = FitsConverter(
+    path=Path(settings.FITS_PATH), workers=settings.FITS_WORKERS
+)
@@ -0,0 +1,247 @@
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Deque, Dict, List, Optional, Tuple
+import asyncio
+import io
+import logging
+import time
+
+import numpy as np
+from PIL import Image
+
+from camera.controller import CameraController
+from config.settings import settings
+from services.event_bus import event_bus
+from services.preview_service import PreviewBroadcaster, PreviewFrame, preview_service
+from services.preview_transcoder import Region, decode_jpeg_rows, fit_region
+
+logger = logging.getLogger(__name__)
+
+# FWHM / flux-weighted mean radius for a Gaussian star profile
+# (2.3548 sigma / 1.2533 sigma)
+HFR_TO_FWHM = 1.8789
+
+
+def decode_luma(data: bytes, region: Optional[Region] = None) -> np.ndarray:
+    """Decode a JPEG (or just a region of it) to a float32 luminance array"""
+    if region:
+        image = decode_jpeg_rows(data, region.y + region.h)
+        x, y, w, h = fit_region(region, image.width, image.height)
+        image = image.crop((x, y, x + w, y + h))
+    else:
+        image = Image.open(io.BytesIO(data))
+    return np.asarray(image.convert("L"), dtype=np.float32)
+
+
+def laplacian_variance(luma: np.ndarray) -> float:
+    """Variance of the 4-neighbour Laplacian, higher is sharper"""
+    lap = (
+        luma[1:-1, :-2]
+        + luma[1:-1, 2:]
+        + luma[:-2, 1:-1]
+        + luma[2:, 1:-1]
+        - 4 * luma[1:-1, 1:-1]
+    )
+    return float(lap.var())
+
+
+def brenner_gradient(luma: np.ndarray) -> float:
+    """Mean squared two-pixel horizontal difference, higher is sharper"""
+    diff = luma[:, 2:] - luma[:, :-2]
+    return float(np.mean(diff * diff))
+
+
+def star_hfr(
+    luma: np.ndarray, max_stars: int = 20, radius: int = 8
+) -> Tuple[Optional[float], int]:
+    """
+    Median half-flux radius (flux-weighted mean distance from the peak, in
+    pixels) of the brightest stars, lower is sharper. Returns (hfr, stars).
+    """
+    height, width = luma.shape
+    if height <= 2 * radius + 2 or width <= 2 * radius + 2:
+        return None, 0
+
+    background = float(np.median(luma))
+    # Median absolute deviation is robust against the stars themselves
+    noise = 1.4826 * float(np.median(np.abs(luma - background)))
+    threshold = background + max(5 * noise, 8.0)
+
+    # Local maxima away from the border. Ties only count in one direction so
+    # a saturated, flat-topped star yields a single peak.
+    r = radius
+    core = luma[r:-r, r:-r]
+    peaks = core >= threshold
+    for dy in (-1, 0, 1):
+        for dx in (-1, 0, 1):
+            if not dy and not dx:
+                continue
+            neighbour = luma[r + dy : height - r + dy, r + dx : width - r + dx]
+            if dy < 0 or (dy == 0 and dx < 0):
+                peaks &= core > neighbour
+            else:
+                peaks &= core >= neighbour
+
+    ys, xs = np.nonzero(peaks)
+    if not len(ys):
+        return None, 0
+    brightest = np.argsort(core[ys, xs])[::-1][:max_stars]
+    ys, xs = ys[brightest] + r, xs[brightest] + r
+
+    # Cut a (2r+1)^2 window around every star at once
+    offsets = np.arange(-r, r + 1)
+    windows = luma[
+        ys[:, None, None] + offsets[None, :, None],
+        xs[:, None, None] + offsets[None, None, :],
+    ]
+    # Dropping one more noise sigma keeps the noise floor out of the flux
+    windows = np.clip(windows - background - noise, 0, None)
+    distance = np.hypot(offsets[:, None], offsets[None, :])
+    windows *= distance <= r
+
+    flux = windows.sum(axis=(1, 2))
+    valid = flux > 0
+    if not valid.any():
+        return None, 0
+    hfr = (windows * distance).sum(axis=(1, 2))[valid] / flux[valid]
+    return float(np.median(hfr)), int(valid.sum())
+
+
+def compute_focus_metrics(
+    data: bytes, region: Optional[Region] = None
+) -> Dict[str, Any]:
+    """All focus metrics for one live view frame"""
+    luma = decode_luma(data, region)
+    hfr, stars = star_hfr(luma)
+    return {
+        "laplacian_variance": round(laplacian_variance(luma), 3),
+        "brenner": round(brenner_gradient(luma), 3),
+        "hfr": round(hfr, 3) if hfr is not None else None,
+        "fwhm": round(hfr * HFR_TO_FWHM, 3) if hfr is not None else None,
+        "stars": stars,
+    }
+
+
+class FocusAnalyzer:
+    """
+    Computes focus metrics on one camera's live view in the background.
+
+    The analyzer is just another viewer of the PreviewBroadcaster: it takes
+    the newest frame when the previous measurement is done, so a slow
+    measurement skips frames instead of delaying the preview.
+    """
+
+    def __init__(
+        self,
+        controller: CameraController,
+        broadcaster: PreviewBroadcaster,
+        service: "FocusService",
+        history_size: int,
+    ):
+        self.controller = controller
+        self.broadcaster = broadcaster
+        self.region: Optional[Region] = None
+        self.max_fps = settings.FOCUS_ANALYSIS_MAX_FPS
+        self.history: Deque[Dict[str, Any]] = deque(maxlen=history_size)
+        self.errors = 0
+
+        self._service = service
+        self._task: Optional[asyncio.Task] = None
+
+    @property
+    def running(self) -> bool:
+        return self._task is not None and not self._task.done()
+
+    def start(self):
+        if not self.running:
+            self._task = asyncio.get_running_loop().create_task(self._analyze())
+
+    async def _analyze(self):
+        logger.info(f"Focus analysis started for camera {self.controller.address}")
+        self.broadcaster.acquire()
+        last_seq = 0
+        try:
+            while True:
+                started = time.monotonic()
+                try:
+                    frame = await self.broadcaster.next_frame(last_seq, timeout=1.0)
+                except asyncio.TimeoutError:
+                    continue
+                last_seq = frame.seq
+
+                try:
+                    sample = await self._service.measure(frame, self.region)
+                except Exception as e:
+                    self.errors += 1
+                    logger.warning(f"Focus analysis failed on frame {frame.seq}: {e}")
+                    continue
+
+                self.history.append(sample)
+                event_bus.publish(
+                    f"focus.metrics:{self.controller.address}",
+                    "focus.metrics",
+                    {"camera_id": self.controller.address, **sample},
+                )
+
+                delay = 1.0 / self.max_fps - (time.monotonic() - started)
+                if delay > 0:
+                    await asyncio.sleep(delay)
+        finally:
+            self.broadcaster.release()
+            logger.info(f"Focus analysis stopped for camera {self.controller.address}")
+
+    async def stop(self):
+        if self._task:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    def get_samples(self, since: int = 0) -> List[Dict[str, Any]]:
+        return [s for s in self.history if s["seq"] > since]
+
+
+class FocusService:
+    """Owns one FocusAnalyzer per camera and the shared metrics worker"""
+
+    def __init__(self, workers: int, history_size: int):
+        self.history_size = history_size
+        self._executor = ThreadPoolExecutor(
+            max_workers=workers, thread_name_prefix="focus-analysis"
+        )
+        self._analyzers: Dict[CameraController, FocusAnalyzer] = {}
+
+    def get_analyzer(self, controller: CameraController) -> FocusAnalyzer:
+        analyzer = self._analyzers.get(controller)
+        if analyzer is None:
+            analyzer = FocusAnalyzer(
+                controller,
+                preview_service.get_broadcaster(controller),
+                self,
+                self.history_size,
+            )
+            self._analyzers[controller] = analyzer
+        return analyzer
+
+    async def measure(
+        self, frame: PreviewFrame, region: Optional[Region] = None
+    ) -> Dict[str, Any]:
+        """Metrics for one frame, computed on the analysis worker"""
+        metrics = await asyncio.get_running_loop().run_in_executor(
+            self._executor, compute_focus_metrics, frame.data, region
+        )
+        return {"seq": frame.seq, "timestamp": frame.timestamp, **metrics}
+
+    async def shutdown(self):
+        for analyzer in list(self._analyzers.values()):
+            await analyzer.stop()
+        self._executor.shutdown(wait=False)
+
+
+# Singleton instance
+focus_service = FocusService(
+    workers=settings.FOCUS_ANALYSIS_WORKERS,
+    history_size=settings.FOCUS_HISTORY_SIZE,
+)
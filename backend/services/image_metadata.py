@@ -0,0 +1,82 @@
+from pathlib import Path
+from typing import Any, Dict, Optional
+import logging
+
+from PIL import Image
+
+logger = logging.getLogger(__name__)
+
+EXIF_IFD = 0x8769
+
+# Tags read from the main IFD
+IFD0_TAGS = {
+    0x010F: "make",
+    0x0110: "model",
+}
+
+# Tags read from the Exif sub-IFD
+EXIF_TAGS = {
+    0x829A: "exposure",  # ExposureTime, seconds
+    0x829D: "f_number",
+    0x8827: "iso",  # ISOSpeedRatings
+    0x9003: "date_taken",  # DateTimeOriginal
+    0x9011: "date_offset",  # OffsetTimeOriginal, e.g. "+02:00" (Exif 2.31)
+    0x920A: "focal_length",  # mm
+    0x9400: "temperature",  # AmbientTemperature, deg C (Exif 2.31)
+}
+
+
+def _to_number(value: Any) -> Any:
+    """EXIF rationals and one-element tuples to plain int/float"""
+    if isinstance(value, tuple):
+        value = value[0] if value else None
+    if value is None or isinstance(value, (int, str)):
+        return value
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return None
+
+
+def read_exif(path: Path) -> Dict[str, Any]:
+    """
+    Exposure related EXIF fields of an image file. Missing fields are
+    absent from the result; unreadable files give an empty dict.
+    """
+    try:
+        with Image.open(path) as image:
+            exif = image.getexif()
+            info: Dict[str, Any] = {
+                "width": image.width,
+                "height": image.height,
+            }
+    except Exception as e:
+        logger.warning(f"Could not read EXIF from {path}: {e}")
+        return {}
+
+    for tag, name in IFD0_TAGS.items():
+        if tag in exif:
+            info[name] = str(exif[tag]).strip("\x00 ")
+    sub_ifd = exif.get_ifd(EXIF_IFD)
+    for tag, name in EXIF_TAGS.items():
+        if tag in sub_ifd:
+            value = _to_number(sub_ifd[tag])
+            if isinstance(value, str):
+                value = value.strip("\x00 ")
+            if value is not None:
+                info[name] = value
+    return info
+
+
+def exposure_key(
+    exposure: Optional[float], iso: Optional[int], temperature: Optional[float]
+) -> str:
+    """Readable exposure/ISO/temperature label, e.g. '30s ISO1600 -5C'"""
+    parts = []
+    if exposure is not None:
+        parts.append(f"{exposure:g}s")
+    if iso is not None:
+        parts.append(f"ISO{iso}")
+    if temperature is not None:
+        parts.append(f"{temperature:g}C")
+    return " ".join(parts) or "any"
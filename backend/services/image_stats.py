@@ -0,0 +1,119 @@
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from typing import Any, Dict, Optional, Tuple, Union
+import asyncio
+import io
+
+import numpy as np
+from PIL import Image
+
+from config.settings import settings
+
+CHANNELS = ("red", "green", "blue", "luma")
+
+# Rec. 601 luma weights in 1/256 units, for an integer-only luma
+LUMA_WEIGHTS = np.array([77, 150, 29], dtype=np.uint16)
+
+HISTOGRAM_BINS = (16, 32, 64, 128, 256)
+
+
+def open_downsampled(source: Union[Path, bytes], max_width: int) -> Image.Image:
+    """
+    Decode an image to RGB at roughly max_width or more, letting libjpeg
+    decode JPEGs at 1/2, 1/4 or 1/8 scale instead of full size.
+    """
+    with Image.open(
+        io.BytesIO(source) if isinstance(source, bytes) else source
+    ) as image:
+        if image.width > max_width:
+            scale = max_width / image.width
+            image.draft("RGB", (max_width, max(1, round(image.height * scale))))
+        return image.convert("RGB")
+
+
+def image_stats(image: Image.Image) -> Dict[str, Any]:
+    """
+    Per-channel 256-bin histograms plus mean, median, standard deviation,
+    extremes and the percentage of pixels clipped at 0 and 255.
+    """
+    pixels = np.asarray(image).reshape(-1, 3)
+    luma = ((pixels @ LUMA_WEIGHTS + 128) >> 8).astype(np.uint8)
+    samples = np.column_stack([pixels, luma])
+
+    # One bincount for all four channels, offset into separate 256-bin ranges
+    offsets = np.arange(len(CHANNELS), dtype=np.int64) * 256
+    histograms = np.bincount(
+        (samples + offsets).ravel(), minlength=256 * len(CHANNELS)
+    ).reshape(len(CHANNELS), 256)
+
+    count = len(pixels)
+    values = np.arange(256)
+    means = histograms @ values / count
+    variances = histograms @ (values * values) / count - means * means
+    cumulative = np.cumsum(histograms, axis=1)
+    medians = (cumulative < (count + 1) / 2).sum(axis=1)
+    nonzero = histograms > 0
+
+    channels = {}
+    for i, name in enumerate(CHANNELS):
+        channels[name] = {
+            "mean": round(float(means[i]), 2),
+            "median": int(medians[i]),
+            "std": round(float(np.sqrt(max(variances[i], 0))), 2),
+            "min": int(np.argmax(nonzero[i])),
+            "max": int(255 - np.argmax(nonzero[i][::-1])),
+            "clipped_low": round(100 * float(histograms[i, 0]) / count, 3),
+            "clipped_high": round(100 * float(histograms[i, 255]) / count, 3),
+            "histogram": histograms[i].tolist(),
+        }
+    return {"width": image.width, "height": image.height, "channels": channels}
+
+
+def rebin(stats: Dict[str, Any], bins: int) -> Dict[str, Any]:
+    """Copy of stats with histograms summed down to fewer bins"""
+    if bins == 256:
+        return stats
+    channels = {
+        name: {
+            **channel,
+            "histogram": np.asarray(channel["histogram"])
+            .reshape(bins, -1)
+            .sum(axis=1)
+            .tolist(),
+        }
+        for name, channel in stats["channels"].items()
+    }
+    return {**stats, "channels": channels}
+
+
+class FrameStatsCache:
+    """
+    Statistics of the newest live view frame per camera. Concurrent
+    requests for the same frame share one computation.
+    """
+
+    def __init__(self, max_width: int):
+        self.max_width = max_width
+        self._executor = ThreadPoolExecutor(
+            max_workers=1, thread_name_prefix="frame-stats"
+        )
+        self._latest: Dict[Any, Tuple[int, asyncio.Future]] = {}
+
+    async def get(self, source: Any, seq: int, data: bytes) -> Dict[str, Any]:
+        """Stats of frame `seq` of `source` (e.g. a preview broadcaster)"""
+        cached: Optional[Tuple[int, asyncio.Future]] = self._latest.get(source)
+        if cached is None or cached[0] != seq:
+            future = asyncio.get_running_loop().run_in_executor(
+                self._executor,
+                lambda: image_stats(open_downsampled(data, self.max_width)),
+            )
+            cached = (seq, future)
+            self._latest[source] = cached
+        return await asyncio.shield(cached[1])
+
+    def shutdown(self):
+        self._executor.shutdown(wait=False)
+
+
+# Singleton instance
+frame_stats = FrameStatsCache(max_width=settings.STATS_MAX_WIDTH)
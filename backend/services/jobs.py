@@ -0,0 +1,170 @@
+from collections import OrderedDict
+from datetime import datetime
+from typing import Any, Awaitable, Callable, Dict, List, Optional
+import asyncio
+import itertools
+import logging
+import threading
+import time
+
+from services.event_bus import event_bus
+
+logger = logging.getLogger(__name__)
+
+# Minimum seconds between job.progress events of one job
+PROGRESS_INTERVAL = 0.25
+
+
+class JobCancelled(Exception):
+    """Raised inside a job's worker code once the job has been cancelled"""
+
+
+class Job:
+    """
+    A long-running background operation with progress reporting.
+
+    Worker threads call update() and check_cancelled(); both are safe to
+    call from any thread. Progress is published as job.progress events on
+    the job:{id} topic, the final state as job.completed / job.failed /
+    job.cancelled.
+    """
+
+    def __init__(self, job_id: str, kind: str, description: str):
+        self.id = job_id
+        self.kind = kind
+        self.description = description
+        self.state = "pending"
+        self.done = 0
+        self.total = 0
+        self.message = ""
+        self.result: Any = None
+        self.error: Optional[str] = None
+        self.created = datetime.now()
+        self.started: Optional[datetime] = None
+        self.finished: Optional[datetime] = None
+
+        self._cancel = threading.Event()
+        self._task: Optional[asyncio.Task] = None
+        self._published_at = 0.0
+
+    @property
+    def cancelled(self) -> bool:
+        return self._cancel.is_set()
+
+    def check_cancelled(self):
+        if self._cancel.is_set():
+            raise JobCancelled(f"Job {self.id} cancelled")
+
+    def update(
+        self,
+        done: Optional[int] = None,
+        total: Optional[int] = None,
+        message: Optional[str] = None,
+    ):
+        if done is not None:
+            self.done = done
+        if total is not None:
+            self.total = total
+        if message is not None:
+            self.message = message
+
+        now = time.monotonic()
+        if now - self._published_at >= PROGRESS_INTERVAL or self.done == self.total:
+            self._published_at = now
+            self._publish("job.progress")
+
+    def _publish(self, event_type: str):
+        event_bus.publish(f"job:{self.id}", event_type, self.to_dict())
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "job_id": self.id,
+            "kind": self.kind,
+            "description": self.description,
+            "state": self.state,
+            "done": self.done,
+            "total": self.total,
+            "progress": round(self.done / self.total, 4) if self.total else None,
+            "message": self.message,
+            "result": self.result,
+            "error": self.error,
+            "created": self.created.isoformat(),
+            "started": self.started.isoformat() if self.started else None,
+            "finished": self.finished.isoformat() if self.finished else None,
+        }
+
+
+class JobManager:
+    """Runs background jobs and keeps the most recent ones for status queries"""
+
+    def __init__(self, history_size: int = 100):
+        self.history_size = history_size
+        self._jobs: "OrderedDict[str, Job]" = OrderedDict()
+        self._ids = itertools.count(1)
+
+    def start(
+        self,
+        kind: str,
+        description: str,
+        work: Callable[[Job], Awaitable[Any]],
+    ) -> Job:
+        """Run work(job) as a background task; its return value is the result"""
+        job = Job(f"{kind}-{next(self._ids)}", kind, description)
+        self._jobs[job.id] = job
+        while len(self._jobs) > self.history_size:
+            oldest = next(iter(self._jobs.values()))
+            if oldest.state in ("pending", "running"):
+                break
+            self._jobs.popitem(last=False)
+
+        job._task = asyncio.get_running_loop().create_task(self._run(job, work))
+        return job
+
+    async def _run(self, job: Job, work: Callable[[Job], Awaitable[Any]]):
+        job.state = "running"
+        job.started = datetime.now()
+        job._publish("job.progress")
+        logger.info(f"Job {job.id} started: {job.description}")
+        try:
+            job.result = await work(job)
+            job.state = "completed"
+        except (JobCancelled, asyncio.CancelledError):
+            job.state = "cancelled"
+        except Exception as e:
+            job.state = "failed"
+            job.error = str(e)
+            logger.error(f"Job {job.id} failed: {e}")
+        finally:
+            job.finished = datetime.now()
+            job._publish(f"job.{job.state}")
+            logger.info(f"Job {job.id} {job.state}")
+
+    def get(self, job_id: str) -> Optional[Job]:
+        return self._jobs.get(job_id)
+
+    def list(self, kind: Optional[str] = None) -> List[Job]:
+        return [job for job in self._jobs.values() if kind in (None, job.kind)]
+
+    def cancel(self, job_id: str) -> bool:
+        """
+        Ask a job to stop. Worker threads notice at their next
+        check_cancelled(), so the job may take a moment to finish.
+        """
+        job = self._jobs.get(job_id)
+        if job is None or job.state not in ("pending", "running"):
+            return False
+        job._cancel.set()
+        return True
+
+    async def shutdown(self):
+        tasks = []
+        for job in self._jobs.values():
+            if job._task and not job._task.done():
+                job._cancel.set()
+                job._task.cancel()
+                tasks.append(job._task)
+        await asyncio.gather(*tasks, return_exceptions=True)
+
+
+# Singleton instance
+job_manager = JobManager()
@@ -0,0 +1,427 @@
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from typing import Any, Dict, Optional, Tuple
+import asyncio
+import io
+import logging
+import time
+
+import numpy as np
+from PIL import Image
+
+from camera.controller import CameraController
+from config.settings import settings
+from services.calibration import calibration_library
+from services.capture_formats import embedded_preview, is_raw, primary_first
+from services.event_bus import event_bus
+from services.image_metadata import read_exif
+from services.preview_service import PreviewBroadcaster, preview_service
+from services.staging import staging_tier
+
+logger = logging.getLogger(__name__)
+
+# Frames a pixel needs before sigma clipping starts rejecting values
+MIN_FRAMES_TO_CLIP = 5
+
+# Floor for the per-pixel standard deviation (8-bit units), so a static
+# scene doesn't reject ordinary noise
+MIN_SIGMA = 2.0
+
+# Gaussian cutoff (cycles per pixel) applied to the cross-power spectrum.
+# Whitening boosts pixel noise as much as star detail, so the highest
+# frequencies are suppressed before looking for the correlation peak.
+ALIGN_CUTOFF = 0.1
+
+# Only the central crop of this size is correlated, which still finds
+# shifts of up to half its size at a fraction of the full frame FFT cost
+ALIGN_WINDOW = 1024
+
+# Re-derive the alignment reference from the (much less noisy) stack mean
+# every this many frames
+ALIGN_REFERENCE_REFRESH = 10
+
+# Target median brightness of the stretched stack
+STRETCH_BACKGROUND = 0.25
+
+LUMA_WEIGHTS = np.full(3, 1 / 3, dtype=np.float32)
+
+
+def decode_rgb(data: bytes, max_width: int) -> np.ndarray:
+    """Decode a JPEG to float32 RGB, using DCT scaling to stay within max_width"""
+    with Image.open(io.BytesIO(data)) as image:
+        if image.width > max_width:
+            target = (max_width, max(1, round(image.height * max_width / image.width)))
+            image.draft("RGB", target)
+            if image.width > max_width:
+                image = image.resize(target, Image.BILINEAR)
+        return np.asarray(image.convert("RGB"), dtype=np.float32)
+
+
+def alignment_view(image: np.ndarray) -> np.ndarray:
+    """Central ALIGN_WINDOW crop of an image's luminance"""
+    height, width = image.shape[:2]
+    top = max(0, (height - ALIGN_WINDOW) // 2)
+    left = max(0, (width - ALIGN_WINDOW) // 2)
+    crop = image[top : top + ALIGN_WINDOW, left : left + ALIGN_WINDOW]
+    # A matrix product is much faster than mean(axis=2) on interleaved RGB
+    return crop @ LUMA_WEIGHTS
+
+
+def phase_correlate(reference_fft: np.ndarray, luma: np.ndarray) -> Tuple[int, int]:
+    """
+    Integer (dy, dx) that rolls `luma` onto the reference frame, found from
+    the peak of the normalised, low-passed cross-power spectrum
+    """
+    cross = reference_fft * np.conj(np.fft.rfft2(luma))
+    cross /= np.abs(cross) + 1e-9
+    fy = np.fft.fftfreq(luma.shape[0])[:, None]
+    fx = np.fft.rfftfreq(luma.shape[1])[None, :]
+    cross *= np.exp(-(fy * fy + fx * fx) / (2 * ALIGN_CUTOFF**2))
+    correlation = np.fft.irfft2(cross, s=luma.shape)
+    dy, dx = np.unravel_index(int(np.argmax(correlation)), correlation.shape)
+    height, width = luma.shape
+    # Peaks past the middle are negative shifts that wrapped around
+    if dy > height // 2:
+        dy -= height
+    if dx > width // 2:
+        dx -= width
+    return int(dy), int(dx)
+
+
+def stretch_to_jpeg(mean: np.ndarray, quality: int) -> bytes:
+    """
+    Auto-stretch the stack for display: black point just below the sky
+    background, white point at the brightest stars, then a midtones
+    transfer that lifts the background to STRETCH_BACKGROUND.
+    """
+    # Statistics from a subsample are plenty and much cheaper
+    sample = mean[::4, ::4].mean(axis=2)
+    median = float(np.median(sample))
+    mad = 1.4826 * float(np.median(np.abs(sample - median)))
+    black = max(float(sample.min()), median - 2.8 * mad)
+    white = max(float(np.percentile(sample, 99.95)), black + 1e-3)
+
+    image = np.clip((mean - black) / (white - black), 0, 1)
+    background = min(max((median - black) / (white - black), 1e-6), 1 - 1e-6)
+    t = STRETCH_BACKGROUND
+    m = background * (1 - t) / (background + t - 2 * t * background)
+    # Midtones transfer function, m = 0.5 is the identity
+    image = (m - 1) * image / ((2 * m - 1) * image - m)
+
+    out = io.BytesIO()
+    Image.fromarray((image * 255 + 0.5).astype(np.uint8)).save(
+        out, "JPEG", quality=quality
+    )
+    return out.getvalue()
+
+
+class StackAccumulator:
+    """
+    Running per-pixel statistics of frames in constant memory.
+
+    Welford's algorithm keeps a float32 mean (and, for sigma clipping, the
+    sum of squared deviations) plus a per-pixel frame count. In sigma-clip
+    mode a pixel value further than kappa standard deviations from that
+    pixel's mean, such as a satellite trail, is left out for that pixel
+    only. With alignment enabled every frame is first rolled onto the
+    first frame by phase correlation; pixels that wrapped around are left
+    out as well.
+    """
+
+    def __init__(self, mode: str = "mean", kappa: float = 3.0, align: bool = False):
+        self.mode = mode
+        self.kappa = kappa
+        self.align = align
+        self.frames = 0
+        self.clipped = 0
+        self.last_shift: Tuple[int, int] = (0, 0)
+
+        self.mean: Optional[np.ndarray] = None
+        self._m2: Optional[np.ndarray] = None
+        self._count: Optional[np.ndarray] = None
+        self._reference_fft: Optional[np.ndarray] = None
+
+    @property
+    def shape(self) -> Optional[Tuple[int, ...]]:
+        return self.mean.shape if self.mean is not None else None
+
+    def add(self, image: np.ndarray):
+        """Add an HxWx3 float32 frame, which is used as scratch space"""
+        if self.mean is None:
+            self.mean = np.zeros_like(image)
+            self._count = np.zeros(image.shape[:2], dtype=np.float32)
+            if self.mode == "sigma_clip":
+                self._m2 = np.zeros_like(image)
+        elif image.shape != self.mean.shape:
+            raise ValueError(
+                f"Frame size {image.shape[:2]} does not match the stack "
+                f"{self.mean.shape[:2]}"
+            )
+
+        valid = np.ones(image.shape[:2], dtype=bool)
+        if self.align:
+            image, valid = self._align(image, valid)
+
+        # Everything below works in place on float32 buffers, the frame
+        # itself becomes the deviation from the mean
+        delta = image
+        delta -= self.mean
+        if self._m2 is not None and self.frames >= MIN_FRAMES_TO_CLIP:
+            variance = self._m2 / np.maximum(self._count - 1, 1)[..., None]
+            limit = np.maximum(variance, MIN_SIGMA**2)
+            limit *= self.kappa**2
+            inliers = (delta * delta <= limit).all(axis=2)
+            # The spread of a pixel seen in only a few frames is too uncertain
+            inliers |= self._count < MIN_FRAMES_TO_CLIP
+            self.clipped += int(np.count_nonzero(valid & ~inliers))
+            valid &= inliers
+
+        self._count += valid
+        delta *= valid[..., None]
+        step = delta / np.maximum(self._count, 1)[..., None]
+        self.mean += step
+        if self._m2 is not None:
+            # Welford: M2 += delta_old * delta_new = delta * (delta - step)
+            delta *= delta - step
+            self._m2 += delta
+        self.frames += 1
+
+    def _align(
+        self, image: np.ndarray, valid: np.ndarray
+    ) -> Tuple[np.ndarray, np.ndarray]:
+        luma = alignment_view(image)
+        if self._reference_fft is None:
+            self._reference_fft = np.fft.rfft2(luma)
+            return image, valid
+        if self.frames % ALIGN_REFERENCE_REFRESH == 0:
+            self._reference_fft = np.fft.rfft2(alignment_view(self.mean))
+
+        dy, dx = phase_correlate(self._reference_fft, luma)
+        self.last_shift = (dy, dx)
+        if not dy and not dx:
+            return image, valid
+
+        image = np.roll(image, (dy, dx), axis=(0, 1))
+        # Rows and columns that wrapped around carry no information
+        if dy > 0:
+            valid[:dy] = False
+        elif dy < 0:
+            valid[dy:] = False
+        if dx > 0:
+            valid[:, :dx] = False
+        elif dx < 0:
+            valid[:, dx:] = False
+        return image, valid
+
+
+class LiveStack:
+    """
+    Live stack for one camera, fed from the live view broadcaster or from
+    each new capture of that camera.
+
+    Frames are decoded and accumulated on a worker thread; like the focus
+    analyzer, the preview source takes the newest frame when the previous
+    one is done, so stacking never slows the preview. The stretched JPEG
+    is re-rendered at most every LIVE_STACK_RENDER_INTERVAL seconds.
+    """
+
+    def __init__(
+        self,
+        controller: CameraController,
+        broadcaster: PreviewBroadcaster,
+        executor: ThreadPoolExecutor,
+    ):
+        self.controller = controller
+        self.broadcaster = broadcaster
+        self.source = "preview"
+        self.calibrate = False
+        self.accumulator = StackAccumulator()
+        self.image: Optional[bytes] = None
+        self.image_frames = 0
+        self.errors = 0
+
+        self._executor = executor
+        self._task: Optional[asyncio.Task] = None
+        self._rendered_at = 0.0
+
+    @property
+    def running(self) -> bool:
+        return self._task is not None and not self._task.done()
+
+    async def start(
+        self,
+        source: str,
+        mode: str,
+        kappa: float,
+        align: bool,
+        calibrate: bool = False,
+    ):
+        """(Re)start stacking from scratch"""
+        await self.stop()
+        self.source = source
+        self.calibrate = calibrate
+        self.accumulator = StackAccumulator(mode, kappa, align)
+        self.image = None
+        self.image_frames = 0
+        self.errors = 0
+        self._rendered_at = 0.0
+        stack = self._stack_preview if source == "preview" else self._stack_captures
+        self._task = asyncio.get_running_loop().create_task(stack())
+
+    async def _stack_preview(self):
+        logger.info(f"Live stack started on camera {self.controller.address} preview")
+        self.broadcaster.acquire()
+        last_seq = 0
+        try:
+            while True:
+                try:
+                    frame = await self.broadcaster.next_frame(last_seq, timeout=1.0)
+                except asyncio.TimeoutError:
+                    continue
+                last_seq = frame.seq
+                await self._add(frame.data)
+        finally:
+            self.broadcaster.release()
+            logger.info(f"Live stack stopped on camera {self.controller.address}")
+
+    async def _stack_captures(self):
+        logger.info(f"Live stack started on camera {self.controller.address} captures")
+        subscription = event_bus.subscribe(["capture"])
+        loop = asyncio.get_running_loop()
+        try:
+            while True:
+                for event in await subscription.next_batch(timeout=60):
+                    if (
+                        event.type != "capture.completed"
+                        or event.data.get("camera_id") != self.controller.address
+                    ):
+                        continue
+                    # One frame per shot: the JPEG of a RAW+JPEG pair, the
+                    # embedded preview of a RAW-only one
+                    filename = event.data["filename"]
+                    companions = event.data.get("companions", [])
+                    if primary_first([filename, *companions])[0] != filename:
+                        continue
+                    path = staging_tier.locate(filename)
+                    try:
+                        data = await loop.run_in_executor(
+                            self._executor,
+                            embedded_preview if is_raw(filename) else Path.read_bytes,
+                            path,
+                        )
+                    except (OSError, ValueError) as e:
+                        self.errors += 1
+                        logger.warning(f"Live stack could not read {path}: {e}")
+                        continue
+                    masters = None
+                    if self.calibrate:
+                        info = await loop.run_in_executor(
+                            self._executor, read_exif, path
+                        )
+                        masters = calibration_library.select(
+                            info.get("exposure"),
+                            info.get("iso"),
+                            info.get("temperature"),
+                        )
+                    await self._add(data, masters)
+        finally:
+            event_bus.unsubscribe(subscription)
+            logger.info(f"Live stack stopped on camera {self.controller.address}")
+
+    async def _add(self, data: bytes, masters: Optional[Tuple] = None):
+        try:
+            await asyncio.get_running_loop().run_in_executor(
+                self._executor, self._accumulate, data, masters
+            )
+        except Exception as e:
+            self.errors += 1
+            logger.warning(f"Live stack frame failed: {e}")
+
+    def _accumulate(self, data: bytes, masters: Optional[Tuple] = None):
+        """Runs on the stacking worker"""
+        accumulator = self.accumulator
+        image = decode_rgb(data, settings.LIVE_STACK_MAX_WIDTH)
+        if masters:
+            calibration_library.calibrate(image, *masters)
+        accumulator.add(image)
+
+        now = time.monotonic()
+        if (
+            accumulator is self.accumulator
+            and now - self._rendered_at >= settings.LIVE_STACK_RENDER_INTERVAL
+        ):
+            self._rendered_at = now
+            self.image = stretch_to_jpeg(
+                accumulator.mean, settings.PREVIEW_DEFAULT_QUALITY
+            )
+            self.image_frames = accumulator.frames
+            event_bus.publish(
+                f"stack.updated:{self.controller.address}",
+                "stack.updated",
+                {"camera_id": self.controller.address, **self.get_status()},
+            )
+
+    async def stop(self):
+        if self._task:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+            # Render whatever arrived since the last periodic render
+            accumulator = self.accumulator
+            if accumulator.mean is not None and self.image_frames != accumulator.frames:
+                self.image_frames = accumulator.frames
+                self.image = await asyncio.get_running_loop().run_in_executor(
+                    self._executor,
+                    stretch_to_jpeg,
+                    accumulator.mean,
+                    settings.PREVIEW_DEFAULT_QUALITY,
+                )
+
+    def get_status(self) -> Dict[str, Any]:
+        accumulator = self.accumulator
+        shape = accumulator.shape
+        return {
+            "running": self.running,
+            "source": self.source,
+            "mode": accumulator.mode,
+            "align": accumulator.align,
+            "calibrate": self.calibrate,
+            "frames": accumulator.frames,
+            "clipped_pixels": accumulator.clipped,
+            "last_shift": list(accumulator.last_shift),
+            "width": shape[1] if shape else None,
+            "height": shape[0] if shape else None,
+            "errors": self.errors,
+        }
+
+
+class LiveStackService:
+    """Owns one LiveStack per camera and the shared stacking workers"""
+
+    def __init__(self, workers: int):
+        self._executor = ThreadPoolExecutor(
+            max_workers=workers, thread_name_prefix="live-stack"
+        )
+        self._stacks: Dict[CameraController, LiveStack] = {}
+
+    def get_stack(self, controller: CameraController) -> LiveStack:
+        stack = self._stacks.get(controller)
+        if stack is None:
+            stack = LiveStack(
+                controller, preview_service.get_broadcaster(controller), self._executor
+            )
+            self._stacks[controller] = stack
+        return stack
+
+    async def shutdown(self):
+        for stack in list(self._stacks.values()):
+            await stack.stop()
+        self._executor.shutdown(wait=False)
+
+
+# Singleton instance
+live_stack_service = LiveStackService(workers=settings.LIVE_STACK_WORKERS)
@@ -0,0 +1,165 @@
+from collections import deque
+from datetime import datetime
+from typing import Deque, List, Optional, Set
+import asyncio
+import logging
+
+from config.settings import settings
+from models.responses import LogEntry
+
+
+class BufferedRecord:
+    """
+    Lightweight snapshot of a LogRecord. The message is formatted when the
+    record is buffered, so no references to the logged arguments are kept
+    and later changes to them don't alter the message.
+    """
+
+    __slots__ = ("seq", "created", "levelno", "levelname", "name", "message")
+
+    def __init__(self, seq: int, record: logging.LogRecord, exc_text: Optional[str]):
+        self.seq = seq
+        self.created = record.created
+        self.levelno = record.levelno
+        self.levelname = record.levelname
+        self.name = record.name
+        try:
+            message = record.getMessage()
+        except Exception:
+            message = f"{record.msg!r} % {record.args!r}"
+        if exc_text:
+            message = f"{message}\n{exc_text}"
+        self.message = message
+
+    def matches(
+        self,
+        min_level: int = logging.NOTSET,
+        module: Optional[str] = None,
+        since: Optional[float] = None,
+    ) -> bool:
+        if self.levelno < min_level:
+            return False
+        if since is not None and self.created < since:
+            return False
+        if module and not (
+            self.name == module or self.name.startswith(module + ".")
+        ):
+            return False
+        return True
+
+    def to_entry(self) -> LogEntry:
+        return LogEntry(
+            timestamp=datetime.fromtimestamp(self.created),
+            level=self.levelname,
+            message=self.message,
+            module=self.name,
+        )
+
+
+class LogSubscription:
+    """Bounded per-client queue fed from the logging handler"""
+
+    def __init__(self, loop: asyncio.AbstractEventLoop, max_pending: int):
+        self.loop = loop
+        self.queue: asyncio.Queue = asyncio.Queue(maxsize=max_pending)
+        self.dropped = 0
+
+    def offer(self, record: BufferedRecord):
+        # Runs on the event loop thread
+        try:
+            self.queue.put_nowait(record)
+        except asyncio.QueueFull:
+            self.dropped += 1
+
+
+class RingBufferHandler(logging.Handler):
+    """
+    Logging handler that keeps the most recent records in memory.
+
+    The buffer is a fixed size deque so appends are O(1). Records are stored
+    as formatted messages, so memory is capped by the record count and the
+    message sizes rather than by whatever objects were logged.
+    """
+
+    def __init__(self, capacity: int = 5000, stream_queue_size: int = 1000):
+        super().__init__()
+        self.capacity = capacity
+        self.stream_queue_size = stream_queue_size
+        self._records: Deque[BufferedRecord] = deque(maxlen=capacity)
+        self._subscribers: Set[LogSubscription] = set()
+        self._seq = 0
+
+    def emit(self, record: logging.LogRecord):
+        # Called with self.lock held by logging.Handler.handle
+        exc_text = None
+        if record.exc_info:
+            # Tracebacks pin whole frames, render them now instead of keeping them
+            exc_text = record.exc_text or logging.Formatter().formatException(
+                record.exc_info
+            )
+        self._seq += 1
+        buffered = BufferedRecord(self._seq, record, exc_text)
+        self._records.append(buffered)
+
+        if self._subscribers:
+            for subscription in tuple(self._subscribers):
+                try:
+                    subscription.loop.call_soon_threadsafe(
+                        subscription.offer, buffered
+                    )
+                except RuntimeError:
+                    # Event loop already closed
+                    self._subscribers.discard(subscription)
+
+    def tail(
+        self,
+        lines: int = 50,
+        min_level: int = logging.NOTSET,
+        module: Optional[str] = None,
+        since: Optional[float] = None,
+    ) -> List[BufferedRecord]:
+        """Return up to `lines` of the newest matching records, oldest first"""
+        with self.lock:
+            snapshot = list(self._records)
+
+        result = []
+        for record in reversed(snapshot):
+            if since is not None and record.created < since:
+                # Records are in time order, nothing older can match
+                break
+            if record.matches(min_level, module):
+                result.append(record)
+                if len(result) >= lines:
+                    break
+        result.reverse()
+        return result
+
+    def subscribe(self) -> LogSubscription:
+        """Register a stream subscriber on the running event loop"""
+        subscription = LogSubscription(
+            asyncio.get_running_loop(), self.stream_queue_size
+        )
+        with self.lock:
+            self._subscribers.add(subscription)
+        return subscription
+
+    def unsubscribe(self, subscription: LogSubscription):
+        with self.lock:
+            self._subscribers.discard(subscription)
+
+
+def parse_level(level: Optional[str]) -> int:
+    """Convert a level name such as 'warning' into its numeric value"""
+    if not level:
+        return logging.NOTSET
+    value = logging.getLevelName(level.upper())
+    if not isinstance(value, int):
+        raise ValueError(f"Unknown log level '{level}'")
+    return value
+
+
+# Singleton instance
+log_buffer = RingBufferHandler(
+    capacity=settings.LOG_BUFFER_SIZE,
+    stream_queue_size=settings.LOG_STREAM_QUEUE_SIZE,
+)
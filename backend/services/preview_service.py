@@ -0,0 +1,279 @@
+from typing import Any, Dict, List, Optional, Tuple
+import asyncio
+import logging
+import time
+
+from camera.controller import CameraController
+from camera.exceptions import (
+    CameraException,
+    CameraNotConnectedException,
+    CameraTimeoutException,
+)
+from config.settings import settings
+
+logger = logging.getLogger(__name__)
+
+# Keep producing this long after the last viewer leaves, so polling clients
+# that briefly drop to zero viewers don't restart the loop every frame
+IDLE_GRACE_PERIOD = 2.0
+
+
+class PreviewFrame:
+    """One live view JPEG with its sequence number"""
+
+    __slots__ = ("seq", "data", "timestamp")
+
+    def __init__(self, seq: int, data: bytes):
+        self.seq = seq
+        self.data = data
+        self.timestamp = time.time()
+
+
+class PreviewBroadcaster:
+    """
+    Single live view producer for one camera.
+
+    While anyone is watching, a background task pulls frames from
+    get_preview on the camera worker and publishes the newest one. Viewers
+    never queue frames: they wait for a sequence number newer than the
+    last one they consumed, so a slow viewer simply skips to the latest
+    frame.
+    """
+
+    def __init__(self, controller: CameraController, max_fps: float):
+        self.controller = controller
+        self.max_fps = max_fps
+        self.latest: Optional[PreviewFrame] = None
+        self.frames_produced = 0
+        self.errors = 0
+        # Why the producer's last frame failed, cleared by the next good frame
+        self.last_error: Optional[CameraException] = None
+
+        self._seq = 0
+        self._new_frame = asyncio.Event()
+        self._viewers = 0
+        self._idle_since: Optional[float] = None
+        self._task: Optional[asyncio.Task] = None
+        self._single_fetch: Optional[asyncio.Future] = None
+
+    @property
+    def viewers(self) -> int:
+        return self._viewers
+
+    @property
+    def running(self) -> bool:
+        return self._task is not None and not self._task.done()
+
+    def acquire(self):
+        """Register a viewer and start the producer if needed"""
+        self._viewers += 1
+        self._idle_since = None
+        if not self.running:
+            self._task = asyncio.get_running_loop().create_task(self._produce())
+
+    def release(self):
+        self._viewers = max(0, self._viewers - 1)
+        if self._viewers == 0:
+            self._idle_since = time.monotonic()
+
+    def _publish(self, data: bytes) -> PreviewFrame:
+        self._seq += 1
+        self.frames_produced += 1
+        self.latest = PreviewFrame(self._seq, data)
+        self.last_error = None
+        self._wake()
+        return self.latest
+
+    def _fail(self, error: CameraException):
+        self.last_error = error
+        self._wake()
+
+    def _wake(self):
+        # Wake everyone waiting on the current event and start a fresh one
+        event, self._new_frame = self._new_frame, asyncio.Event()
+        event.set()
+
+    async def _produce(self):
+        logger.info(f"Live view started for camera {self.controller.address}")
+        try:
+            while True:
+                if (
+                    self._viewers == 0
+                    and self._idle_since is not None
+                    and time.monotonic() - self._idle_since > IDLE_GRACE_PERIOD
+                ):
+                    break
+
+                started = time.monotonic()
+                try:
+                    data = await self.controller.run(self.controller.get_preview)
+                    self._publish(data)
+                except CameraNotConnectedException as e:
+                    self._fail(e)
+                    await asyncio.sleep(0.5)
+                    continue
+                except CameraException as e:
+                    self.errors += 1
+                    self._fail(e)
+                    logger.warning(f"Live view frame failed: {e}")
+                    await asyncio.sleep(0.5)
+                    continue
+
+                # Throttle to the configured frame rate
+                delay = 1.0 / self.max_fps - (time.monotonic() - started)
+                if delay > 0:
+                    await asyncio.sleep(delay)
+        finally:
+            logger.info(f"Live view stopped for camera {self.controller.address}")
+
+    async def next_frame(
+        self, after_seq: int = 0, timeout: Optional[float] = None
+    ) -> PreviewFrame:
+        """Wait for a frame newer than after_seq"""
+        while self.latest is None or self.latest.seq <= after_seq:
+            await asyncio.wait_for(self._new_frame.wait(), timeout)
+        return self.latest
+
+    async def get_frame(self) -> PreviewFrame:
+        """
+        Return a fresh frame for a one-off request. Shares the running
+        producer if there is one, and concurrent one-off requests share a
+        single camera round trip. Raises the producer's error if its next
+        frame fails, rather than waiting for the camera to recover.
+        """
+        if self.running:
+            after_seq = self.latest.seq if self.latest else 0
+            deadline = time.monotonic() + settings.CAMERA_TIMEOUT
+            while self.latest is None or self.latest.seq <= after_seq:
+                try:
+                    await asyncio.wait_for(
+                        self._new_frame.wait(), deadline - time.monotonic()
+                    )
+                except asyncio.TimeoutError:
+                    raise self.last_error or CameraTimeoutException(
+                        "Timed out waiting for a live view frame"
+                    )
+                if self.last_error and (
+                    self.latest is None or self.latest.seq <= after_seq
+                ):
+                    raise self.last_error
+            return self.latest
+
+        if self._single_fetch is None or self._single_fetch.done():
+            self._single_fetch = asyncio.ensure_future(self._fetch_once())
+        return await asyncio.shield(self._single_fetch)
+
+    async def _fetch_once(self) -> PreviewFrame:
+        data = await self.controller.run(self.controller.get_preview)
+        return self._publish(data)
+
+    async def stop(self):
+        if self._task:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+
+class ViewerStats:
+    """Per-connection statistics for the streaming preview"""
+
+    def __init__(
+        self,
+        client: str,
+        transport: str,
+        max_fps: float,
+        width: Optional[int] = None,
+        quality: Optional[int] = None,
+    ):
+        self.client = client
+        self.transport = transport
+        self.max_fps = max_fps
+        self.width = width
+        self.quality = quality
+        # Optional (x, y, w, h) crop of the frame and its nearest neighbour zoom
+        self.region: Optional[Tuple[int, int, int, int]] = None
+        self.magnification = 1
+        self.connected_at = time.time()
+        self.frames_sent = 0
+        self.frames_skipped = 0
+        self.bytes_sent = 0
+        self.rtt_ms: Optional[float] = None
+        self.last_seq = 0
+
+    def record_sent(self, frame: PreviewFrame, size: int):
+        if self.last_seq:
+            self.frames_skipped += max(0, frame.seq - self.last_seq - 1)
+        self.last_seq = frame.seq
+        self.frames_sent += 1
+        self.bytes_sent += size
+
+    def record_rtt(self, rtt_ms: float):
+        # Exponentially weighted so a single slow frame doesn't dominate
+        if self.rtt_ms is None:
+            self.rtt_ms = rtt_ms
+        else:
+            self.rtt_ms = 0.8 * self.rtt_ms + 0.2 * rtt_ms
+
+    def to_dict(self) -> Dict[str, Any]:
+        elapsed = max(time.time() - self.connected_at, 1e-6)
+        return {
+            "client": self.client,
+            "transport": self.transport,
+            "max_fps": self.max_fps,
+            "width": self.width,
+            "quality": self.quality,
+            "region": list(self.region) if self.region else None,
+            "magnification": self.magnification,
+            "fps": round(self.frames_sent / elapsed, 2),
+            "rtt_ms": round(self.rtt_ms, 1) if self.rtt_ms is not None else None,
+            "frames_sent": self.frames_sent,
+            "frames_skipped": self.frames_skipped,
+            "bytes_sent": self.bytes_sent,
+            "connected_at": self.connected_at,
+        }
+
+
+class PreviewService:
+    """Owns one PreviewBroadcaster per camera and tracks streaming viewers"""
+
+    def __init__(self):
+        self._broadcasters: Dict[CameraController, PreviewBroadcaster] = {}
+        self._viewers: Dict[CameraController, List[ViewerStats]] = {}
+
+    def get_broadcaster(self, controller: CameraController) -> PreviewBroadcaster:
+        broadcaster = self._broadcasters.get(controller)
+        if broadcaster is None:
+            broadcaster = PreviewBroadcaster(controller, settings.PREVIEW_MAX_FPS)
+            self._broadcasters[controller] = broadcaster
+        return broadcaster
+
+    def add_viewer(self, controller: CameraController, stats: ViewerStats):
+        self._viewers.setdefault(controller, []).append(stats)
+
+    def remove_viewer(self, controller: CameraController, stats: ViewerStats):
+        viewers = self._viewers.get(controller, [])
+        if stats in viewers:
+            viewers.remove(stats)
+
+    def get_stats(self, controller: CameraController) -> Dict[str, Any]:
+        broadcaster = self.get_broadcaster(controller)
+        return {
+            "camera_id": controller.address,
+            "running": broadcaster.running,
+            "max_fps": broadcaster.max_fps,
+            "frames_produced": broadcaster.frames_produced,
+            "errors": broadcaster.errors,
+            "latest_seq": broadcaster.latest.seq if broadcaster.latest else None,
+            "viewers": [v.to_dict() for v in self._viewers.get(controller, [])],
+        }
+
+    async def shutdown(self):
+        for broadcaster in list(self._broadcasters.values()):
+            await broadcaster.stop()
+
+
+# Singleton instance
+preview_service = PreviewService()
@@ -0,0 +1,188 @@
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Dict, Hashable, NamedTuple, Optional, Tuple
+import asyncio
+import io
+import logging
+
+from PIL import Image
+
+from config.settings import settings
+from services.preview_service import PreviewFrame
+
+logger = logging.getLogger(__name__)
+
+
+def resize_jpeg(data: bytes, width: Optional[int], quality: Optional[int]) -> bytes:
+    """
+    Downscale and/or re-encode a JPEG. Uses libjpeg's DCT scaling (draft
+    mode) so a 1/2, 1/4 or 1/8 size decode does a fraction of the work of a
+    full decode, then finishes with a cheap resize to the exact width.
+    """
+    with Image.open(io.BytesIO(data)) as image:
+        target = image.size
+        if width and width < image.width:
+            target = (width, max(1, round(image.height * width / image.width)))
+            image.draft("RGB", target)
+        elif not quality:
+            return data
+
+        frame = image.convert("RGB")
+        if frame.size != target:
+            frame = frame.resize(target, Image.BILINEAR)
+
+        out = io.BytesIO()
+        frame.save(out, "JPEG", quality=quality or settings.PREVIEW_DEFAULT_QUALITY)
+        return out.getvalue()
+
+
+class Region(NamedTuple):
+    """Region of interest in live view frame pixels"""
+
+    x: int
+    y: int
+    w: int
+    h: int
+
+
+def fit_region(region: Region, width: int, height: int) -> Region:
+    """
+    The region moved (and if need be shrunk) to lie within a width x height
+    frame, so a region set for another frame size or past the edge still
+    shows the nearest part of the frame
+    """
+    w, h = min(region.w, width), min(region.h, height)
+    x = max(0, min(region.x, width - w))
+    y = max(0, min(region.y, height - h))
+    return Region(x, y, w, h)
+
+
+def decode_jpeg_rows(data: bytes, rows: int) -> Image.Image:
+    """
+    Decode only the first `rows` scanlines of a JPEG. libjpeg decodes top to
+    bottom, so stopping right after the bottom edge of a region skips all the
+    rows below it. libjpeg reports the early stop as a broken stream, which
+    is expected here. Falls back to a full decode if Pillow's decoder
+    internals are not usable.
+    """
+    image = Image.open(io.BytesIO(data))
+    if image.format != "JPEG" or rows >= image.height or len(image.tile) != 1:
+        image.load()
+        return image
+
+    try:
+        decoder_name, _, offset, args = image.tile[0]
+        size = (image.width, rows)
+        core_image = Image.core.new(image.mode, size)
+        decoder = Image._getdecoder(image.mode, decoder_name, args, image.decoderconfig)
+        decoder.setimage(core_image, (0, 0) + size)
+        try:
+            decoder.decode(data[offset:])
+        finally:
+            decoder.cleanup()
+        return Image.Image()._new(core_image)
+    except Exception as e:
+        logger.debug(f"Partial JPEG decode unavailable, decoding fully: {e}")
+        image.load()
+        return image
+
+
+def render_region(
+    data: bytes, region: Region, magnification: int, quality: Optional[int]
+) -> bytes:
+    """Crop a region at 1:1 (or magnified with nearest neighbour) and encode it"""
+    image = decode_jpeg_rows(data, region.y + region.h)
+    x, y, w, h = fit_region(region, image.width, image.height)
+    crop = image.crop((x, y, x + w, y + h)).convert("RGB")
+    if magnification > 1:
+        # Nearest neighbour keeps individual pixels visible for focusing
+        crop = crop.resize(
+            (crop.width * magnification, crop.height * magnification),
+            Image.NEAREST,
+        )
+
+    out = io.BytesIO()
+    crop.save(out, "JPEG", quality=quality or settings.PREVIEW_DEFAULT_QUALITY)
+    return out.getvalue()
+
+
+class PreviewTranscoder:
+    """
+    Produces per-client variants of live view frames in a thread pool.
+
+    Variants are cached by (source, frame sequence, width, quality, region),
+    and a variant that is still being encoded is shared, so N viewers asking
+    for the same size cost a single transcode per frame. Pillow releases the GIL
+    while decoding and encoding, so the pool runs in parallel.
+    """
+
+    def __init__(self, workers: int, cache_size: int):
+        self.cache_size = cache_size
+        self._executor = ThreadPoolExecutor(
+            max_workers=workers, thread_name_prefix="preview-transcode"
+        )
+        self._cache: "OrderedDict[Tuple, asyncio.Future]" = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    async def transcode(
+        self,
+        source: Hashable,
+        frame: PreviewFrame,
+        width: Optional[int] = None,
+        quality: Optional[int] = None,
+        region: Optional[Region] = None,
+        magnification: int = 1,
+    ) -> bytes:
+        """Return the frame downscaled to width, or the given region if set"""
+        if not width and not quality and not region:
+            return frame.data
+
+        key = (source, frame.seq, width, quality, region, magnification)
+        future = self._cache.get(key)
+        if future is not None:
+            self.hits += 1
+            self._cache.move_to_end(key)
+        else:
+            self.misses += 1
+            loop = asyncio.get_running_loop()
+            if region:
+                future = loop.run_in_executor(
+                    self._executor,
+                    render_region,
+                    frame.data,
+                    region,
+                    magnification,
+                    quality,
+                )
+            else:
+                future = loop.run_in_executor(
+                    self._executor, resize_jpeg, frame.data, width, quality
+                )
+            self._cache[key] = future
+            while len(self._cache) > self.cache_size:
+                self._cache.popitem(last=False)
+
+        try:
+            # Shielded so one viewer disconnecting doesn't cancel the others
+            return await asyncio.shield(future)
+        except Exception:
+            self._cache.pop(key, None)
+            raise
+
+    def get_stats(self) -> Dict[str, Any]:
+        return {
+            "cached_variants": len(self._cache),
+            "hits": self.hits,
+            "misses": self.misses,
+        }
+
+    def shutdown(self):
+        self._executor.shutdown(wait=False)
+
+
+# Singleton instance
+preview_transcoder = PreviewTranscoder(
+    workers=settings.PREVIEW_TRANSCODE_WORKERS,
+    cache_size=settings.PREVIEW_TRANSCODE_CACHE_SIZE,
+)
@@ -0,0 +1,234 @@
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Tuple
+import asyncio
+import cProfile
+import logging
+import os
+import pstats
+import sys
+import threading
+import time
+
+from config.settings import settings
+from services.jobs import Job
+
+logger = logging.getLogger(__name__)
+
+# Functions and stacks listed in request summaries
+SUMMARY_TOP = 40
+
+# Leaf frames of threads blocked waiting for work rather than running,
+# left out of request summaries (collapsed-stack files keep everything)
+IDLE_FUNCTIONS = {
+    ("threading.py", "wait"),
+    ("threading.py", "_wait_for_tstate_lock"),
+    ("queue.py", "get"),
+    ("selectors.py", "select"),
+    ("thread.py", "_worker"),
+    ("connection.py", "wait"),
+    ("camera_registry.py", "_hotplug_loop"),
+}
+
+
+def _short_path(filename: str) -> str:
+    """filename relative to the sys.path entry it was imported from"""
+    best = ""
+    for entry in sys.path:
+        if entry and filename.startswith(entry) and len(entry) > len(best):
+            best = entry
+    return filename[len(best) :].lstrip(os.sep) if best else filename
+
+
+class StackSampler:
+    """
+    Samples the Python stack of every thread (the event loop, the camera
+    workers, executors) at a fixed interval from a thread of its own.
+    Stacks are counted as they are seen, root first, with the thread name
+    as the root frame: the collapsed-stack format flame graph tools read.
+    """
+
+    def __init__(self, interval: float):
+        self.interval = interval
+        self.samples = 0
+        self.stacks: Counter = Counter()
+        self.started: Optional[float] = None
+        self.stopped: Optional[float] = None
+        self._labels: Dict[Any, str] = {}
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def _label(self, code) -> str:
+        label = self._labels.get(code)
+        if label is None:
+            name = getattr(code, "co_qualname", code.co_name)
+            path = _short_path(code.co_filename)
+            label = f"{name} ({path}:{code.co_firstlineno})".replace(";", ",")
+            self._labels[code] = label
+        return label
+
+    def _sample(self):
+        own = threading.get_ident()
+        names = {t.ident: t.name for t in threading.enumerate()}
+        for ident, frame in sys._current_frames().items():
+            if ident == own:
+                continue
+            stack = []
+            while frame is not None:
+                stack.append(self._label(frame.f_code))
+                frame = frame.f_back
+            stack.append(names.get(ident, f"thread-{ident}").replace(";", ","))
+            self.stacks[tuple(reversed(stack))] += 1
+        self.samples += 1
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            self._sample()
+
+    def start(self):
+        self.started = time.time()
+        self._thread = threading.Thread(target=self._run, name="profiler", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        if self._thread:
+            self._thread.join()
+        self.stopped = time.time()
+
+    def collapsed(self) -> str:
+        """One "thread;outer;...;inner count" line per distinct stack"""
+        return "".join(
+            f"{';'.join(stack)} {count}\n" for stack, count in self.stacks.items()
+        )
+
+    def _idle(self, stack: Tuple[str, ...]) -> bool:
+        leaf = stack[-1]
+        name, _, location = leaf.rpartition(" (")
+        return (
+            Path(location.split(":")[0]).name,
+            name.split(".")[-1],
+        ) in IDLE_FUNCTIONS
+
+    def summary(self, top: int = SUMMARY_TOP) -> Dict[str, Any]:
+        """Busy samples per thread, hottest stacks and functions by self time"""
+        threads: Counter = Counter()
+        inclusive: Counter = Counter()
+        exclusive: Counter = Counter()
+        busy: Counter = Counter()
+        for stack, count in self.stacks.items():
+            if self._idle(stack):
+                continue
+            busy[stack] += count
+            threads[stack[0]] += count
+            exclusive[stack[-1]] += count
+            for label in set(stack[1:]):
+                inclusive[label] += count
+        return {
+            "samples": self.samples,
+            "interval_ms": self.interval * 1000,
+            "threads": dict(threads.most_common()),
+            "stacks": [
+                {"stack": ";".join(stack), "samples": count}
+                for stack, count in busy.most_common(top)
+            ],
+            "functions": [
+                {
+                    "function": label,
+                    "self_samples": count,
+                    "total_samples": inclusive[label],
+                }
+                for label, count in exclusive.most_common(top)
+            ],
+        }
+
+
+def cprofile_summary(profile: cProfile.Profile, top: int = SUMMARY_TOP) -> List[dict]:
+    """Functions by cumulative time, as pstats would print them"""
+    stats = pstats.Stats(profile).stats
+    rows = sorted(stats.items(), key=lambda item: item[1][3], reverse=True)
+    return [
+        {
+            "function": f"{name} ({_short_path(filename)}:{line})",
+            "calls": calls,
+            "total_ms": round(total * 1000, 3),
+            "cumulative_ms": round(cumulative * 1000, 3),
+        }
+        for (filename, line, name), (_, calls, total, cumulative, _) in rows[:top]
+    ]
+
+
+class ProfilerService:
+    """
+    Timed whole-process sampling profiles, run as jobs and saved as
+    collapsed-stack files for flame graph tools (flamegraph.pl,
+    speedscope, inferno). One profile runs at a time.
+    """
+
+    def __init__(self, path: Path, interval: float, max_duration: float):
+        self.path = path
+        self.path.mkdir(parents=True, exist_ok=True)
+        self.interval = interval
+        self.max_duration = max_duration
+        self._sampler: Optional[StackSampler] = None
+        self._io = ThreadPoolExecutor(max_workers=1, thread_name_prefix="profiler-io")
+
+    @property
+    def running(self) -> bool:
+        return self._sampler is not None
+
+    def list(self) -> List[Path]:
+        return sorted(
+            (p for p in self.path.glob("*.folded") if p.is_file()),
+            key=lambda p: p.stat().st_mtime,
+            reverse=True,
+        )
+
+    async def record(
+        self, job: Job, duration: float, interval: Optional[float] = None
+    ) -> Dict[str, Any]:
+        """Sample every thread for duration seconds, run as a job"""
+        if self.running:
+            raise RuntimeError("A profile is already running")
+        sampler = StackSampler(interval or self.interval)
+        self._sampler = sampler
+        sampler.start()
+        job.update(0, round(duration), f"Sampling every {sampler.interval * 1000:g} ms")
+        try:
+            while time.time() - sampler.started < duration:
+                await asyncio.sleep(min(0.5, duration))
+                job.update(min(round(time.time() - sampler.started), round(duration)))
+                job.check_cancelled()
+        finally:
+            sampler.stop()
+            self._sampler = None
+
+        name = f"profile_{datetime.now().strftime('%Y%m%d_%H%M%S')}.folded"
+        target = self.path / name
+        await asyncio.get_running_loop().run_in_executor(
+            self._io, target.write_text, sampler.collapsed()
+        )
+        logger.info(f"Profile {name}: {sampler.samples} samples")
+        return {
+            "filename": name,
+            "url": f"/api/profiling/profiles/{name}",
+            "samples": sampler.samples,
+            "stacks": len(sampler.stacks),
+            "duration": round(sampler.stopped - sampler.started, 2),
+            "threads": sampler.summary(top=0)["threads"],
+        }
+
+    def shutdown(self):
+        if self._sampler:
+            self._sampler.stop()
+        self._io.shutdown(wait=False)
+
+
+# Singleton instance
+profiler_service = ProfilerService(
+    path=Path(settings.PROFILING_PATH),
+    interval=settings.PROFILING_SAMPLE_INTERVAL,
+    max_duration=settings.PROFILING_MAX_DURATION,
+)
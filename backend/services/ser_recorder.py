@@ -0,0 +1,429 @@
+from array import array
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+import asyncio
+import io
+import json
+import logging
+import struct
+import sys
+import time
+
+import numpy as np
+from PIL import Image
+
+from camera.controller import CameraController
+from config.settings import settings
+from services.event_bus import event_bus
+from services.focus_analysis import laplacian_variance
+from services.preview_service import PreviewBroadcaster, preview_service
+
+logger = logging.getLogger(__name__)
+
+# SER header: file id, LuID, ColorID, LittleEndian, width, height, bit depth,
+# frame count, observer, instrument, telescope, local and UTC start time
+SER_HEADER = struct.Struct("<14s7i40s40s40sqq")
+SER_FILE_ID = b"LUCAM-RECORDER"
+SER_MONO = 0
+SER_RGB = 100
+
+# .NET ticks (100 ns since 0001-01-01) at the Unix epoch, SER's time base
+TICKS_AT_UNIX_EPOCH = 621355968000000000
+
+# Seconds between record.progress events
+PROGRESS_INTERVAL = 1.0
+
+
+def to_ticks(timestamp: float) -> int:
+    return TICKS_AT_UNIX_EPOCH + int(timestamp * 10_000_000)
+
+
+class SerWriter:
+    """
+    Appends fixed-size 8-bit frames to an SER file.
+
+    The file is opened once with a large write buffer, so frames turn into
+    big sequential writes. The frame count in the header and the trailer of
+    per-frame UTC timestamps are written on close.
+    """
+
+    def __init__(
+        self,
+        path: Path,
+        width: int,
+        height: int,
+        color: bool,
+        instrument: str = "",
+        buffer_size: int = 8 * 1024 * 1024,
+    ):
+        self.path = path
+        self.width = width
+        self.height = height
+        self.color = color
+        self.instrument = instrument
+        self.frame_size = width * height * (3 if color else 1)
+        self.timestamps = array("q")
+        self.started_at = time.time()
+        self._file = open(path, "wb", buffering=buffer_size)
+        self._file.write(self._header())
+
+    @property
+    def frame_count(self) -> int:
+        return len(self.timestamps)
+
+    def _header(self) -> bytes:
+        utc = to_ticks(self.started_at)
+        offset = datetime.now().astimezone().utcoffset()
+        local = utc + int(offset.total_seconds() * 10_000_000) if offset else utc
+        return SER_HEADER.pack(
+            SER_FILE_ID,
+            0,
+            SER_RGB if self.color else SER_MONO,
+            # Only matters for 16-bit data; 0 is what common capture tools write
+            0,
+            self.width,
+            self.height,
+            8,
+            self.frame_count,
+            b"",
+            self.instrument.encode("ascii", "replace")[:40],
+            b"",
+            local,
+            utc,
+        )
+
+    def write(self, pixels: bytes, timestamp: float):
+        if len(pixels) != self.frame_size:
+            raise ValueError(
+                f"Frame is {len(pixels)} bytes, expected {self.frame_size}"
+            )
+        self._file.write(pixels)
+        self.timestamps.append(to_ticks(timestamp))
+
+    def close(self):
+        trailer = self.timestamps
+        if sys.byteorder == "big":
+            # SER timestamps are little-endian
+            trailer = array("q", trailer)
+            trailer.byteswap()
+        self._file.write(trailer.tobytes())
+        self._file.seek(0)
+        self._file.write(self._header())
+        self._file.close()
+
+
+def read_ser_header(path: Path) -> Dict[str, Any]:
+    with open(path, "rb") as f:
+        fields = SER_HEADER.unpack(f.read(SER_HEADER.size))
+    if fields[0] != SER_FILE_ID:
+        raise ValueError(f"{path.name} is not an SER file")
+    color_id, width, height, depth, frames = fields[2], *fields[4:8]
+    planes = 3 if color_id >= SER_RGB else 1
+    return {
+        "color_id": color_id,
+        "width": width,
+        "height": height,
+        "depth": depth,
+        "frames": frames,
+        "frame_size": width * height * planes * (2 if depth > 8 else 1),
+        "header": fields,
+    }
+
+
+def extract_frames(source: Path, target: Path, indices: Sequence[int]) -> int:
+    """
+    Copy the given frames of an SER file into a new one. Frames have a
+    fixed size, so each one is a single seek and read, no decoding.
+    """
+    info = read_ser_header(source)
+    frame_size, frames = info["frame_size"], info["frames"]
+    indices = sorted(i for i in set(indices) if 0 <= i < frames)
+
+    with open(source, "rb") as src, open(target, "wb") as dst:
+        header = list(info["header"])
+        header[7] = len(indices)
+        dst.write(SER_HEADER.pack(*header))
+        for index in indices:
+            src.seek(SER_HEADER.size + index * frame_size)
+            dst.write(src.read(frame_size))
+
+        # Carry over the matching timestamps if the source has a trailer
+        src.seek(SER_HEADER.size + frames * frame_size)
+        trailer = src.read(frames * 8)
+        if len(trailer) == frames * 8:
+            dst.write(b"".join(trailer[i * 8 : i * 8 + 8] for i in indices))
+    return len(indices)
+
+
+def decode_and_score(data: bytes, color: bool) -> Tuple[bytes, int, int, float]:
+    """Raw pixels of a JPEG frame plus its sharpness (Laplacian variance)"""
+    with Image.open(io.BytesIO(data)) as image:
+        image = image.convert("RGB" if color else "L")
+        luma = np.asarray(image if not color else image.convert("L"), dtype=np.float32)
+        return image.tobytes(), image.width, image.height, laplacian_variance(luma)
+
+
+def sidecar_path(path: Path) -> Path:
+    return path.with_suffix(".json")
+
+
+def best_frames(path: Path, percent: float) -> Dict[str, Any]:
+    """Indices of the sharpest percent of frames, from the sidecar ranking"""
+    with open(sidecar_path(path)) as f:
+        sidecar = json.load(f)
+    ranking = sidecar["ranking"]
+    count = max(1, round(len(ranking) * percent / 100)) if ranking else 0
+    selected = ranking[:count]
+    return {
+        "frames": sidecar["frames"],
+        "selected": len(selected),
+        "min_score": sidecar["scores"][selected[-1]] if selected else None,
+        "indices": sorted(selected),
+    }
+
+
+class LuckyRecording:
+    """
+    Records one camera's live view to an SER file.
+
+    Frames are taken from the broadcaster as fast as it produces them and
+    decoded and scored in a thread pool, several at a time, while a single
+    writer appends them in order. If decoding falls behind by more than
+    RECORD_QUEUE_SIZE frames, new frames are dropped rather than buffered.
+    """
+
+    def __init__(
+        self,
+        controller: CameraController,
+        broadcaster: PreviewBroadcaster,
+        path: Path,
+        color: bool,
+        duration: float,
+        max_frames: Optional[int],
+        pool: ThreadPoolExecutor,
+    ):
+        self.controller = controller
+        self.broadcaster = broadcaster
+        self.path = path
+        self.color = color
+        self.duration = duration
+        self.max_frames = max_frames
+        self.started_at = time.time()
+        self.frames_written = 0
+        self.frames_dropped = 0
+        self.frames_skipped = 0
+        self.scores: List[float] = []
+        self.error: Optional[str] = None
+
+        self._pool = pool
+        # Writes go through one thread so they stay sequential
+        self._writer_thread = ThreadPoolExecutor(
+            max_workers=1, thread_name_prefix="ser-writer"
+        )
+        self._writer: Optional[SerWriter] = None
+        self._queue: "asyncio.Queue" = asyncio.Queue(maxsize=settings.RECORD_QUEUE_SIZE)
+        self._task: Optional[asyncio.Task] = None
+        self._stopping = asyncio.Event()
+
+    @property
+    def running(self) -> bool:
+        return self._task is not None and not self._task.done()
+
+    def start(self):
+        self._task = asyncio.get_running_loop().create_task(self._record())
+
+    async def stop(self):
+        self._stopping.set()
+        if self._task:
+            await asyncio.shield(self._task)
+
+    async def _record(self):
+        logger.info(f"Recording {self.path.name} from camera {self.controller.address}")
+        # Lift the live view frame rate cap while recording
+        saved_fps = self.broadcaster.max_fps
+        self.broadcaster.max_fps = settings.RECORD_MAX_FPS
+        self.broadcaster.acquire()
+        writer = asyncio.get_running_loop().create_task(self._write_frames())
+        try:
+            await self._read_frames()
+        finally:
+            self.broadcaster.release()
+            self.broadcaster.max_fps = saved_fps
+            await self._queue.put(None)
+            await writer
+            await self._finish()
+
+    async def _read_frames(self):
+        loop = asyncio.get_running_loop()
+        deadline = time.monotonic() + self.duration
+        last_seq = 0
+        queued = 0
+        while not self._stopping.is_set() and time.monotonic() < deadline:
+            if self.max_frames and queued >= self.max_frames:
+                break
+            try:
+                frame = await self.broadcaster.next_frame(last_seq, timeout=1.0)
+            except asyncio.TimeoutError:
+                continue
+            if last_seq:
+                self.frames_skipped += frame.seq - last_seq - 1
+            last_seq = frame.seq
+
+            job = loop.run_in_executor(
+                self._pool, decode_and_score, frame.data, self.color
+            )
+            try:
+                self._queue.put_nowait((frame.timestamp, job))
+                queued += 1
+            except asyncio.QueueFull:
+                job.cancel()
+                self.frames_dropped += 1
+
+    async def _write_frames(self):
+        loop = asyncio.get_running_loop()
+        last_progress = 0.0
+        while True:
+            item = await self._queue.get()
+            if item is None:
+                return
+            timestamp, job = item
+            try:
+                pixels, width, height, score = await job
+                if self._writer is None:
+                    self._writer = await loop.run_in_executor(
+                        self._writer_thread,
+                        lambda: SerWriter(
+                            self.path,
+                            width,
+                            height,
+                            self.color,
+                            instrument=self.controller.model or "",
+                            buffer_size=settings.RECORD_WRITE_BUFFER,
+                        ),
+                    )
+                await loop.run_in_executor(
+                    self._writer_thread, self._writer.write, pixels, timestamp
+                )
+            except (OSError, ValueError) as e:
+                if self._writer is None:
+                    # Nothing can be recorded without the file
+                    self.error = str(e)
+                    self._stopping.set()
+                self.frames_dropped += 1
+                logger.warning(f"Recording frame dropped: {e}")
+                continue
+
+            self.scores.append(score)
+            self.frames_written += 1
+            if time.monotonic() - last_progress >= PROGRESS_INTERVAL:
+                last_progress = time.monotonic()
+                self._publish("record.progress")
+
+    async def _finish(self):
+        loop = asyncio.get_running_loop()
+        if self._writer:
+            await loop.run_in_executor(self._writer_thread, self._writer.close)
+            ranking = sorted(
+                range(len(self.scores)), key=self.scores.__getitem__, reverse=True
+            )
+            sidecar = {
+                "file": self.path.name,
+                "camera": self.controller.model,
+                "width": self._writer.width,
+                "height": self._writer.height,
+                "color": self.color,
+                "frames": self.frames_written,
+                "metric": "laplacian_variance",
+                "scores": [round(s, 3) for s in self.scores],
+                "ranking": ranking,
+            }
+            await loop.run_in_executor(
+                self._writer_thread,
+                sidecar_path(self.path).write_text,
+                json.dumps(sidecar),
+            )
+        self._writer_thread.shutdown(wait=False)
+        logger.info(
+            f"Recording {self.path.name} finished: {self.frames_written} frames, "
+            f"{self.frames_dropped} dropped"
+        )
+        self._publish("record.completed")
+
+    def _publish(self, type: str):
+        event_bus.publish(
+            f"record:{self.controller.address}",
+            type,
+            {"camera_id": self.controller.address, **self.get_status()},
+        )
+
+    def get_status(self) -> Dict[str, Any]:
+        elapsed = time.time() - self.started_at
+        return {
+            "running": self.running,
+            "filename": self.path.name,
+            "elapsed": round(elapsed, 1),
+            "duration": self.duration,
+            "frames_written": self.frames_written,
+            "frames_dropped": self.frames_dropped,
+            "frames_skipped": self.frames_skipped,
+            "fps": round(self.frames_written / max(elapsed, 1e-6), 2),
+            "error": self.error,
+        }
+
+
+class RecorderService:
+    """Starts and tracks lucky-imaging recordings, one per camera"""
+
+    def __init__(self, workers: int):
+        self.recording_path = Path(settings.RECORDING_PATH)
+        self.recording_path.mkdir(exist_ok=True)
+        self._pool = ThreadPoolExecutor(
+            max_workers=workers, thread_name_prefix="record-decode"
+        )
+        self._recordings: Dict[CameraController, LuckyRecording] = {}
+
+    def get_recording(self, controller: CameraController) -> Optional[LuckyRecording]:
+        return self._recordings.get(controller)
+
+    def start(
+        self,
+        controller: CameraController,
+        duration: float,
+        max_frames: Optional[int] = None,
+        color: bool = True,
+    ) -> LuckyRecording:
+        current = self._recordings.get(controller)
+        if current and current.running:
+            raise RuntimeError("A recording is already running")
+
+        name = f"lucky_{datetime.now().strftime('%Y%m%d_%H%M%S')}.ser"
+        path = self.recording_path / name
+        counter = 1
+        while path.exists():
+            path = self.recording_path / f"{Path(name).stem}_{counter}.ser"
+            counter += 1
+
+        recording = LuckyRecording(
+            controller,
+            preview_service.get_broadcaster(controller),
+            path,
+            color,
+            duration,
+            max_frames,
+            self._pool,
+        )
+        self._recordings[controller] = recording
+        recording.start()
+        return recording
+
+    async def shutdown(self):
+        for recording in list(self._recordings.values()):
+            if recording.running:
+                await recording.stop()
+        self._pool.shutdown(wait=False)
+
+
+# Singleton instance
+recorder_service = RecorderService(workers=settings.RECORD_WORKERS)
@@ -0,0 +1,355 @@
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from typing import Any, Deque, Dict, Iterable, List, Optional, Tuple
+import asyncio
+import hashlib
+import logging
+import os
+import threading
+import time
+
+from config.settings import settings
+from services.event_bus import event_bus
+
+logger = logging.getLogger(__name__)
+
+# Read/write block size when copying to the bulk tier
+COPY_CHUNK = 1024 * 1024
+
+# Untracked staged files (e.g. left over from a crash) are moved once
+# they have not changed for this long
+STRAY_SETTLE_TIME = 30.0
+
+
+def _checksum(path: Path) -> str:
+    digest = hashlib.blake2b()
+    with open(path, "rb") as f:
+        while chunk := f.read(COPY_CHUNK):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def _fsync_path(path: Path, drop_cache: bool = False):
+    fd = os.open(path, os.O_RDONLY)
+    try:
+        os.fsync(fd)
+        if drop_cache and hasattr(os, "posix_fadvise"):
+            # Make the verification read come from the device, not the cache
+            os.posix_fadvise(fd, 0, 0, os.POSIX_FADV_DONTNEED)
+    finally:
+        os.close(fd)
+
+
+class StagingTier:
+    """
+    Fast landing tier (tmpfs or NVMe) in front of the bulk CAPTURE_PATH.
+
+    Captures are saved to STAGING_PATH and acknowledged right away; a
+    background mover copies them to CAPTURE_PATH in batches of
+    STAGING_FSYNC_BATCH files, flushing each batch with back-to-back
+    fsyncs and one directory fsync, verifies a checksum of every copy
+    read back from the device, and only then removes the staged file.
+    At every point at least one complete copy exists under the capture's
+    final name, so `locate` can serve a file from whichever tier holds it.
+
+    The staging tier is capped at STAGING_MAX_BYTES. A capture waits up to
+    STAGING_WAIT_TIMEOUT seconds for the mover to make room and is written
+    straight to the bulk tier if it has to wait longer.
+
+    With STAGING_PATH unset every capture goes straight to CAPTURE_PATH.
+    """
+
+    def __init__(self, path: Optional[Path], bulk_path: Path, max_bytes: int):
+        self.path = path
+        self.bulk_path = bulk_path
+        self.max_bytes = max_bytes
+        if self.path:
+            self.path.mkdir(parents=True, exist_ok=True)
+
+        # Held while files change tiers, so deletes cannot race the mover
+        self.lock = threading.Lock()
+        self._queue: Deque[str] = deque()
+        self._reserved = 0
+        self.moved_total = {"files": 0, "bytes": 0}
+        self.failed_total = 0
+        self.last_batch: Optional[Dict[str, Any]] = None
+
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="staging")
+        self._wake = asyncio.Event()
+        self._freed = asyncio.Event()
+        self._task: Optional[asyncio.Task] = None
+
+    @property
+    def enabled(self) -> bool:
+        return self.path is not None
+
+    # Paths
+
+    def locate(self, filename: str) -> Path:
+        """
+        Path of a capture in whichever tier holds it. The bulk copy only
+        appears once complete and the staged copy is removed after that,
+        so the bulk tier is checked first.
+        """
+        bulk = self.bulk_path / filename
+        if not self.enabled or bulk.exists():
+            return bulk
+        staged = self.path / filename
+        return staged if staged.exists() else bulk
+
+    def find(self, filename: str) -> Optional[Path]:
+        """
+        Existing capture by name in either tier, None when there is no
+        such file or the name points outside the capture tiers
+        """
+        path = self.locate(filename).resolve()
+        if not self.is_capture_path(path) or not path.is_file():
+            return None
+        return path
+
+    def is_capture_path(self, path: Path) -> bool:
+        """Whether a resolved path lies in one of the capture tiers"""
+        return any(path.is_relative_to(tier.resolve()) for tier in self.directories())
+
+    def directories(self) -> List[Path]:
+        return [self.bulk_path, self.path] if self.enabled else [self.bulk_path]
+
+    def capture_files(self, pattern: str = "*") -> List[Path]:
+        """Files matching pattern in both tiers, one path per filename"""
+        files: Dict[str, Path] = {}
+        for directory in reversed(self.directories()):
+            if directory.exists():
+                for p in directory.glob(pattern):
+                    if not p.name.startswith(".") and p.is_file():
+                        files[p.name] = p
+        return list(files.values())
+
+    def delete(self, filename: str) -> bool:
+        """Delete a capture from both tiers, returns whether one existed"""
+        with self.lock:
+            found = False
+            for directory in self.directories():
+                try:
+                    (directory / filename).unlink()
+                    found = True
+                except FileNotFoundError:
+                    pass
+            return found
+
+    # Backpressure
+
+    def staged_bytes(self) -> int:
+        if not self.enabled:
+            return 0
+        total = 0
+        with os.scandir(self.path) as entries:
+            for entry in entries:
+                try:
+                    if entry.is_file():
+                        total += entry.stat().st_size
+                except FileNotFoundError:
+                    pass
+        return total
+
+    async def reserve(self, expected: int) -> Optional[Path]:
+        """
+        Claim room for a capture of about `expected` bytes. Returns the
+        staging directory, or None when the capture should go straight to
+        the bulk tier (staging disabled or still full after the timeout).
+        Pair with `release` once the file is saved.
+        """
+        if not self.enabled:
+            return None
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + settings.STAGING_WAIT_TIMEOUT
+        while self.staged_bytes() + self._reserved + expected > self.max_bytes:
+            self._wake.set()
+            remaining = deadline - loop.time()
+            if remaining <= 0:
+                logger.warning("Staging tier is full, writing capture to the bulk tier")
+                return None
+            self._freed.clear()
+            try:
+                await asyncio.wait_for(self._freed.wait(), remaining)
+            except asyncio.TimeoutError:
+                pass
+        self._reserved += expected
+        return self.path
+
+    def release(self, expected: int, filenames: Iterable[str] = ()):
+        """Drop a reservation and queue the saved capture files for the mover"""
+        self._reserved -= expected
+        self._queue.extend(filenames)
+        if self._queue:
+            self._wake.set()
+
+    # Mover
+
+    def _pending(self) -> List[Path]:
+        """Queued captures first, then settled untracked staged files"""
+        pending = []
+        queued = set()
+        while self._queue:
+            filename = self._queue.popleft()
+            queued.add(filename)
+            pending.append(self.path / filename)
+        cutoff = time.time() - STRAY_SETTLE_TIME
+        strays = []
+        with os.scandir(self.path) as entries:
+            for entry in entries:
+                if entry.name.startswith(".") or entry.name in queued:
+                    continue
+                try:
+                    if entry.is_file() and entry.stat().st_mtime < cutoff:
+                        strays.append((entry.stat().st_mtime, Path(entry.path)))
+                except FileNotFoundError:
+                    pass
+        pending.extend(p for _, p in sorted(strays))
+        return pending
+
+    def _copy(self, source: Path) -> Optional[Tuple[Path, Path, str, int]]:
+        """Copy a staged file to a temporary bulk name, hashing on the way"""
+        part = self.bulk_path / f".{source.name}.part"
+        digest = hashlib.blake2b()
+        try:
+            with open(source, "rb") as src, open(part, "wb") as dst:
+                while chunk := src.read(COPY_CHUNK):
+                    digest.update(chunk)
+                    dst.write(chunk)
+                stat = os.fstat(src.fileno())
+            # Keep the mtime so the catalog's cached stats stay valid
+            os.utime(part, ns=(stat.st_atime_ns, stat.st_mtime_ns))
+        except FileNotFoundError:
+            # Deleted while queued
+            part.unlink(missing_ok=True)
+            return None
+        return source, part, digest.hexdigest(), stat.st_size
+
+    def move_batch(self, sources: List[Path]) -> Dict[str, Any]:
+        """Move one batch of staged files to the bulk tier (worker thread)"""
+        started = time.perf_counter()
+        copies = []
+        for source in sources:
+            try:
+                copy = self._copy(source)
+            except OSError as e:
+                logger.error(f"Could not copy {source.name} to the bulk tier: {e}")
+                self.failed_total += 1
+                (self.bulk_path / f".{source.name}.part").unlink(missing_ok=True)
+                continue
+            if copy:
+                copies.append(copy)
+
+        # Flush the whole batch together, then verify what reached the device
+        for _, part, _, _ in copies:
+            _fsync_path(part, drop_cache=True)
+        verified = []
+        for source, part, checksum, size in copies:
+            if _checksum(part) == checksum:
+                verified.append((source, part, size))
+            else:
+                logger.error(f"Checksum mismatch moving {source.name}, will retry")
+                self.failed_total += 1
+                part.unlink(missing_ok=True)
+                self._queue.append(source.name)
+
+        moved = {"files": 0, "bytes": 0}
+        with self.lock:
+            for source, part, size in verified:
+                if not source.exists():
+                    # Deleted while it was being copied
+                    part.unlink(missing_ok=True)
+                    continue
+                os.replace(part, self.bulk_path / source.name)
+                moved["files"] += 1
+                moved["bytes"] += size
+            if moved["files"]:
+                _fsync_path(self.bulk_path)
+            for source, _, _ in verified:
+                source.unlink(missing_ok=True)
+
+        self.moved_total["files"] += moved["files"]
+        self.moved_total["bytes"] += moved["bytes"]
+        self.last_batch = {
+            **moved,
+            "seconds": round(time.perf_counter() - started, 3),
+            "finished": time.time(),
+        }
+        return moved
+
+    def move_pending(self) -> Dict[str, int]:
+        """Move everything currently staged (worker thread)"""
+        pending = self._pending()
+        moved = {"files": 0, "bytes": 0}
+        batch_size = max(1, settings.STAGING_FSYNC_BATCH)
+        for i in range(0, len(pending), batch_size):
+            result = self.move_batch(pending[i : i + batch_size])
+            moved["files"] += result["files"]
+            moved["bytes"] += result["bytes"]
+            self._loop.call_soon_threadsafe(self._freed.set)
+        return moved
+
+    def get_status(self) -> Dict[str, Any]:
+        return {
+            "enabled": self.enabled,
+            "path": str(self.path) if self.enabled else None,
+            "max_bytes": self.max_bytes,
+            "staged_bytes": self.staged_bytes(),
+            "reserved_bytes": self._reserved,
+            "queued": len(self._queue),
+            "moved_total": self.moved_total,
+            "failed_total": self.failed_total,
+            "last_batch": self.last_batch,
+        }
+
+    def wake(self):
+        self._wake.set()
+
+    def start(self):
+        if self.enabled and (self._task is None or self._task.done()):
+            self._loop = asyncio.get_running_loop()
+            self._wake = asyncio.Event()
+            self._freed = asyncio.Event()
+            self._task = self._loop.create_task(self._run())
+
+    async def _run(self):
+        while True:
+            try:
+                moved = await self._loop.run_in_executor(
+                    self._executor, self.move_pending
+                )
+                if moved["files"]:
+                    logger.info(
+                        f"Moved {moved['files']} staged captures "
+                        f"({moved['bytes']} bytes) to the bulk tier"
+                    )
+                    event_bus.publish(
+                        "staging", "staging.moved", {**moved, **self.get_status()}
+                    )
+            except Exception as e:
+                logger.error(f"Staging mover failed: {e}")
+            try:
+                await asyncio.wait_for(self._wake.wait(), STRAY_SETTLE_TIME)
+            except asyncio.TimeoutError:
+                pass
+            self._wake.clear()
+
+    async def shutdown(self):
+        """Stop the mover; staged files are picked up again on next start"""
+        if self._task:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        self._executor.shutdown(wait=True)
+
+
+# Singleton instance
+staging_tier = StagingTier(
+    path=Path(settings.STAGING_PATH) if settings.STAGING_PATH else None,
+    bulk_path=Path(settings.CAPTURE_PATH),
+    max_bytes=settings.STAGING_MAX_BYTES,
+)
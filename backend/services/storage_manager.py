@@ -0,0 +1,204 @@
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from typing import Any, Dict, Optional
+import asyncio
+import logging
+import shutil
+import time
+
+from config.settings import settings
+from services.capture_catalog import CaptureCatalog, capture_catalog
+from services.event_bus import event_bus
+from services.staging import staging_tier
+
+logger = logging.getLogger(__name__)
+
+# Candidates fetched from the index per eviction round
+EVICTION_BATCH = 100
+
+# Assumed size of the next capture before any capture has been indexed
+DEFAULT_CAPTURE_BYTES = 64 * 1024 * 1024
+
+
+class StorageFullError(Exception):
+    """There is no room for another capture and nothing left to evict"""
+
+
+class StorageManager:
+    """
+    Keeps capture storage under STORAGE_QUOTA_BYTES and the capture file
+    system above STORAGE_MIN_FREE_BYTES free.
+
+    Eviction runs on a background task, woken after every capture and at
+    least every STORAGE_CHECK_INTERVAL seconds. Victims come from the
+    capture catalog in policy order (derived files first, then oldest
+    exported captures) without scanning any directory; captures that were
+    never exported are never deleted. STORAGE_MAX_AGE_DAYS additionally
+    expires evictable files by age.
+    """
+
+    def __init__(self, catalog: CaptureCatalog, capture_path: Path):
+        self.catalog = catalog
+        self.capture_path = capture_path
+        self.last_run: Optional[float] = None
+        self.last_evicted = {"files": 0, "bytes": 0}
+        self.evicted_total = {"files": 0, "bytes": 0}
+
+        self._usage: Dict[str, int] = {}
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="storage")
+        self._wake = asyncio.Event()
+        self._task: Optional[asyncio.Task] = None
+
+    def _disk(self) -> Dict[str, int]:
+        usage = shutil.disk_usage(self.capture_path)
+        return {"total": usage.total, "free": usage.free}
+
+    def _shortfall(self, usage: Dict[str, int], disk: Dict[str, int]) -> int:
+        """Bytes that have to go to meet the quota and the free space floor"""
+        need = 0
+        if settings.STORAGE_QUOTA_BYTES:
+            need = usage["used_bytes"] - settings.STORAGE_QUOTA_BYTES
+        if settings.STORAGE_MIN_FREE_BYTES:
+            need = max(need, settings.STORAGE_MIN_FREE_BYTES - disk["free"])
+        return max(need, 0)
+
+    def check_capture(self):
+        """
+        Cheap check before a capture: one statfs plus the usage cached by
+        the last background pass. Wakes the evictor when storage runs
+        low, and refuses the capture only if it cannot fit at all.
+        """
+        disk = self._disk()
+        usage = self._usage or {"used_bytes": 0, "unexported_bytes": 0}
+        expected = self.expected_capture_bytes()
+
+        if self._shortfall(usage, disk) or disk["free"] < 2 * expected:
+            self._wake.set()
+        if disk["free"] < expected:
+            raise StorageFullError(
+                f"Only {disk['free'] // 2**20} MB free on the capture disk, "
+                "export or delete captures to continue"
+            )
+        quota = settings.STORAGE_QUOTA_BYTES
+        if quota and usage["unexported_bytes"] + expected > quota:
+            raise StorageFullError(
+                "Storage quota is filled with captures that were not exported yet"
+            )
+
+    def expected_capture_bytes(self) -> int:
+        """Size the next capture is assumed to have"""
+        return self._usage.get("recent_capture_max_bytes") or DEFAULT_CAPTURE_BYTES
+
+    def wake(self):
+        self._wake.set()
+
+    def evict(self) -> Dict[str, int]:
+        """One eviction pass (worker thread)"""
+        evicted = {"files": 0, "bytes": 0}
+        if settings.STORAGE_MAX_AGE_DAYS:
+            cutoff = time.time() - settings.STORAGE_MAX_AGE_DAYS * 86400
+            while True:
+                batch = self.catalog.eviction_candidates(EVICTION_BATCH, cutoff)
+                for candidate in batch:
+                    self._delete(candidate, evicted)
+                if len(batch) < EVICTION_BATCH:
+                    break
+
+        need = self._shortfall(self.catalog.usage(), self._disk())
+        freed = 0
+        while need > freed:
+            batch = self.catalog.eviction_candidates(EVICTION_BATCH)
+            if not batch:
+                logger.warning(
+                    f"Storage is {need - freed} bytes short and nothing is "
+                    "evictable, all remaining captures are unexported"
+                )
+                event_bus.publish(
+                    "storage",
+                    "storage.full",
+                    {"shortfall": need - freed, **self.get_status()},
+                )
+                break
+            for candidate in batch:
+                freed += self._delete(candidate, evicted)
+                if freed >= need:
+                    break
+
+        self._usage = self.catalog.usage()
+        self.last_run = time.time()
+        self.last_evicted = evicted
+        if evicted["files"]:
+            self.evicted_total["files"] += evicted["files"]
+            self.evicted_total["bytes"] += evicted["bytes"]
+            logger.info(f"Evicted {evicted['files']} files ({evicted['bytes']} bytes)")
+            event_bus.publish(
+                "storage", "storage.evicted", {**evicted, **self.get_status()}
+            )
+        return evicted
+
+    def _delete(self, candidate: Dict[str, Any], evicted: Dict[str, int]) -> int:
+        """Delete one candidate and drop it from the index, returns bytes freed"""
+        if candidate["path"]:
+            path = Path(candidate["path"])
+            path.unlink(missing_ok=True)
+            self.catalog.remove_derived(path)
+        else:
+            filename = candidate["filename"]
+            staging_tier.delete(filename)
+            self.catalog.remove(filename)
+            event_bus.publish(
+                f"capture:{filename}",
+                "capture.deleted",
+                {"filename": filename, "reason": "evicted"},
+            )
+        evicted["files"] += 1
+        evicted["bytes"] += candidate["size"]
+        return candidate["size"]
+
+    def get_status(self) -> Dict[str, Any]:
+        return {
+            **self._usage,
+            **{f"disk_{k}": v for k, v in self._disk().items()},
+            "quota_bytes": settings.STORAGE_QUOTA_BYTES,
+            "min_free_bytes": settings.STORAGE_MIN_FREE_BYTES,
+            "max_age_days": settings.STORAGE_MAX_AGE_DAYS,
+            "last_run": self.last_run,
+            "last_evicted": self.last_evicted,
+            "evicted_total": self.evicted_total,
+            "staging": staging_tier.get_status(),
+        }
+
+    def start(self):
+        if self._task is None or self._task.done():
+            self._wake = asyncio.Event()
+            self._task = asyncio.get_running_loop().create_task(self._run())
+
+    async def _run(self):
+        loop = asyncio.get_running_loop()
+        await self.catalog.ready.wait()
+        while True:
+            try:
+                await loop.run_in_executor(self._executor, self.evict)
+            except Exception as e:
+                logger.error(f"Storage eviction failed: {e}")
+            try:
+                await asyncio.wait_for(
+                    self._wake.wait(), settings.STORAGE_CHECK_INTERVAL
+                )
+            except asyncio.TimeoutError:
+                pass
+            self._wake.clear()
+
+    async def shutdown(self):
+        if self._task:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        self._executor.shutdown(wait=False)
+
+
+# Singleton instance
+storage_manager = StorageManager(capture_catalog, Path(settings.CAPTURE_PATH))
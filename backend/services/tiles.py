@@ -0,0 +1,348 @@
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Tuple
+import asyncio
+import logging
+import math
+import multiprocessing
+import os
+import shutil
+
+from PIL import Image
+
+from config.settings import settings
+from services.capture_formats import open_capture, primary_first
+from services.event_bus import RESYNC_TOPIC, event_bus
+from services.staging import staging_tier
+
+logger = logging.getLogger(__name__)
+
+# Capture dimensions remembered without re-reading the file header
+SIZE_CACHE_ENTRIES = 64
+
+
+def max_level(width: int, height: int) -> int:
+    """Deep Zoom level holding the full resolution image (level 0 is 1x1)"""
+    return math.ceil(math.log2(max(width, height, 1)))
+
+
+def level_size(width: int, height: int, level: int) -> Tuple[int, int]:
+    scale = 2 ** (max_level(width, height) - level)
+    return math.ceil(width / scale), math.ceil(height / scale)
+
+
+def render_level(
+    source: str, level: int, target: str, tile_size: int, quality: int
+) -> int:
+    """
+    Cut one pyramid level of an image into tiles named {column}_{row}.jpg
+    (worker process). RAW files are tiled from their embedded preview.
+    The tiles are written to a temporary directory that
+    is renamed to `target` at the end, so a level is either complete or
+    absent. Returns the bytes written.
+    """
+    with open_capture(Path(source)) as image:
+        width, height = level_size(image.width, image.height, level)
+        if (width, height) != image.size:
+            # Lets libjpeg decode at 1/2, 1/4 or 1/8 scale
+            image.draft("RGB", (width, height))
+        image = image.convert("RGB")
+    if image.size != (width, height):
+        image = image.resize((width, height), Image.Resampling.BOX)
+
+    target_path = Path(target)
+    tmp = target_path.with_name(f".{target_path.name}.{os.getpid()}.tmp")
+    tmp.mkdir(parents=True, exist_ok=True)
+    written = 0
+    for row, top in enumerate(range(0, height, tile_size)):
+        for column, left in enumerate(range(0, width, tile_size)):
+            tile = image.crop(
+                (left, top, min(left + tile_size, width), min(top + tile_size, height))
+            )
+            path = tmp / f"{column}_{row}.jpg"
+            tile.save(path, "JPEG", quality=quality)
+            written += path.stat().st_size
+    try:
+        os.rename(tmp, target_path)
+    except OSError:
+        # Another worker finished the same level first
+        shutil.rmtree(tmp, ignore_errors=True)
+    return written
+
+
+class TileService:
+    """
+    Deep Zoom (DZI-style) tile pyramids of captures, so a client can
+    inspect any region at full resolution by fetching a few tiles.
+
+    Levels are rendered on first request in a process pool, one whole
+    level per decode, and kept under TILE_CACHE_PATH keyed by the
+    capture's size and mtime. The cache is trimmed to TILE_CACHE_MAX_BYTES
+    by evicting the least recently used levels. Every level of the
+    newest capture is pre-rendered in the background.
+    """
+
+    def __init__(
+        self, path: Path, max_bytes: int, tile_size: int, quality: int, workers: int
+    ):
+        self.path = path
+        self.path.mkdir(parents=True, exist_ok=True)
+        self.max_bytes = max_bytes
+        self.tile_size = tile_size
+        self.quality = quality
+        self.workers = workers or os.cpu_count() or 1
+
+        # Level directory -> bytes, least recently used first
+        self._levels: "OrderedDict[Path, int]" = OrderedDict()
+        self._bytes = 0
+        self._scanned: Optional[asyncio.Future] = None
+        self._rendering: Dict[Path, asyncio.Task] = {}
+        # (name, size, mtime) -> (width, height)
+        self._sizes: Dict[Tuple[str, int, int], Tuple[int, int]] = {}
+        self._prewarm: Optional[asyncio.Task] = None
+        self._task: Optional[asyncio.Task] = None
+        self._executor: Optional[ProcessPoolExecutor] = None
+        # Cache directory I/O and image header reads; the LRU bookkeeping
+        # itself only runs on the event loop
+        self._io = ThreadPoolExecutor(max_workers=1, thread_name_prefix="tiles")
+
+    def _get_executor(self) -> ProcessPoolExecutor:
+        # Spawned rather than forked because the server process runs many threads
+        if self._executor is None:
+            self._executor = ProcessPoolExecutor(
+                max_workers=self.workers,
+                mp_context=multiprocessing.get_context("spawn"),
+            )
+        return self._executor
+
+    # Cache
+
+    def _scan(self) -> List[Tuple[Path, int]]:
+        """Levels left on disk by a previous run, oldest first (io thread)"""
+        levels = []
+        for level_dir in self.path.glob("*/*/*"):
+            if level_dir.name.startswith("."):
+                shutil.rmtree(level_dir, ignore_errors=True)
+                continue
+            size = sum(p.stat().st_size for p in level_dir.iterdir())
+            levels.append((level_dir.stat().st_mtime, level_dir, size))
+        return [(level_dir, size) for _, level_dir, size in sorted(levels)]
+
+    async def _ensure_scanned(self):
+        if self._scanned is None:
+            self._scanned = asyncio.get_running_loop().run_in_executor(
+                self._io, self._scan
+            )
+            for level_dir, size in await self._scanned:
+                self._levels[level_dir] = size
+                self._bytes += size
+        else:
+            await self._scanned
+
+    def _account(self, level_dir: Path, size: int) -> List[Path]:
+        """Record a rendered level, returns the levels evicted to make room"""
+        self._levels[level_dir] = size
+        self._bytes += size
+        victims = []
+        while self._bytes > self.max_bytes and len(self._levels) > 1:
+            victim, victim_size = self._levels.popitem(last=False)
+            self._bytes -= victim_size
+            victims.append(victim)
+        return victims
+
+    async def _purge(self, filename: str):
+        """Drop every cached level of a capture"""
+        root = self.path / filename
+        for level_dir in [d for d in self._levels if d.parent.parent == root]:
+            self._bytes -= self._levels.pop(level_dir)
+        self._sizes = {k: v for k, v in self._sizes.items() if k[0] != filename}
+        await asyncio.get_running_loop().run_in_executor(self._io, _remove_dirs, [root])
+
+    def _orphans(self) -> List[str]:
+        """Captures with cached levels that no longer exist (io thread)"""
+        return [
+            d.name
+            for d in self.path.iterdir()
+            if d.is_dir()
+            and not d.name.startswith(".")
+            and staging_tier.find(d.name) is None
+        ]
+
+    async def _purge_missing(self):
+        """Drop the cached levels of every capture that is gone"""
+        await self._ensure_scanned()
+        orphans = await asyncio.get_running_loop().run_in_executor(
+            self._io, self._orphans
+        )
+        for filename in orphans:
+            await self._purge(filename)
+        if orphans:
+            logger.debug(f"Purged tile pyramids of {len(orphans)} removed captures")
+
+    # Pyramid
+
+    async def _version(self, source: Path) -> Tuple[Tuple[str, int, int], int, int]:
+        """(name, size, mtime) key of a capture plus its width and height"""
+        stat = source.stat()
+        key = (source.name, stat.st_size, stat.st_mtime_ns)
+        if key not in self._sizes:
+            if len(self._sizes) >= SIZE_CACHE_ENTRIES:
+                self._sizes.pop(next(iter(self._sizes)))
+            self._sizes[key] = await asyncio.get_running_loop().run_in_executor(
+                self._io, _image_size, source
+            )
+        return (key, *self._sizes[key])
+
+    async def describe(self, filename: str) -> Optional[Dict[str, Any]]:
+        """Image size and pyramid layout of a capture, None if it doesn't exist"""
+        source = staging_tier.find(filename)
+        if source is None:
+            return None
+        _, width, height = await self._version(source)
+        return {
+            "filename": filename,
+            "width": width,
+            "height": height,
+            "tile_size": self.tile_size,
+            "overlap": 0,
+            "format": "jpg",
+            "max_level": max_level(width, height),
+        }
+
+    async def _render(self, source: Path, level: int, level_dir: Path):
+        """Render a level and account it, independent of who is waiting"""
+        loop = asyncio.get_running_loop()
+        try:
+            size = await loop.run_in_executor(
+                self._get_executor(),
+                render_level,
+                str(source),
+                level,
+                str(level_dir),
+                self.tile_size,
+                self.quality,
+            )
+            victims = self._account(level_dir, size)
+            if victims:
+                await loop.run_in_executor(self._io, _remove_dirs, victims)
+        finally:
+            self._rendering.pop(level_dir, None)
+
+    async def _level(self, source: Path, level: int) -> Path:
+        """Directory of a rendered level, rendering it once for concurrent callers"""
+        await self._ensure_scanned()
+        (name, size, mtime_ns), _, _ = await self._version(source)
+        level_dir = self.path / name / f"{size}-{mtime_ns}" / str(level)
+        if level_dir in self._levels:
+            self._levels.move_to_end(level_dir)
+            return level_dir
+
+        task = self._rendering.get(level_dir)
+        if task is None:
+            task = asyncio.create_task(self._render(source, level, level_dir))
+            self._rendering[level_dir] = task
+        await asyncio.shield(task)
+        return level_dir
+
+    async def get_tile(
+        self, filename: str, level: int, x: int, y: int
+    ) -> Optional[Path]:
+        """Path of one tile, None if the capture or tile doesn't exist"""
+        source = staging_tier.find(filename)
+        if source is None:
+            return None
+        _, width, height = await self._version(source)
+        if not 0 <= level <= max_level(width, height):
+            return None
+        level_width, level_height = level_size(width, height, level)
+        if (
+            x < 0
+            or y < 0
+            or x * self.tile_size >= level_width
+            or y * self.tile_size >= level_height
+        ):
+            return None
+        return await self._level(source, level) / f"{x}_{y}.jpg"
+
+    async def _prewarm_capture(self, filename: str):
+        """Render every level of a capture, smallest first"""
+        source = staging_tier.find(filename)
+        if source is None:
+            return
+        _, width, height = await self._version(source)
+        for level in range(max_level(width, height) + 1):
+            await self._level(source, level)
+        logger.debug(f"Tile pyramid of {filename} ready")
+
+    async def _watch(self):
+        subscription = event_bus.subscribe(["capture"])
+        try:
+            while True:
+                for event in await subscription.next_batch(timeout=60):
+                    if event.type == "capture.completed":
+                        filename = event.data["filename"]
+                        companions = event.data.get("companions", [])
+                        if primary_first([filename, *companions])[0] != filename:
+                            continue
+                        # Only the newest capture is pre-warmed
+                        if self._prewarm and not self._prewarm.done():
+                            self._prewarm.cancel()
+                        self._prewarm = asyncio.create_task(
+                            self._prewarm_capture(filename)
+                        )
+                    elif event.type == "capture.deleted":
+                        await self._purge(event.data["filename"])
+                    elif (
+                        event.type == "captures.cleared" or event.topic == RESYNC_TOPIC
+                    ):
+                        # Missed deletes: check the whole cache
+                        await self._purge_missing()
+        finally:
+            event_bus.unsubscribe(subscription)
+
+    def get_status(self) -> Dict[str, Any]:
+        return {
+            "levels": len(self._levels),
+            "bytes": self._bytes,
+            "max_bytes": self.max_bytes,
+            "rendering": len(self._rendering),
+        }
+
+    def start(self):
+        if self._task is None or self._task.done():
+            self._task = asyncio.get_running_loop().create_task(self._watch())
+
+    async def shutdown(self):
+        for task in (self._task, self._prewarm):
+            if task:
+                task.cancel()
+                try:
+                    await task
+                except (asyncio.CancelledError, Exception):
+                    pass
+        self._task = self._prewarm = None
+        if self._executor:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+        self._io.shutdown(wait=False)
+
+
+def _remove_dirs(paths: List[Path]):
+    for path in paths:
+        shutil.rmtree(path, ignore_errors=True)
+
+
+def _image_size(path: Path) -> Tuple[int, int]:
+    # Reads the header only (of the embedded preview for RAW files)
+    with open_capture(path) as image:
+        return image.size
+
+
+# Singleton instance
+tile_service = TileService(
+    path=Path(settings.TILE_CACHE_PATH),
+    max_bytes=settings.TILE_CACHE_MAX_BYTES,
+    tile_size=settings.TILE_SIZE,
+    quality=settings.TILE_QUALITY,
+    workers=settings.TILE_WORKERS,
+)
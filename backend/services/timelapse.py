@@ -0,0 +1,397 @@
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from datetime import datetime
+from pathlib import Path
+from typing import Any, BinaryIO, Deque, Dict, List, Optional, Tuple
+import asyncio
+import io
+import logging
+import multiprocessing
+import os
+import struct
+
+from PIL import Image, ImageOps
+
+from config.settings import settings
+from services.capture_formats import embedded_preview, is_raw, open_capture
+from services.jobs import Job
+
+logger = logging.getLogger(__name__)
+
+# OpenDML splits the file into RIFF segments of about this size, each
+# with its own index, so files can grow past the 4 GB AVI 1.0 limit
+AVI_SEGMENT_BYTES = 1024 * 1024 * 1024
+
+# Super index slots reserved in the header, i.e. max segments per file
+AVI_MAX_SEGMENTS = 256
+
+AVIF_HASINDEX = 0x10
+AVIIF_KEYFRAME = 0x10
+
+# Write buffer of the output file
+AVI_WRITE_BUFFER = 4 * 1024 * 1024
+
+
+def _chunk(fourcc: bytes, payload: bytes) -> bytes:
+    return (
+        fourcc + struct.pack("<I", len(payload)) + payload + b"\0" * (len(payload) & 1)
+    )
+
+
+def _list(fourcc: bytes, payload: bytes) -> bytes:
+    return b"LIST" + struct.pack("<I", len(payload) + 4) + fourcc + payload
+
+
+class AviWriter:
+    """
+    Streams JPEG frames into an MJPEG AVI with OpenDML (AVI 2.0) indexes.
+
+    Frames are written as they arrive; only the index entries of the
+    current ~1 GB segment (8 bytes per frame) and of the first segment's
+    legacy idx1 (16 bytes per frame) are held in memory. Header fields
+    that depend on the frame count are patched in close().
+    """
+
+    def __init__(self, file: BinaryIO, width: int, height: int, fps: float):
+        self.file = file
+        self.frames = 0
+        self.max_frame = 0
+        self._segments: List[Tuple[int, int, int]] = []
+        self._first_segment_frames = 0
+
+        scale = 1000
+        rate = round(fps * scale)
+        header = _list(
+            b"hdrl",
+            _chunk(
+                b"avih",
+                struct.pack(
+                    "<14I",
+                    round(1e6 / fps),  # microseconds per frame
+                    0,
+                    0,
+                    AVIF_HASINDEX,
+                    0,  # frames in the first RIFF segment, patched
+                    0,
+                    1,  # streams
+                    0,  # suggested buffer size, patched
+                    width,
+                    height,
+                    0,
+                    0,
+                    0,
+                    0,
+                ),
+            )
+            + _list(
+                b"strl",
+                _chunk(
+                    b"strh",
+                    struct.pack(
+                        "<4s4sIHH6IiI4h",
+                        b"vids",
+                        b"MJPG",
+                        0,
+                        0,
+                        0,
+                        0,
+                        scale,
+                        rate,
+                        0,
+                        0,  # length in frames, patched
+                        0,  # suggested buffer size, patched
+                        -1,
+                        0,
+                        0,
+                        0,
+                        width,
+                        height,
+                    ),
+                )
+                + _chunk(
+                    b"strf",
+                    struct.pack(
+                        "<IiiHH4sIiiII",
+                        40,
+                        width,
+                        height,
+                        1,
+                        24,
+                        b"MJPG",
+                        width * height * 3,
+                        0,
+                        0,
+                        0,
+                        0,
+                    ),
+                )
+                + _chunk(
+                    b"indx",
+                    struct.pack("<HBBI4s3I", 4, 0, 0, 0, b"00dc", 0, 0, 0)
+                    + b"\0" * (16 * AVI_MAX_SEGMENTS),
+                ),
+            )
+            + _list(b"odml", _chunk(b"dmlh", b"\0" * 248)),
+        )
+        # Absolute offsets of the fields patched in close()
+        base = 12
+        self._avih = base + header.index(b"avih") + 8
+        self._strh = base + header.index(b"strh") + 8
+        self._indx = base + header.index(b"indx") + 8
+        self._dmlh = base + header.index(b"dmlh") + 8
+
+        self.file.write(b"RIFF\0\0\0\0AVI ")
+        self.file.write(header)
+        self._riff = 0
+        self._begin_movi()
+
+    def _begin_movi(self):
+        self._movi = self.file.tell()
+        self.file.write(b"LIST\0\0\0\0movi")
+        self._index: List[Tuple[int, int]] = []
+
+    def _end_segment(self):
+        """Write the segment's standard index and close its RIFF"""
+        movi_fourcc = self._movi + 8
+        entries = b"".join(
+            struct.pack("<II", offset - movi_fourcc, size)
+            for offset, size in self._index
+        )
+        index_pos = self.file.tell()
+        index = _chunk(
+            b"ix00",
+            struct.pack("<HBBI4sQI", 2, 0, 1, len(self._index), b"00dc", movi_fourcc, 0)
+            + entries,
+        )
+        self.file.write(index)
+        self._segments.append((index_pos, len(index), len(self._index)))
+        end = self.file.tell()
+        self._patch(self._movi + 4, end - self._movi - 8)
+
+        if self._riff == 0:
+            # Legacy index so AVI 1.0 players can read the first segment
+            self.file.write(b"idx1" + struct.pack("<I", 16 * len(self._index)))
+            for offset, size in self._index:
+                self.file.write(
+                    struct.pack(
+                        "<4sIII",
+                        b"00dc",
+                        AVIIF_KEYFRAME,
+                        offset - 8 - movi_fourcc,
+                        size,
+                    )
+                )
+            self._first_segment_frames = len(self._index)
+            end = self.file.tell()
+        self._patch(self._riff + 4, end - self._riff - 8)
+
+    def _patch(self, offset: int, value: int):
+        position = self.file.tell()
+        self.file.seek(offset)
+        self.file.write(struct.pack("<I", value))
+        self.file.seek(position)
+
+    def write_frame(self, data: bytes):
+        position = self.file.tell()
+        if position - self._riff + len(data) + 8 * len(self._index) > AVI_SEGMENT_BYTES:
+            if len(self._segments) + 1 >= AVI_MAX_SEGMENTS:
+                raise ValueError("Timelapse too large for one AVI file")
+            self._end_segment()
+            self._riff = self.file.tell()
+            self.file.write(b"RIFF\0\0\0\0AVIX")
+            self._begin_movi()
+            position = self.file.tell()
+        self.file.write(_chunk(b"00dc", data))
+        # Offsets point at the frame data, after the chunk header
+        self._index.append((position + 8, len(data)))
+        self.frames += 1
+        self.max_frame = max(self.max_frame, len(data))
+
+    def close(self):
+        self._end_segment()
+        self._patch(self._avih + 16, self._first_segment_frames)
+        self._patch(self._avih + 28, self.max_frame)
+        self._patch(self._strh + 32, self.frames)
+        self._patch(self._strh + 36, self.max_frame)
+        self._patch(self._dmlh, self.frames)
+        self._patch(self._indx + 4, len(self._segments))
+        self.file.seek(self._indx + 24)
+        for offset, size, frames in self._segments:
+            self.file.write(struct.pack("<QII", offset, size, frames))
+        self.file.seek(0, os.SEEK_END)
+
+
+def frame_size(path: Path) -> Tuple[int, int]:
+    # Reads the header only
+    with open_capture(path) as image:
+        return image.size
+
+
+def passthrough_frame(path: Path, size: Tuple[int, int]) -> Optional[bytes]:
+    """
+    A capture's JPEG bytes as they are (a RAW file's embedded preview), or
+    None if it has to be re-encoded (different size, not a JPEG, or
+    progressive, which MJPEG decoders don't handle)
+    """
+    with (
+        io.BytesIO(embedded_preview(path)) if is_raw(path.name) else open(path, "rb")
+    ) as f:
+        with Image.open(f) as image:
+            if (
+                image.format != "JPEG"
+                or image.size != size
+                or image.info.get("progressive")
+            ):
+                return None
+        f.seek(0)
+        return f.read()
+
+
+def resize_frame(source: str, size: Tuple[int, int], quality: int) -> bytes:
+    """Decode, letterbox to `size` and encode one frame (worker process)"""
+    with open_capture(Path(source)) as image:
+        image.draft("RGB", size)
+        image = ImageOps.pad(image.convert("RGB"), size, Image.Resampling.LANCZOS)
+    buffer = io.BytesIO()
+    image.save(buffer, "JPEG", quality=quality)
+    return buffer.getvalue()
+
+
+class TimelapseService:
+    """
+    Assembles captures into MJPEG AVI timelapses as background jobs.
+
+    Frames whose size already matches the video are copied byte for byte;
+    the others are resized in a process pool. At most a small window of
+    frames is in flight at a time and they are written strictly in order,
+    so memory stays bounded however long the sequence is.
+    """
+
+    def __init__(self, path: Path, workers: int):
+        self.path = path
+        self.path.mkdir(parents=True, exist_ok=True)
+        self.workers = workers or os.cpu_count() or 1
+        self._executor: Optional[ProcessPoolExecutor] = None
+        # Reads captures and writes the video
+        self._io = ThreadPoolExecutor(max_workers=1, thread_name_prefix="timelapse")
+
+    def _get_executor(self) -> ProcessPoolExecutor:
+        # Spawned rather than forked because the server process runs many threads
+        if self._executor is None:
+            self._executor = ProcessPoolExecutor(
+                max_workers=self.workers,
+                mp_context=multiprocessing.get_context("spawn"),
+            )
+        return self._executor
+
+    def list(self) -> List[Path]:
+        return sorted(
+            (p for p in self.path.glob("*.avi") if p.is_file()),
+            key=lambda p: p.stat().st_mtime,
+            reverse=True,
+        )
+
+    async def _frame(
+        self, path: Path, size: Tuple[int, int], quality: int
+    ) -> Tuple[Optional[bytes], bool]:
+        """(JPEG bytes, re-encoded) of one frame, (None, False) if it's gone"""
+        loop = asyncio.get_running_loop()
+        try:
+            data = await loop.run_in_executor(self._io, passthrough_frame, path, size)
+            if data is not None:
+                return data, False
+            data = await loop.run_in_executor(
+                self._get_executor(), resize_frame, str(path), size, quality
+            )
+            return data, True
+        except FileNotFoundError:
+            return None, False
+
+    async def assemble(
+        self,
+        job: Job,
+        paths: List[Path],
+        name: Optional[str] = None,
+        fps: float = 24.0,
+        width: Optional[int] = None,
+        quality: int = 90,
+    ) -> Dict[str, Any]:
+        """Write captures, in the given order, to one AVI, run as a job"""
+        if not paths:
+            raise ValueError("No captures selected")
+        loop = asyncio.get_running_loop()
+        first_width, first_height = await loop.run_in_executor(
+            self._io, frame_size, paths[0]
+        )
+        if width:
+            size = (width, max(1, round(first_height * width / first_width)))
+        else:
+            size = (first_width, first_height)
+
+        name = name or f"timelapse_{datetime.now().strftime('%Y%m%d_%H%M%S')}.avi"
+        target = self.path / name
+        tmp = target.with_name(f".{target.name}.part")
+        output = await loop.run_in_executor(
+            self._io, lambda: open(tmp, "wb", buffering=AVI_WRITE_BUFFER)
+        )
+        writer = AviWriter(output, *size, fps)
+        counts = {"passthrough": 0, "resized": 0, "missing": 0}
+        window: Deque[asyncio.Task] = deque()
+        # Enough frames in flight to keep every worker busy
+        window_size = 2 * self.workers + 2
+        job.update(0, len(paths), f"{size[0]}x{size[1]} at {fps:g} fps")
+        try:
+            queued = iter(paths)
+            done = 0
+            while True:
+                while len(window) < window_size:
+                    path = next(queued, None)
+                    if path is None:
+                        break
+                    window.append(
+                        asyncio.ensure_future(self._frame(path, size, quality))
+                    )
+                if not window:
+                    break
+                data, resized = await window.popleft()
+                if data is None:
+                    counts["missing"] += 1
+                else:
+                    await loop.run_in_executor(self._io, writer.write_frame, data)
+                    counts["resized" if resized else "passthrough"] += 1
+                done += 1
+                job.update(done, message=f"{writer.frames} frames written")
+                job.check_cancelled()
+
+            await loop.run_in_executor(self._io, writer.close)
+            await loop.run_in_executor(self._io, output.close)
+            os.replace(tmp, target)
+        except BaseException:
+            for task in window:
+                task.cancel()
+            await loop.run_in_executor(self._io, output.close)
+            tmp.unlink(missing_ok=True)
+            raise
+
+        logger.info(f"Timelapse {name}: {writer.frames} frames, {counts}")
+        return {
+            "filename": name,
+            "url": f"/api/files/timelapses/{name}",
+            "frames": writer.frames,
+            "width": size[0],
+            "height": size[1],
+            "fps": fps,
+            "size": target.stat().st_size,
+            **counts,
+        }
+
+    def shutdown(self):
+        if self._executor:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+        self._io.shutdown(wait=False)
+
+
+# Singleton instance
+timelapse_service = TimelapseService(
+    path=Path(settings.TIMELAPSE_PATH), workers=settings.TIMELAPSE_WORKERS
+)
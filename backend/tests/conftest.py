@@ -0,0 +1,23 @@
+import os
+import sys
+import tempfile
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+# Services create their directories (and the catalog database) on import,
+# keep them out of the working directory
+_data = Path(tempfile.mkdtemp(prefix="backend-tests-"))
+for _name in (
+    "CAPTURE_PATH",
+    "PREVIEW_PATH",
+    "RECORDING_PATH",
+    "THUMBNAIL_PATH",
+    "TILE_CACHE_PATH",
+    "CALIBRATION_PATH",
+    "FITS_PATH",
+    "TIMELAPSE_PATH",
+    "PROFILING_PATH",
+):
+    os.environ.setdefault(_name, str(_data / _name.lower()))
+os.environ.setdefault("CATALOG_PATH", str(_data / "catalog.sqlite3"))
@@ -0,0 +1,42 @@
+import numpy as np
+
+from services.calibration import combine_tile, tile_rows
+
+
+def noisy_stack(frames: int = 20) -> np.ndarray:
+    rng = np.random.default_rng(0)
+    return rng.integers(99, 102, size=(frames, 4, 5, 3), dtype=np.uint8)
+
+
+def test_median():
+    stack = noisy_stack()
+    result = combine_tile(stack, "median", 3.0)
+    assert result.dtype == np.float32
+    assert np.array_equal(result, np.median(stack, axis=0))
+
+
+def test_sigma_clip_rejects_outliers():
+    stack = noisy_stack()
+    # Hot pixels and a satellite trail in single frames
+    outliers = np.zeros(stack.shape, dtype=bool)
+    outliers[3, 1, 2, :] = True
+    outliers[7, 0, :, 1] = True
+    outliers[12, 3, 4, 0] = True
+    stack[outliers] = 255
+
+    result = combine_tile(stack, "sigma_clip", 3.0)
+
+    data = stack.astype(np.float64)
+    expected = np.where(outliers, 0, data).sum(axis=0) / (~outliers).sum(axis=0)
+    assert np.allclose(result, expected, atol=1e-4)
+
+
+def test_sigma_clip_keeps_constant_pixels():
+    stack = np.full((8, 2, 2, 3), 42, dtype=np.uint8)
+    assert np.array_equal(combine_tile(stack, "sigma_clip", 3.0), stack[0])
+
+
+def test_tile_rows_fit_budget():
+    rows = tile_rows(frames=30, width=6000, channels=3, tile_bytes=64 * 1024 * 1024)
+    assert rows * 30 * 6000 * 3 * 4 <= 64 * 1024 * 1024
+    assert tile_rows(frames=30, width=6000, channels=3, tile_bytes=1) == 1
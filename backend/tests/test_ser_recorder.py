@@ -0,0 +1,77 @@
+import struct
+
+from services.ser_recorder import (
+    SER_MONO,
+    SER_RGB,
+    TICKS_AT_UNIX_EPOCH,
+    SerWriter,
+    extract_frames,
+    read_ser_header,
+)
+
+# Field offsets from the SER specification, independent of SER_HEADER
+HEADER_SIZE = 178
+
+
+def frames_of(count: int, size: int):
+    return [bytes([i * 10 + j % 7 for j in range(size)]) for i in range(count)]
+
+
+def write_ser(path, width, height, color, frames, start=1_700_000_000.0):
+    writer = SerWriter(path, width, height, color, instrument="Test Camera")
+    for i, pixels in enumerate(frames):
+        writer.write(pixels, start + i * 0.5)
+    writer.close()
+    return start
+
+
+def test_header_layout(tmp_path):
+    path = tmp_path / "rgb.ser"
+    frames = frames_of(3, 4 * 2 * 3)
+    write_ser(path, 4, 2, True, frames)
+    data = path.read_bytes()
+
+    assert data[:14] == b"LUCAM-RECORDER"
+    _, color_id, _, width, height, depth, count = struct.unpack("<7i", data[14:42])
+    assert (color_id, width, height, depth, count) == (SER_RGB, 4, 2, 8, 3)
+    assert data[82:122].rstrip(b"\0") == b"Test Camera"
+    _, utc = struct.unpack("<qq", data[162:178])
+    assert utc >= TICKS_AT_UNIX_EPOCH
+
+
+def test_frames_and_trailer(tmp_path):
+    path = tmp_path / "mono.ser"
+    frames = frames_of(4, 5 * 3)
+    start = write_ser(path, 5, 3, False, frames)
+    data = path.read_bytes()
+
+    frame_size = 5 * 3
+    assert len(data) == HEADER_SIZE + 4 * frame_size + 4 * 8
+    for i, pixels in enumerate(frames):
+        offset = HEADER_SIZE + i * frame_size
+        assert data[offset : offset + frame_size] == pixels
+    trailer = struct.unpack("<4q", data[HEADER_SIZE + 4 * frame_size :])
+    assert [(t - TICKS_AT_UNIX_EPOCH) / 1e7 for t in trailer] == [
+        start + i * 0.5 for i in range(4)
+    ]
+
+    info = read_ser_header(path)
+    assert info["color_id"] == SER_MONO
+    assert (info["width"], info["height"], info["frames"]) == (5, 3, 4)
+    assert info["frame_size"] == frame_size
+
+
+def test_extract_frames(tmp_path):
+    source, target = tmp_path / "source.ser", tmp_path / "best.ser"
+    frames = frames_of(5, 2 * 2 * 3)
+    write_ser(source, 2, 2, True, frames)
+
+    assert extract_frames(source, target, [3, 1, 3, 9]) == 2
+    info = read_ser_header(target)
+    assert info["frames"] == 2
+    data = target.read_bytes()
+    frame_size = info["frame_size"]
+    assert data[HEADER_SIZE : HEADER_SIZE + 2 * frame_size] == frames[1] + frames[3]
+
+    source_trailer = source.read_bytes()[-5 * 8 :]
+    assert data[-2 * 8 :] == source_trailer[8:16] + source_trailer[24:32]
@@ -0,0 +1,135 @@
+import io
+import struct
+
+import services.timelapse as timelapse
+from services.timelapse import AviWriter
+
+
+def chunks(data: bytes, start: int, end: int):
+    """(fourcc, payload offset, payload size) of the chunks in data[start:end]"""
+    position = start
+    while position < end:
+        fourcc, size = struct.unpack("<4sI", data[position : position + 8])
+        yield fourcc, position + 8, size
+        position += 8 + size + (size & 1)
+
+
+def find(data: bytes, start: int, end: int, fourcc: bytes, list_type: bytes = None):
+    for found, offset, size in chunks(data, start, end):
+        if found == fourcc and (
+            list_type is None or data[offset : offset + 4] == list_type
+        ):
+            return offset, size
+    raise AssertionError(f"{fourcc} {list_type} not found")
+
+
+def write_avi(frames, fps: float = 10.0) -> bytes:
+    f = io.BytesIO()
+    writer = AviWriter(f, 64, 48, fps)
+    for frame in frames:
+        writer.write_frame(frame)
+    writer.close()
+    return f.getvalue()
+
+
+def make_frames(count: int):
+    # Odd and even sizes, so chunk padding is exercised
+    return [bytes([i]) * (100 + i * 7) for i in range(count)]
+
+
+def riff_segments(data: bytes):
+    """(offset, size, form type) of the top-level RIFF chunks"""
+    return [
+        (offset, size, data[offset : offset + 4])
+        for fourcc, offset, size in chunks(data, 0, len(data))
+        if fourcc == b"RIFF"
+    ]
+
+
+def opendml_frames(data: bytes):
+    """Frames read through the super index and its standard indexes"""
+    riff, riff_size, _ = riff_segments(data)[0]
+    hdrl, hdrl_size = find(data, riff + 4, riff + riff_size, b"LIST", b"hdrl")
+    strl, strl_size = find(data, hdrl + 4, hdrl + hdrl_size, b"LIST", b"strl")
+    indx, _ = find(data, strl + 4, strl + strl_size, b"indx")
+    longs, sub_type, index_type, entries, chunk_id = struct.unpack(
+        "<HBBI4s", data[indx : indx + 12]
+    )
+    assert (longs, sub_type, index_type, chunk_id) == (4, 0, 0, b"00dc")
+
+    frames = []
+    for i in range(entries):
+        offset, size, duration = struct.unpack(
+            "<QII", data[indx + 24 + 16 * i : indx + 40 + 16 * i]
+        )
+        fourcc, ix_size = struct.unpack("<4sI", data[offset : offset + 8])
+        assert fourcc == b"ix00" and ix_size + 8 == size
+        longs, sub_type, index_type, count, chunk_id, base = struct.unpack(
+            "<HBBI4sQ", data[offset + 8 : offset + 28]
+        )
+        assert (longs, index_type, chunk_id, count) == (2, 1, b"00dc", duration)
+        for j in range(count):
+            frame_offset, frame_size = struct.unpack(
+                "<II", data[offset + 32 + 8 * j : offset + 40 + 8 * j]
+            )
+            frames.append(data[base + frame_offset : base + frame_offset + frame_size])
+    return frames
+
+
+def test_single_segment():
+    frames = make_frames(5)
+    data = write_avi(frames)
+
+    segments = riff_segments(data)
+    assert len(segments) == 1
+    riff, riff_size, form = segments[0]
+    assert form == b"AVI " and riff + riff_size == len(data)
+
+    hdrl, _ = find(data, riff + 4, riff + riff_size, b"LIST", b"hdrl")
+    avih, _ = find(data, hdrl + 4, hdrl + 4 + 64, b"avih")
+    usec, _, _, flags, total_frames = struct.unpack("<5I", data[avih : avih + 20])
+    assert usec == 100_000 and flags & timelapse.AVIF_HASINDEX
+    assert total_frames == 5
+
+    # Legacy idx1: offsets relative to the movi list's fourcc
+    movi, movi_size = find(data, riff + 4, riff + riff_size, b"LIST", b"movi")
+    idx1, idx1_size = find(data, movi + movi_size, riff + riff_size, b"idx1")
+    legacy = []
+    for i in range(idx1_size // 16):
+        chunk_id, flags, offset, size = struct.unpack(
+            "<4sIII", data[idx1 + 16 * i : idx1 + 16 * i + 16]
+        )
+        assert chunk_id == b"00dc" and flags == timelapse.AVIIF_KEYFRAME
+        chunk = movi + offset
+        assert data[chunk : chunk + 4] == b"00dc"
+        legacy.append(data[chunk + 8 : chunk + 8 + size])
+    assert legacy == frames
+
+    assert opendml_frames(data) == frames
+
+
+def test_segments(monkeypatch):
+    # Tiny segments so a few frames span several RIFF chunks
+    monkeypatch.setattr(timelapse, "AVI_SEGMENT_BYTES", 1024)
+    frames = make_frames(12)
+    data = write_avi(frames)
+
+    segments = riff_segments(data)
+    assert len(segments) > 2
+    assert [form for _, _, form in segments] == [b"AVI "] + [b"AVIX"] * (
+        len(segments) - 1
+    )
+    last, last_size, _ = segments[-1]
+    assert last + last_size == len(data)
+
+    assert opendml_frames(data) == frames
+
+    # strh length and dmlh hold the total, avih only the first segment
+    riff, riff_size, _ = segments[0]
+    hdrl, hdrl_size = find(data, riff + 4, riff + riff_size, b"LIST", b"hdrl")
+    odml, _ = find(data, hdrl + 4, hdrl + hdrl_size, b"LIST", b"odml")
+    dmlh, _ = find(data, odml + 4, odml + 4 + 256, b"dmlh")
+    assert struct.unpack("<I", data[dmlh : dmlh + 4])[0] == 12
+    strl, strl_size = find(data, hdrl + 4, hdrl + hdrl_size, b"LIST", b"strl")
+    strh, _ = find(data, strl + 4, strl + strl_size, b"strh")
+    assert struct.unpack("<I", data[strh + 32 : strh + 36])[0] == 12
@@ -1,7 +1,11 @@
+import { EventStream, ServerEvent } from './EventStream.js';
+
 interface CameraStatus {
     connected: boolean;
     model?: string;
     battery?: number;
+    reconnecting?: boolean;
+    camera_id?: string;
 }
 
 interface CameraSettings {
@@ -14,9 +18,31 @@ export class CameraControl {
     private baseUrl = '/api/camera';
     private eventHandlers: Map<string, Function[]> = new Map();
     private status: CameraStatus = { connected: false };
+    private cameraId: string | null = null;
     
-    constructor() {
+    constructor(private events?: EventStream) {
         this.setupEventHandlers();
+        this.events?.on('camera.status', (event: ServerEvent<CameraStatus>) => {
+            this.onStatusEvent(event.data);
+        });
+    }
+
+    private onStatusEvent(status: CameraStatus): void {
+        // Follow the camera this UI connected, or the first one reporting
+        if (this.cameraId && status.camera_id !== this.cameraId) return;
+        if (status.connected) {
+            this.cameraId = status.camera_id ?? this.cameraId;
+        }
+
+        const wasConnected = this.status.connected;
+        this.status = status;
+        this.updateStatusDisplay();
+
+        if (status.connected && !wasConnected) {
+            this.emit('connected');
+        } else if (!status.connected && wasConnected) {
+            this.emit('disconnected');
+        }
     }
 
     async initialize(): Promise<void> {
@@ -57,6 +83,7 @@ export class CameraControl {
             const result = await response.json();
             
             if (result.success) {
+                this.cameraId = result.data?.camera_id ?? null;
                 await this.updateStatus();
                 this.emit('connected');
                 return true;
@@ -0,0 +1,53 @@
+export interface ServerEvent<T = any> {
+    topic: string;
+    timestamp: number;
+    data: T;
+}
+
+type ServerEventHandler = (event: ServerEvent) => void;
+
+/**
+ * Thin wrapper around the /api/events Server-Sent Events stream.
+ * The server coalesces events per topic, so handlers always see the latest state.
+ */
+export class EventStream {
+    private source: EventSource | null = null;
+    private handlers: Map<string, ServerEventHandler[]> = new Map();
+
+    constructor(private url: string = '/api/events') {}
+
+    connect(): void {
+        if (this.source || typeof EventSource === 'undefined') return;
+
+        this.source = new EventSource(this.url);
+        this.handlers.forEach((_, type) => this.listen(type));
+    }
+
+    close(): void {
+        this.source?.close();
+        this.source = null;
+    }
+
+    get isOpen(): boolean {
+        return this.source !== null && this.source.readyState === EventSource.OPEN;
+    }
+
+    on(type: string, handler: ServerEventHandler): void {
+        if (!this.handlers.has(type)) {
+            this.handlers.set(type, []);
+            this.listen(type);
+        }
+        this.handlers.get(type)?.push(handler);
+    }
+
+    private listen(type: string): void {
+        this.source?.addEventListener(type, (message: MessageEvent) => {
+            try {
+                const event: ServerEvent = JSON.parse(message.data);
+                this.handlers.get(type)?.forEach(handler => handler(event));
+            } catch (error) {
+                console.error(`Invalid ${type} event:`, error);
+            }
+        });
+    }
+}
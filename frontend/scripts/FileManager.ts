@@ -1,9 +1,13 @@
+import { EventStream, ServerEvent } from './EventStream.js';
+
 interface FileInfo {
     filename: string;
     size: number;
     date: string;
     url: string;
     thumbnail_url?: string;
+    media_type?: string;
+    companions?: string[];
 }
 
 export class FileManager {
@@ -11,6 +15,21 @@ export class FileManager {
     private files: FileInfo[] = [];
     private galleryElement: HTMLElement | null = null;
 
+    constructor(private events?: EventStream) {
+        this.events?.on('capture.completed', (event: ServerEvent<FileInfo>) => {
+            // A RAW+JPEG shot is one gallery item, shown by the file announced last
+            const shot = [event.data.filename, ...(event.data.companions || [])];
+            this.files = [event.data, ...this.files.filter(f => !shot.includes(f.filename))];
+            this.updateGallery();
+        });
+        this.events?.on('capture.deleted', (event: ServerEvent<{ filename: string }>) => {
+            this.files = this.files.filter(f => f.filename !== event.data.filename);
+            this.updateGallery();
+        });
+        this.events?.on('captures.cleared', () => this.refresh());
+        this.events?.on('resync', () => this.refresh());
+    }
+
     async initialize(): Promise<void> {
         this.galleryElement = document.getElementById('image-gallery');
         this.setupEventHandlers();
@@ -51,11 +70,11 @@ export class FileManager {
                      onclick="window.open('${file.url}', '_blank')" />
             </div>
             <div class="file-info">
-                <div class="file-name">${file.filename}</div>
+                <div class="file-name">${[file.filename, ...(file.companions || [])].join(' + ')}</div>
                 <div class="file-details">${sizeStr} • ${dateStr}</div>
             </div>
             <div class="file-actions">
-                <button onclick="window.open('${file.url}', '_blank')" class="btn-download">
+                <button onclick="window.open('${file.url}?download=1', '_blank')" class="btn-download">
                     Download
                 </button>
                 <button onclick="FileManager.deleteFile('${file.filename}')" class="btn-delete">
@@ -81,7 +100,7 @@ export class FileManager {
         if (!confirm(`Delete ${filename}?`)) return;
         
         try {
-            const response = await fetch(`/api/files/captures/${filename}`, {
+            const response = await fetch(`/api/files/captures/${filename}?companions=true`, {
                 method: 'DELETE'
             });
             const result = await response.json();
@@ -120,8 +139,8 @@ export class FileManager {
                 const result = await response.json();
                 
                 if (result.success) {
-                    await this.refresh();
-                    alert(`Deleted ${result.data.count} files`);
+                    // Runs as a job, the gallery refreshes on captures.cleared
+                    alert(`Deleting ${result.data.count} files`);
                 } else {
                     alert('Failed to clear files: ' + result.message);
                 }
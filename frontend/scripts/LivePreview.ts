@@ -3,6 +3,7 @@ export class LivePreview {
     private previewElement: HTMLImageElement | null = null;
     private isRunning = false;
     private updateInterval: number | null = null;
+    private socket: WebSocket | null = null;
 
     async initialize(): Promise<void> {
         this.previewElement = document.getElementById('live-preview') as HTMLImageElement;
@@ -13,6 +14,17 @@ export class LivePreview {
         if (this.isRunning || !this.previewElement) return;
         
         this.isRunning = true;
+
+        if (typeof WebSocket !== 'undefined') {
+            this.startStream();
+        } else {
+            this.startPolling();
+        }
+    }
+
+    private startPolling(): void {
+        if (!this.isRunning || this.updateInterval) return;
+
         this.updatePreview();
         
         // Update preview every 100ms for smooth live view
@@ -21,8 +33,73 @@ export class LivePreview {
         }, 100);
     }
 
+    private startStream(): void {
+        const protocol = window.location.protocol === 'https:' ? 'wss:' : 'ws:';
+        const socket = new WebSocket(
+            `${protocol}//${window.location.host}${this.baseUrl}/ws?${this.sizeQuery()}`
+        );
+        socket.binaryType = 'arraybuffer';
+        this.socket = socket;
+
+        let streamed = false;
+        socket.onmessage = (message: MessageEvent) => {
+            if (typeof message.data === 'string') return; // hello/config
+            streamed = true;
+
+            // Frame layout: 4 byte big-endian sequence number, then the JPEG
+            const seq = new DataView(message.data).getUint32(0);
+            const blob = new Blob([message.data.slice(4)], { type: 'image/jpeg' });
+            this.showFrame(blob, () => {
+                // Acknowledge once displayed so the server paces to this client
+                if (socket.readyState === WebSocket.OPEN) {
+                    socket.send(JSON.stringify({ type: 'ack', seq }));
+                }
+            });
+        };
+
+        socket.onclose = () => {
+            if (this.socket === socket) {
+                this.socket = null;
+            }
+            // Fall back to polling if streaming never worked
+            if (this.isRunning && !streamed) {
+                this.startPolling();
+            } else if (this.isRunning) {
+                window.setTimeout(() => this.isRunning && !this.socket && this.startStream(), 1000);
+            }
+        };
+    }
+
+    private sizeQuery(): string {
+        // Ask the server for frames no larger than they are displayed
+        const width = Math.round((this.previewElement?.clientWidth || 0) * window.devicePixelRatio);
+        return width >= 16 ? `width=${width}` : '';
+    }
+
+    private showFrame(blob: Blob, onDisplayed?: () => void): void {
+        if (!this.previewElement) return;
+
+        const imageUrl = URL.createObjectURL(blob);
+
+        // Clean up previous URL
+        if (this.previewElement.src.startsWith('blob:')) {
+            URL.revokeObjectURL(this.previewElement.src);
+        }
+
+        if (onDisplayed) {
+            this.previewElement.onload = () => onDisplayed();
+            this.previewElement.onerror = () => onDisplayed();
+        }
+        this.previewElement.src = imageUrl;
+    }
+
     stop(): void {
         this.isRunning = false;
+
+        if (this.socket) {
+            this.socket.close();
+            this.socket = null;
+        }
         
         if (this.updateInterval) {
             clearInterval(this.updateInterval);
@@ -39,18 +116,10 @@ export class LivePreview {
         
         try {
             const timestamp = Date.now();
-            const response = await fetch(`${this.baseUrl}/live?t=${timestamp}`);
+            const response = await fetch(`${this.baseUrl}/live?t=${timestamp}&${this.sizeQuery()}`);
             
             if (response.ok) {
-                const blob = await response.blob();
-                const imageUrl = URL.createObjectURL(blob);
-                
-                // Clean up previous URL
-                if (this.previewElement.src.startsWith('blob:')) {
-                    URL.revokeObjectURL(this.previewElement.src);
-                }
-                
-                this.previewElement.src = imageUrl;
+                this.showFrame(await response.blob());
             }
         } catch (error) {
             console.error('Failed to update preview:', error);
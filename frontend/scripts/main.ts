@@ -1,16 +1,19 @@
 import { CameraControl } from './CameraControl.js';
 import { LivePreview } from './LivePreview.js';
 import { FileManager } from './FileManager.js';
+import { EventStream } from './EventStream.js';
 
 class App {
     private cameraControl: CameraControl;
     private livePreview: LivePreview;
     private fileManager: FileManager;
+    private events: EventStream;
 
     constructor() {
-        this.cameraControl = new CameraControl();
+        this.events = new EventStream();
+        this.cameraControl = new CameraControl(this.events);
         this.livePreview = new LivePreview();
-        this.fileManager = new FileManager();
+        this.fileManager = new FileManager(this.events);
         
         this.init();
     }
@@ -20,6 +23,7 @@ class App {
             await this.cameraControl.initialize();
             await this.livePreview.initialize();
             await this.fileManager.initialize();
+            this.events.connect();
             
             this.setupEventListeners();
             this.updateUI();
@@ -41,7 +45,10 @@ class App {
         });
         
         this.cameraControl.on('captured', (filename: string) => {
-            this.fileManager.refresh();
+            // The event stream delivers the new file, only refetch without it
+            if (!this.events.isOpen) {
+                this.fileManager.refresh();
+            }
             this.showNotification(`Image captured: ${filename}`, 'success');
         });
         
@@ -59,9 +66,11 @@ class App {
     }
 
     private updateUI(): void {
-        // Update status periodically
+        // Status changes are pushed over the event stream, poll only as a fallback
         setInterval(async () => {
-            await this.cameraControl.updateStatus();
+            if (!this.events.isOpen) {
+                await this.cameraControl.updateStatus();
+            }
         }, 5000);
     }
 